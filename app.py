@@ -2,23 +2,48 @@
 # = app.py - Main Flask application setup
 # ========================================================
 import os
+import click
 from flask import Flask
 from models import db
 # --------------------------------------------------------
 # - View and Utility Imports
 #---------------------------------------------------------
 # Import application views
-from views import home, submit_json_workout, workouts, details, summary_day, summary_week, summary_month, summary_year, workouts_by_date, submit_manual_workout, workouts_by_week, workouts_by_month, workouts_by_year, settings, ranking
+from views import home, submit_json_workout, batch_import_json, workouts, details, summary_day, summary_week, summary_month, summary_year, workouts_by_date, submit_manual_workout, workouts_by_week, workouts_by_month, workouts_by_year, settings, ranking, cache_stats
 # Import utility functions and context processors
-from utils import nl2br_filter, sidebar_stats_processor, utility_processor, format_seconds_to_hms, format_split_short, format_duration_ms, format_total_seconds_human_readable # Added utility_processor
+from utils import nl2br_filter, sidebar_stats_processor, utility_processor, format_seconds_to_hms, format_split_short, format_duration_ms, format_total_seconds_human_readable, format_data_as_of # Added utility_processor
 from database_setup import create_db_components, update_db_schema # Import database setup functions
+from mv_refresh import start_mv_refresher # Background materialized view refresher
+from background_jobs import start_background_worker # Background recompute jobs
+from cache_listener import start_cache_listener # Cross-process cache invalidation
+from response_cache import init_response_cache # Data version keyed page and fragment cache
+import metric_descriptors # Registers the metric descriptor cache invalidation
+import user_settings # Registers the settings snapshot invalidation
+import summary_tables # Summary table maintenance commands
+import query_plans # EXPLAIN checks for the details page sample read and the workouts list
+import series # Split / HR zone series engine benchmark
+import workout_stats # Workout statistics backfill command
+import workout_splits # Stored split tables and their recompute job
+import best_efforts # Best effort search backfill command and job
+import power_curve # Power curve backfill / envelope rebuild commands
+import workout_hr_zones # Stored HR zone rows and their recompute job
+import series_levels # Downsampled chart series backfill command and job
 from sqlalchemy.exc import ProgrammingError # To catch errors like "table not found"
 
 # --------------------------------------------------------
 # - Application Version
 #---------------------------------------------------------
-__version__ = "0.18" # Current application version
-TARGET_DB_SCHEMA_VERSION = "0.18" # Target schema version for this change
+__version__ = "0.38" # Current application version
+TARGET_DB_SCHEMA_VERSION = "0.38" # Target schema version for this change
+
+# --------------------------------------------------------
+# - Serving Process Check
+#---------------------------------------------------------
+# Every `flask <command>` loads the app as well. Background threads only belong in a process
+# that serves requests: `flask run`, a WSGI server or `python app.py` (no CLI command at all).
+def is_serving_process():
+    cli_context = click.get_current_context(silent=True)
+    return cli_context is None or cli_context.command.name == 'run'
 
 # --------------------------------------------------------
 # - Application Factory Function
@@ -29,11 +54,27 @@ def create_app(config_object=None):
 
     # == Configuration Settings ============================================
     # -- General Flask Configuration -------------------
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # Max content length for uploads
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', '16')) * 1024 * 1024 # Max content length for uploads (batch imports may need more)
+    app.config['JSON_IMPORT_CHUNK_SIZE'] = int(os.environ.get('JSON_IMPORT_CHUNK_SIZE', '50')) # Workouts committed per transaction in batch imports
     app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'your_default_secret_key') # Secret key for session management
     app.config['PER_PAGE'] = int(os.environ.get('PER_PAGE', '10')) # Items per page for pagination
     app.config['TARGET_DB_SCHEMA_VERSION'] = TARGET_DB_SCHEMA_VERSION # Store in app config
 
+    # -- Materialized View Refresh Configuration -------------------
+    app.config['MV_REFRESHER_ENABLED'] = os.environ.get('MV_REFRESHER_ENABLED', 'true').lower() not in ('0', 'false', 'no') # Run the background refresher in this process
+    app.config['MV_REFRESH_DEBOUNCE_SECONDS'] = float(os.environ.get('MV_REFRESH_DEBOUNCE_SECONDS', '2')) # Quiet period that coalesces bursts of writes into one refresh
+    app.config['MV_REFRESH_MAX_DELAY_SECONDS'] = float(os.environ.get('MV_REFRESH_MAX_DELAY_SECONDS', '30')) # Upper bound on staleness during continuous writes
+
+    # -- Background Job Configuration -------------------
+    app.config['BACKGROUND_JOBS_ENABLED'] = os.environ.get('BACKGROUND_JOBS_ENABLED', 'true').lower() not in ('0', 'false', 'no') # Run the background job worker in this process
+    app.config['HR_ZONE_RECOMPUTE_PROCESSES'] = int(os.environ.get('HR_ZONE_RECOMPUTE_PROCESSES', str(os.cpu_count() or 1))) # Worker processes of the HR zone recompute (1: inline)
+    app.config['HR_ZONE_RECOMPUTE_CHUNK_SIZE'] = int(os.environ.get('HR_ZONE_RECOMPUTE_CHUNK_SIZE', '200')) # Workouts per HR zone recompute transaction
+    app.config['CACHE_LISTENER_ENABLED'] = os.environ.get('CACHE_LISTENER_ENABLED', 'true').lower() not in ('0', 'false', 'no') # Invalidate the settings, descriptor and data version caches on changes from other processes
+
+    # -- Response Cache Configuration -------------------
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no') # Cache rendered read-only pages and fragments (needs the cache listener)
+    app.config['RESPONSE_CACHE_MAX_MB'] = float(os.environ.get('RESPONSE_CACHE_MAX_MB', '32')) # Memory budget of the per-process LRU cache
+
     # -- Database Configuration -------------------
     DB_USER = os.environ.get('POSTGRES_USER') # PostgreSQL username
     DB_PASSWORD = os.environ.get('POSTGRES_PASSWORD') # PostgreSQL password
@@ -89,9 +130,11 @@ def create_app(config_object=None):
         app.jinja_env.filters['format_duration_ms'] = format_duration_ms
         app.jinja_env.filters['format_split_ms'] = format_duration_ms
         app.jinja_env.filters['format_total_seconds_human_readable'] = format_total_seconds_human_readable
+        app.jinja_env.filters['format_data_as_of'] = format_data_as_of
         
         app.context_processor(sidebar_stats_processor) # For sidebar statistics
         app.context_processor(utility_processor) # For utility functions like now()
+        init_response_cache(app) # Cache backend of the page and fragment caches
 
         # == Inject App Version into Templates ============================================
         @app.context_processor
@@ -103,6 +146,7 @@ def create_app(config_object=None):
         # Each blueprint corresponds to a feature or section of the application
         home.register_routes(app) # Registers routes for home page
         submit_json_workout.register_routes(app) # Registers routes for submitting JSON workouts
+        batch_import_json.register_routes(app) # Registers routes for batch importing JSON files
         workouts.register_routes(app) # Registers routes for displaying workouts list
         details.register_routes(app) # Registers routes for workout details page
         summary_day.register_routes(app) # Registers routes for daily summary page
@@ -116,6 +160,33 @@ def create_app(config_object=None):
         submit_manual_workout.register_routes(app) # Registers routes for submitting manual workouts
         settings.register_routes(app)       # Registers routes for settings page
         ranking.register_routes(app)        # Registers routes for ranking page
+        cache_stats.register_routes(app)    # Registers the response cache counters endpoint
+
+        # == Register CLI Commands ============================================
+        summary_tables.register_commands(app) # flask rebuild-summaries / check-summaries
+        query_plans.register_commands(app) # flask explain-details / explain-workouts
+        series.register_commands(app) # flask benchmark-series
+        workout_stats.register_commands(app) # flask backfill-workout-stats
+        workout_splits.register_commands(app) # flask recompute-splits
+        best_efforts.register_commands(app) # flask backfill-best-efforts
+        power_curve.register_commands(app) # flask backfill-power-curves / rebuild-power-curve-envelope
+        workout_hr_zones.register_commands(app) # flask recompute-hr-zones
+        series_levels.register_commands(app) # flask build-series-levels
+
+    # == Start Background Materialized View Refresher ============================================
+    # Started after the schema check so it never refreshes views that a migration is replacing.
+    # Not in CLI commands: a short-lived command would take leadership and refresh every view.
+    if is_serving_process():
+        start_mv_refresher(app)
+
+    # == Start Background Job Worker ============================================
+    # Not in CLI commands either: `flask recompute-splits` and the backfills would race the
+    # same job, and a short command would cut off the jobs it took over on exit
+    if is_serving_process():
+        start_background_worker(app)
+
+    # == Start Cache Invalidation Listener ============================================
+    start_cache_listener(app)
 
     return app
 
@@ -0,0 +1,158 @@
+# ========================================================
+# = background_jobs.py - Recompute jobs run outside the request cycle
+# ========================================================
+import select
+import threading
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from user_settings import user_settings
+
+# Channel on which jobs are requested (payload: job name)
+BACKGROUND_JOBS_CHANNEL = 'rowergdiary_jobs'
+
+# Session-level advisory lock held by the one process that runs jobs
+BACKGROUND_JOBS_LOCK_KEY = 72_510_402
+
+# Registered jobs: name -> function without arguments. Jobs must be idempotent and
+# find their own work (e.g. rows computed with outdated settings), because requests
+# are coalesced and every job also runs when a process takes over as leader.
+_jobs = {}
+
+# --------------------------------------------------------
+# - Job Registry
+#---------------------------------------------------------
+# Decorator registering a function as a background job under `name`
+def background_job(name):
+    def register(job_function):
+        _jobs[name] = job_function
+        return job_function
+    return register
+
+def registered_jobs():
+    return sorted(_jobs)
+
+# Requests a job from the background worker. The notification is part of the current
+# session transaction, so the worker only sees it once the triggering change is committed
+# (and never when it is rolled back).
+def enqueue_job(name):
+    if name not in _jobs:
+        raise ValueError(f"Unknown background job '{name}'.")
+    db.session.execute(text("SELECT pg_notify(:channel, :name)"), {'channel': BACKGROUND_JOBS_CHANNEL, 'name': name})
+
+# Records a job's progress in background_job_status within the current session transaction,
+# so it becomes visible together with the work it reports (commit per chunk)
+def report_job_progress(name, processed, total=None, state='running'):
+    db.session.execute(text("""
+        INSERT INTO background_job_status (job_name, state, processed, total, started_at, updated_at)
+        VALUES (:name, :state, :processed, :total, now(), now())
+        ON CONFLICT (job_name) DO UPDATE SET
+            state = EXCLUDED.state,
+            processed = EXCLUDED.processed,
+            total = EXCLUDED.total,
+            started_at = CASE WHEN :processed = 0 THEN EXCLUDED.started_at ELSE background_job_status.started_at END,
+            updated_at = EXCLUDED.updated_at
+    """), {'name': name, 'state': state, 'processed': processed, 'total': total})
+
+# Returns the status rows of the jobs that are currently running
+def get_running_jobs():
+    return db.session.execute(text(
+        "SELECT job_name, processed, total, started_at FROM background_job_status WHERE state = 'running' ORDER BY job_name"
+    )).fetchall()
+
+# Runs one job in the current app context; errors are logged (and the job's status row,
+# if it reports progress, marked failed), not raised
+def run_job(name):
+    try:
+        # Jobs act on settings just saved, possibly by another process whose notification
+        # this process has not handled yet: read them afresh
+        user_settings.invalidate()
+        current_app.logger.info(f"Background job started: {name}.")
+        _jobs[name]()
+        current_app.logger.info(f"Background job finished: {name}.")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in background job {name}: {e}", exc_info=True)
+        try:
+            db.session.execute(text("UPDATE background_job_status SET state = 'failed', updated_at = now() WHERE job_name = :name"), {'name': name})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+    finally:
+        db.session.remove() # Fresh session for the next job
+
+# --------------------------------------------------------
+# - Background Worker
+#---------------------------------------------------------
+# Daemon thread that LISTENs for job requests, elected like the materialized view
+# refresher (mv_refresh.MaterializedViewRefresher): every serving app process (not CLI
+# commands) starts one and an advisory lock lets a single leader run the jobs.
+class BackgroundJobWorker(threading.Thread):
+    IDLE_POLL_SECONDS = 5.0 # Wake-up interval while idle, so stop() is noticed
+    RETRY_SECONDS = 15.0 # Wait before retrying leadership / after a connection error
+
+    def __init__(self, app):
+        super().__init__(name='background-jobs', daemon=True)
+        self.app = app
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # -- Thread Main Loop -------------------
+    def run(self):
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    self._run_while_leader()
+                except Exception as e:
+                    current_app.logger.error(f"Background job worker error: {e}", exc_info=True)
+                self._stop_event.wait(self.RETRY_SECONDS)
+
+    # -- Leader Loop -------------------
+    # Returns when leadership could not be taken or the worker is stopped.
+    def _run_while_leader(self):
+        pool_connection = db.engine.raw_connection()
+        pool_connection.detach() # Long-lived LISTEN connection, kept out of the pool
+        listen_connection = pool_connection.driver_connection
+        try:
+            listen_connection.autocommit = True # Notifications are only delivered outside a transaction
+            with listen_connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (BACKGROUND_JOBS_LOCK_KEY,))
+                if not cursor.fetchone()[0]:
+                    return # Another process runs the jobs
+                cursor.execute(f"LISTEN {BACKGROUND_JOBS_CHANNEL}")
+            current_app.logger.info("Background job worker started (leader).")
+
+            # Run every job on taking over: requests sent while no leader was listening are lost
+            pending_jobs = set(_jobs)
+
+            while not self._stop_event.is_set():
+                # == Collect Job Requests ============================================
+                readable, _, _ = select.select([listen_connection], [], [], 0 if pending_jobs else self.IDLE_POLL_SECONDS)
+                if readable:
+                    listen_connection.poll()
+                    while listen_connection.notifies:
+                        notify = listen_connection.notifies.pop(0)
+                        if notify.payload in _jobs: # Ignore requests for jobs this version does not know
+                            pending_jobs.add(notify.payload)
+
+                # == Run Pending Jobs ============================================
+                # Requests arriving while a job runs queue up on the connection and are
+                # coalesced into one further run
+                if pending_jobs:
+                    job_names, pending_jobs = sorted(pending_jobs), set()
+                    for job_name in job_names:
+                        run_job(job_name)
+        finally:
+            listen_connection.close() # Also releases the advisory lock
+
+# Starts the background job worker for this process unless disabled in the config
+def start_background_worker(app):
+    if not app.config.get('BACKGROUND_JOBS_ENABLED', True):
+        app.logger.info("Background job worker disabled.")
+        return None
+    worker = BackgroundJobWorker(app)
+    worker.start()
+    app.extensions['background_jobs'] = worker
+    return worker
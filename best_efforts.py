@@ -0,0 +1,155 @@
+# ========================================================
+# = best_efforts.py - Best efforts inside workouts for the ranking settings
+# ========================================================
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db, RankingSetting
+from background_jobs import background_job
+from data_versions import mark_data_changed
+from sample_loader import load_workout_samples
+from series import SampleSeries, best_distance_effort, best_time_effort
+from workout_stats import refresh_workout_stats
+
+RECOMPUTE_BEST_EFFORTS_JOB = 'recompute_best_efforts' # Background job name
+
+# --------------------------------------------------------
+# - Best Effort Calculation
+#---------------------------------------------------------
+# Returns {ranking_id: effort dict} for a loaded WorkoutSampleSet: the fastest time over
+# every distance ranking and the longest distance in every time ranking, searched on the
+# cumulative RowingDistance series. Settings the workout is too short for are left out.
+def compute_best_efforts(workout_samples, ranking_settings):
+    distance = SampleSeries(*workout_samples.samples('RowingDistance'))
+    efforts = {}
+    for setting in ranking_settings:
+        if setting.type == 'distance':
+            effort = best_distance_effort(distance, setting.value)
+        elif setting.type == 'time':
+            effort = best_time_effort(distance, setting.value)
+        else:
+            continue
+        if effort is None:
+            continue
+        effort['pace_seconds_500m'] = effort['duration_seconds'] * 500 / effort['distance_meters'] if effort['distance_meters'] > 0 else None
+        efforts[setting.ranking_id] = effort
+    return efforts
+
+# --------------------------------------------------------
+# - Best Effort Storage
+#---------------------------------------------------------
+INSERT_BEST_EFFORT_SQL = """
+    INSERT INTO workout_best_efforts (
+        workout_id, ranking_id, duration_seconds, distance_meters, start_offset_seconds, pace_seconds_500m
+    )
+    VALUES (
+        :workout_id, :ranking_id, :duration_seconds, :distance_meters, :start_offset_seconds, :pace_seconds_500m
+    )
+"""
+
+# Replaces the stored best efforts of one workout in the current session transaction and
+# records the searched ranking settings on its workout_stats row (which must exist).
+def refresh_workout_best_efforts(workout_id, workout_samples=None, ranking_settings=None):
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+    if ranking_settings is None:
+        ranking_settings = db.session.query(RankingSetting).all()
+
+    efforts = compute_best_efforts(workout_samples, ranking_settings)
+    mark_data_changed() # Bumps the 'rankings' data version (plain SQL, not seen by the flush)
+    db.session.execute(text("DELETE FROM workout_best_efforts WHERE workout_id = :workout_id"), {'workout_id': workout_id})
+    if efforts:
+        db.session.execute(text(INSERT_BEST_EFFORT_SQL), [
+            {'workout_id': workout_id, 'ranking_id': ranking_id, **effort} for ranking_id, effort in efforts.items()
+        ])
+    db.session.execute(
+        text("UPDATE workout_stats SET best_effort_ranking_ids = CAST(:ranking_ids AS integer[]) WHERE workout_id = :workout_id"),
+        {'workout_id': workout_id, 'ranking_ids': sorted(setting.ranking_id for setting in ranking_settings)}
+    )
+    return len(efforts)
+
+# --------------------------------------------------------
+# - Best Effort Backfill
+#---------------------------------------------------------
+# Searches the best efforts of every workout not yet searched with the current ranking
+# settings (all workouts when only_stale is False), committing every `batch_size`
+# workouts. Returns the number of workouts processed.
+# Also runs as a background job, so ranking settings added directly in the database are
+# picked up when a worker starts.
+@background_job(RECOMPUTE_BEST_EFFORTS_JOB)
+def backfill_best_efforts(only_stale=True, batch_size=50):
+    ranking_settings = db.session.query(RankingSetting).all()
+    ranking_ids = sorted(setting.ranking_id for setting in ranking_settings)
+    workout_rows = db.session.execute(text("""
+        SELECT w.workout_id, s.workout_id IS NULL AS missing_stats
+        FROM workouts w
+        LEFT JOIN workout_stats s ON s.workout_id = w.workout_id
+        WHERE NOT :only_stale
+            OR s.workout_id IS NULL
+            OR s.best_effort_ranking_ids IS DISTINCT FROM CAST(:ranking_ids AS integer[])
+        ORDER BY w.workout_id
+    """), {'only_stale': only_stale, 'ranking_ids': ranking_ids}).fetchall()
+
+    for position, row in enumerate(workout_rows, start=1):
+        workout_samples = load_workout_samples(row.workout_id)
+        if row.missing_stats:
+            refresh_workout_stats(row.workout_id, workout_samples=workout_samples)
+        refresh_workout_best_efforts(row.workout_id, workout_samples, ranking_settings)
+        if position % batch_size == 0:
+            db.session.commit()
+            current_app.logger.info(f"Best efforts searched for {position}/{len(workout_rows)} workouts.")
+    db.session.commit()
+    return len(workout_rows)
+
+# --------------------------------------------------------
+# - Best Effort Rankings
+#---------------------------------------------------------
+# Top best efforts for one ranking setting, in the row shape of the workout rankings
+# (duration_seconds / total_distance_meters / average_split_seconds_500m refer to the
+# effort, not the whole workout). Same equipment filter as mv_workout_rankings.
+def get_best_effort_rankings(ranking_setting, year=None, limit=10):
+    order_by = "be.duration_seconds ASC" if ranking_setting.type == 'distance' else "be.distance_meters DESC"
+    query = """
+        SELECT
+            be.workout_id,
+            w.workout_date,
+            be.distance_meters AS total_distance_meters,
+            be.duration_seconds,
+            be.pace_seconds_500m AS average_split_seconds_500m,
+            be.start_offset_seconds
+        FROM
+            workout_best_efforts be
+            JOIN workouts w ON w.workout_id = be.workout_id
+            JOIN equipment_types et ON et.equipment_type_id = w.equipment_type_id
+        WHERE
+            be.ranking_id = :ranking_id
+            AND et.settings_include_in_totals = TRUE
+    """
+    params = {'ranking_id': ranking_setting.ranking_id, 'limit': limit}
+    if year is not None:
+        query += " AND w.workout_date >= make_date(:year, 1, 1) AND w.workout_date < make_date(:year + 1, 1, 1)"
+        params['year'] = year
+    query += f" ORDER BY {order_by}, w.workout_date LIMIT :limit"
+    return db.session.execute(text(query), params).fetchall()
+
+# Years with at least one stored best effort, newest first
+def get_best_effort_years():
+    rows = db.session.execute(text("""
+        SELECT DISTINCT EXTRACT(YEAR FROM w.workout_date)::integer AS year
+        FROM workout_best_efforts be
+        JOIN workouts w ON w.workout_id = be.workout_id
+        ORDER BY year DESC
+    """)).fetchall()
+    return [row.year for row in rows]
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the best effort backfill command with `flask`
+def register_commands(app):
+    @app.cli.command('backfill-best-efforts')
+    @click.option('--all', 'recompute_all', is_flag=True, help='Search every workout, not only those searched with other ranking settings.')
+    def backfill_best_efforts_command(recompute_all):
+        """Search the best efforts of existing workouts for the ranking settings."""
+        processed = backfill_best_efforts(only_stale=not recompute_all)
+        click.echo(f"Best efforts searched for {processed} workout(s).")
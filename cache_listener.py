@@ -0,0 +1,100 @@
+# ========================================================
+# = cache_listener.py - Cross-process invalidation of in-process caches
+# ========================================================
+import select
+import threading
+from flask import current_app
+from models import db
+
+# Registered handlers: channel -> function(payload). A handler is also called with
+# payload None when the listener (re)connects, since notifications sent while it was not
+# listening are lost: it must then drop everything it caches.
+_handlers = {}
+
+# Set while this process's listener is subscribed; caches must not be trusted otherwise
+_listening = threading.Event()
+
+# --------------------------------------------------------
+# - Handler Registry
+#---------------------------------------------------------
+# Decorator registering a function as the invalidation handler of a NOTIFY channel
+def invalidation_handler(channel):
+    def register(handler_function):
+        _handlers[channel] = handler_function
+        return handler_function
+    return register
+
+# True while notifications reach this process. Caches of values that other processes
+# change (settings, data versions) are only kept while listening.
+def is_listening():
+    return _listening.is_set()
+
+def _invalidate_all():
+    for handler_function in _handlers.values():
+        handler_function(None)
+
+# --------------------------------------------------------
+# - Cache Invalidation Listener
+#---------------------------------------------------------
+# Daemon thread that LISTENs on the channels of all registered handlers and passes each
+# notification to its handler. Unlike the refresher and job worker every process listens;
+# there is no leader.
+class CacheInvalidationListener(threading.Thread):
+    IDLE_POLL_SECONDS = 5.0 # Wake-up interval while idle, so stop() is noticed
+    RETRY_SECONDS = 15.0 # Wait after a connection error
+
+    def __init__(self, app):
+        super().__init__(name='cache-invalidation-listener', daemon=True)
+        self.app = app
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # -- Thread Main Loop -------------------
+    def run(self):
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    self._listen()
+                except Exception as e:
+                    current_app.logger.error(f"Cache invalidation listener error: {e}", exc_info=True)
+                _invalidate_all() # Notifications may have been missed while not listening
+                self._stop_event.wait(self.RETRY_SECONDS)
+
+    # -- Listen Loop -------------------
+    def _listen(self):
+        pool_connection = db.engine.raw_connection()
+        pool_connection.detach() # Long-lived LISTEN connection, kept out of the pool
+        listen_connection = pool_connection.driver_connection
+        try:
+            listen_connection.autocommit = True # Notifications are only delivered outside a transaction
+            with listen_connection.cursor() as cursor:
+                for channel in sorted(_handlers):
+                    cursor.execute(f"LISTEN {channel}")
+            _invalidate_all() # Changes before LISTEN took effect are not notified
+            _listening.set()
+
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([listen_connection], [], [], self.IDLE_POLL_SECONDS)
+                if readable:
+                    listen_connection.poll()
+                    while listen_connection.notifies:
+                        notify = listen_connection.notifies.pop(0)
+                        handler_function = _handlers.get(notify.channel)
+                        if handler_function is not None:
+                            handler_function(notify.payload)
+        finally:
+            _listening.clear()
+            listen_connection.close()
+
+# Starts the cache invalidation listener for this process unless disabled in the config.
+# Without it the caches of this process only see changes made by this process.
+def start_cache_listener(app):
+    if not app.config.get('CACHE_LISTENER_ENABLED', True):
+        app.logger.info("Cache invalidation listener disabled.")
+        return None
+    listener = CacheInvalidationListener(app)
+    listener.start()
+    app.extensions['cache_listener'] = listener
+    return listener
@@ -0,0 +1,89 @@
+# ========================================================
+# = data_versions.py - Data version stamps for caches of derived data
+# ========================================================
+import threading
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db, Workout, EquipmentType, WorkoutBestEffort, PowerCurveRecord, RankingSetting
+from database_setup import DATA_VERSIONS_CHANNEL
+from cache_listener import invalidation_handler, is_listening
+
+# Session.info key marking a transaction that changed data covered by a data version
+DATA_CHANGED_KEY = 'data_versions_changed'
+
+# Models whose changes bump a data version (see database_setup.create_data_version_triggers_sql)
+DATA_VERSION_MODELS = (Workout, EquipmentType, WorkoutBestEffort, PowerCurveRecord, RankingSetting)
+
+# --------------------------------------------------------
+# - Data Version Cache
+#---------------------------------------------------------
+# Process-wide copy of the data_versions counters ({name: version}; 0 until first bumped).
+# Loaded once, then advanced from the notifications the bump_data_version() trigger sends,
+# so reading a stamp costs no query. A cache keyed by stamp() is current as long as the
+# stamp is unchanged.
+class DataVersionCache:
+    def __init__(self):
+        self._versions = None # Not loaded yet
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._versions = None
+
+    # Applies a '<name>:<version>' notification (versions only move forward)
+    def apply_notification(self, payload):
+        name, _sep, version = payload.rpartition(':')
+        if not name or not version.isdigit():
+            return
+        with self._lock:
+            if self._versions is not None and int(version) > self._versions.get(name, 0):
+                self._versions[name] = int(version)
+
+    # Returns the versions of the given names as a tuple, usable as a cache key, or None
+    # while this process does not receive notifications (callers must not cache then)
+    def stamp(self, *names):
+        if not is_listening():
+            return None
+        with self._lock:
+            if self._versions is None:
+                with db.engine.connect() as connection:
+                    rows = connection.execute(text("SELECT name, version FROM data_versions")).fetchall()
+                self._versions = {row.name: row.version for row in rows}
+            return tuple(self._versions.get(name, 0) for name in names)
+
+data_versions = DataVersionCache() # The process-wide cache
+
+# --------------------------------------------------------
+# - Read Your Writes
+#---------------------------------------------------------
+# The notification of a committed bump reaches this process's listener only after the commit
+# returns, so the writing process drops its counters on commit instead: the next stamp()
+# reloads them, and the page rendered after the write (e.g. the redirect after an import)
+# is not served from caches of the old stamp.
+
+# Marks the current transaction as changing versioned data written with plain SQL
+def mark_data_changed(session=None):
+    (session or db.session).info[DATA_CHANGED_KEY] = True
+
+@event.listens_for(Session, 'after_flush')
+def _flag_versioned_changes(session, flush_context):
+    if any(isinstance(instance, DATA_VERSION_MODELS) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info[DATA_CHANGED_KEY] = True
+
+@event.listens_for(Session, 'after_commit')
+def _reload_after_commit(session):
+    if session.info.pop(DATA_CHANGED_KEY, False):
+        data_versions.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_data_changed(session, previous_transaction):
+    if previous_transaction.parent is None: # A savepoint rollback keeps the changes flushed before it
+        session.info.pop(DATA_CHANGED_KEY, None)
+
+# A data_versions row was bumped by a committed transaction, in any process
+@invalidation_handler(DATA_VERSIONS_CHANNEL)
+def _apply_data_version(payload):
+    if payload is None:
+        data_versions.invalidate()
+    else:
+        data_versions.apply_notification(payload)
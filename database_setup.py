@@ -4,8 +4,16 @@
 from flask import current_app # current_app is still needed for logger and db operations
 from sqlalchemy import text
 from models import db, UserSetting, EquipmentType, RankingSetting # Added RankingSetting
+from summary_tables import (
+    CREATE_SUMMARY_TABLES_SQL,
+    DROP_SUMMARY_MVS_SQL,
+    CREATE_SUMMARY_FUNCTIONS_SQL,
+    drop_summary_triggers_sql,
+    create_summary_triggers_sql,
+    REBUILD_SUMMARY_TABLES_SQL
+)
 
-# Global SQL definition for dropping Materialized Views
+# Global SQL definition for dropping Materialized Views (up to 0.21, see SUMMARY_MATERIALIZED_VIEWS)
 DROP_MVS_SQL = """
 DROP MATERIALIZED VIEW IF EXISTS mv_sum_totals;
 DROP MATERIALIZED VIEW IF EXISTS mv_year_totals;
@@ -15,22 +23,52 @@ DROP MATERIALIZED VIEW IF EXISTS mv_day_totals;
 DROP MATERIALIZED VIEW IF EXISTS mv_workout_rankings;
 """
 
+DROP_RANKING_MV_SQL = "DROP MATERIALIZED VIEW IF EXISTS mv_workout_rankings;"
+
 # Global SQL definition for dropping functions
 DROP_FUNCTIONS_SQL = """
 DROP FUNCTION IF EXISTS refresh_rowing_summary_mvs() CASCADE;
 DROP FUNCTION IF EXISTS refresh_workout_rankings_mv() CASCADE;
 """
 
-# -- SQL for Creating/Replacing Trigger Function (summary MVs only) -------------------
+# Up to schema 0.21 the day/week/month/year/overall totals were materialized views.
+# Since 0.22 they are incrementally maintained tables of the same names (summary_tables.py);
+# the summary MV definitions below are only kept for the older migrations.
+SUMMARY_MATERIALIZED_VIEWS = ['mv_sum_totals', 'mv_year_totals', 'mv_month_totals', 'mv_week_totals', 'mv_day_totals']
+RANKING_MATERIALIZED_VIEWS = ['mv_workout_rankings']
+
+# Materialized views grouped by the trigger function that requests their refresh
+MV_REFRESH_GROUPS = {
+    'rankings': RANKING_MATERIALIZED_VIEWS
+}
+
+# Channel the triggers notify; the payload is the MV_REFRESH_GROUPS key to refresh.
+# The background refresher (see mv_refresh.MaterializedViewRefresher) LISTENs on it.
+MV_REFRESH_CHANNEL = 'rowergdiary_mv_refresh'
+
+# Channel notified (on commit) by any change to metric_descriptors; every app process
+# LISTENs on it to drop its descriptor cache (see metric_descriptors.MetricDescriptorRegistry)
+METRIC_DESCRIPTORS_CHANNEL = 'rowergdiary_metric_descriptors'
+
+# Channel notified (on commit) whenever a data_versions row is bumped; the payload is
+# '<name>:<version>' (see data_versions.DataVersionCache)
+DATA_VERSIONS_CHANNEL = 'rowergdiary_data_versions'
+
+# Transaction-local setting that bulk operations use to skip per-statement refresh requests
+# (see mv_refresh.bulk_mode). Other sessions are unaffected.
+SUSPEND_MV_REFRESH_SETTING = 'rowergdiary.suspend_mv_refresh'
+
+# -- SQL for Creating/Replacing Trigger Function (summary MVs only, up to 0.21) -------------------
 create_function_sql = """
 CREATE OR REPLACE FUNCTION refresh_rowing_summary_mvs()
 RETURNS TRIGGER AS $$
 BEGIN
-    REFRESH MATERIALIZED VIEW mv_sum_totals;
-    REFRESH MATERIALIZED VIEW mv_year_totals;
-    REFRESH MATERIALIZED VIEW mv_month_totals;
-    REFRESH MATERIALIZED VIEW mv_week_totals;
-    REFRESH MATERIALIZED VIEW mv_day_totals;
+    IF current_setting('rowergdiary.suspend_mv_refresh', true) = 'on' THEN
+        RETURN NULL; -- Bulk mode: one refresh is requested when the bulk operation ends
+    END IF;
+    -- Only request a refresh; the background refresher coalesces requests and rebuilds
+    -- the views outside this transaction. Notifications are delivered on commit.
+    PERFORM pg_notify('rowergdiary_mv_refresh', 'summary');
     RETURN NULL; -- Result is ignored since this is an AFTER trigger
 END;
 $$ LANGUAGE plpgsql;
@@ -41,7 +79,64 @@ create_function_ranking_sql = """
 CREATE OR REPLACE FUNCTION refresh_workout_rankings_mv()
 RETURNS TRIGGER AS $$
 BEGIN
-    REFRESH MATERIALIZED VIEW mv_workout_rankings;
+    IF current_setting('rowergdiary.suspend_mv_refresh', true) = 'on' THEN
+        RETURN NULL; -- Bulk mode: one refresh is requested when the bulk operation ends
+    END IF;
+    PERFORM pg_notify('rowergdiary_mv_refresh', 'rankings'); -- Refreshed by the background refresher
+    RETURN NULL; -- Result is ignored since this is an AFTER trigger
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# -- SQL for Creating/Replacing Trigger Function (metric descriptor cache invalidation) -------------------
+create_function_metric_descriptors_sql = """
+CREATE OR REPLACE FUNCTION notify_metric_descriptors_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('""" + METRIC_DESCRIPTORS_CHANNEL + """', TG_OP); -- Delivered on commit
+    RETURN NULL; -- Result is ignored since this is an AFTER trigger
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# -- SQL for Creating/Replacing Trigger Function (data version stamps) -------------------
+# Bumps the data_versions row named by the trigger argument once per statement
+create_function_data_versions_sql = """
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    new_version bigint;
+BEGIN
+    INSERT INTO data_versions (name, version, changed_at)
+    VALUES (TG_ARGV[0], 1, clock_timestamp())
+    ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1, changed_at = EXCLUDED.changed_at
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('""" + DATA_VERSIONS_CHANNEL + """', TG_ARGV[0] || ':' || new_version); -- Delivered on commit
+    RETURN NULL; -- Result is ignored since this is an AFTER trigger
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# -- SQL for Creating/Replacing Trigger Function (power curve envelope repair) -------------------
+# Deleting workouts removes their power_curve_records (ON DELETE CASCADE). Once per statement,
+# after the cascades, the all-time envelope and the deleted workouts' years get the missing
+# points back from the remaining curves; the other points already hold the best remaining
+# value. Same selection and tie rule as power_curve.REBUILD_ENVELOPE_SQL.
+create_function_power_curve_repair_sql = """
+CREATE OR REPLACE FUNCTION repair_power_curve_records()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO power_curve_records (period, duration_seconds, watts, workout_id, workout_date)
+    SELECT DISTINCT ON (p.period, u.duration_seconds)
+        p.period, u.duration_seconds, u.watts, c.workout_id, w.workout_date
+    FROM workout_power_curves c
+    JOIN workouts w ON w.workout_id = c.workout_id
+    CROSS JOIN LATERAL unnest(c.durations_seconds, c.mean_max_watts) AS u(duration_seconds, watts)
+    CROSS JOIN LATERAL (VALUES ('all'), (EXTRACT(YEAR FROM w.workout_date)::integer::text)) AS p(period)
+    WHERE p.period = 'all'
+       OR p.period IN (SELECT EXTRACT(YEAR FROM d.workout_date)::integer::text FROM deleted_workouts d)
+    ORDER BY p.period, u.duration_seconds, u.watts DESC, w.workout_date, c.workout_id
+    ON CONFLICT (period, duration_seconds) DO NOTHING;
     RETURN NULL; -- Result is ignored since this is an AFTER trigger
 END;
 $$ LANGUAGE plpgsql;
@@ -49,14 +144,36 @@ $$ LANGUAGE plpgsql;
 
 # -- SQL for Dropping and Creating Triggers -------------------
 # Instead of executing multiple DROP statements at once, split and execute them one by one.
-drop_triggers_sql = [
+drop_summary_mv_triggers_sql = [
     "DROP TRIGGER IF EXISTS trg_refresh_rowing_summary_on_workout ON workouts;",
-    "DROP TRIGGER IF EXISTS trg_refresh_summary_on_equipment_update ON equipment_types;",
+    "DROP TRIGGER IF EXISTS trg_refresh_summary_on_equipment_update ON equipment_types;"
+]
+
+drop_ranking_triggers_sql = [
     "DROP TRIGGER IF EXISTS trg_refresh_workout_rankings_on_workout ON workouts;",
     "DROP TRIGGER IF EXISTS trg_refresh_workout_rankings_on_ranking_settings ON ranking_settings;"
 ]
 
-create_triggers_sql = [
+drop_triggers_sql = drop_summary_mv_triggers_sql + drop_ranking_triggers_sql # Up to 0.21
+
+drop_metric_descriptor_triggers_sql = [
+    "DROP TRIGGER IF EXISTS trg_notify_metric_descriptors ON metric_descriptors;"
+]
+
+drop_data_version_triggers_sql = [
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_workout ON workouts;",
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_equipment_inclusion ON equipment_types;",
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_refresh_state ON mv_refresh_state;",
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_best_efforts ON workout_best_efforts;",
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_power_curve_records ON power_curve_records;",
+    "DROP TRIGGER IF EXISTS trg_bump_data_version_on_ranking_settings ON ranking_settings;"
+]
+
+drop_power_curve_triggers_sql = [
+    "DROP TRIGGER IF EXISTS trg_repair_power_curve_records_on_workout ON workouts;"
+]
+
+create_summary_mv_triggers_sql = [
     """
     CREATE TRIGGER trg_refresh_rowing_summary_on_workout
     AFTER INSERT OR UPDATE OR DELETE ON workouts
@@ -68,7 +185,10 @@ create_triggers_sql = [
     AFTER UPDATE ON equipment_types
     FOR EACH STATEMENT
     EXECUTE FUNCTION refresh_rowing_summary_mvs();
-    """,
+    """
+]
+
+create_ranking_triggers_sql = [
     """
     CREATE TRIGGER trg_refresh_workout_rankings_on_workout
     AFTER INSERT OR UPDATE OR DELETE ON workouts
@@ -83,18 +203,92 @@ create_triggers_sql = [
     """
 ]
 
+create_triggers_sql = create_summary_mv_triggers_sql + create_ranking_triggers_sql # Up to 0.21
 
+create_metric_descriptor_triggers_sql = [
+    """
+    CREATE TRIGGER trg_notify_metric_descriptors
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON metric_descriptors
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_metric_descriptors_changed();
+    """
+]
+
+# 'workouts': anything the workout totals depend on (workouts, equipment inclusion in totals);
+# 'mv_refresh': completed materialized view refreshes ("rankings as of");
+# 'rankings': ranking data also written by backfills and background jobs (best efforts,
+# power curve records) and the ranking settings
+create_data_version_triggers_sql = [
+    """
+    CREATE TRIGGER trg_bump_data_version_on_workout
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workouts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('workouts');
+    """,
+    """
+    CREATE TRIGGER trg_bump_data_version_on_equipment_inclusion
+    AFTER UPDATE OF settings_include_in_totals ON equipment_types
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('workouts');
+    """,
+    """
+    CREATE TRIGGER trg_bump_data_version_on_refresh_state
+    AFTER INSERT OR UPDATE ON mv_refresh_state
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('mv_refresh');
+    """,
+    """
+    CREATE TRIGGER trg_bump_data_version_on_best_efforts
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workout_best_efforts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('rankings');
+    """,
+    """
+    CREATE TRIGGER trg_bump_data_version_on_power_curve_records
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON power_curve_records
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('rankings');
+    """,
+    """
+    CREATE TRIGGER trg_bump_data_version_on_ranking_settings
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ranking_settings
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('rankings');
+    """
+]
+
+create_power_curve_triggers_sql = [
+    """
+    CREATE TRIGGER trg_repair_power_curve_records_on_workout
+    AFTER DELETE ON workouts
+    REFERENCING OLD TABLE AS deleted_workouts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION repair_power_curve_records();
+    """
+]
+
+# Current schema: summary table delta triggers, the ranking refresh triggers, the
+# metric descriptor cache invalidation trigger, the data version triggers and the
+# power curve envelope repair trigger
+DROP_CURRENT_TRIGGERS_SQL = drop_summary_mv_triggers_sql + drop_summary_triggers_sql + drop_ranking_triggers_sql + drop_metric_descriptor_triggers_sql + drop_data_version_triggers_sql + drop_power_curve_triggers_sql
+CREATE_CURRENT_TRIGGERS_SQL = create_summary_triggers_sql + create_ranking_triggers_sql + create_metric_descriptor_triggers_sql + create_data_version_triggers_sql + create_power_curve_triggers_sql
 
 
 # Helper function to generate the CREATE MATERIALIZED VIEW SQL
 def _get_create_mvs_sql():
     """
-    Returns the SQL string for creating all materialized views with
-    conditional aggregation based on equipment_types.settings_include_in_totals.
+    Returns the SQL string for creating all materialized views of schema 0.21 and
+    earlier (summary totals and rankings) with conditional aggregation based on
+    equipment_types.settings_include_in_totals.
     """
+    return _get_create_summary_mvs_sql() + _get_create_ranking_mv_sql()
+
+# Summary total materialized views (up to 0.21)
+def _get_create_summary_mvs_sql():
     return f"""
     CREATE MATERIALIZED VIEW mv_sum_totals AS
     SELECT
+        1 AS id, -- Constant key for the single row; REFRESH ... CONCURRENTLY needs a unique index
         SUM(w.total_distance_meters) AS total_meters_rowed,
         SUM(w.duration_seconds) AS total_seconds_rowed,
         CASE
@@ -214,7 +408,11 @@ def _get_create_mvs_sql():
     ORDER BY
         day_date
     WITH DATA;
+    """
 
+# Ranking materialized view
+def _get_create_ranking_mv_sql():
+    return f"""
     CREATE MATERIALIZED VIEW mv_workout_rankings AS
     WITH base AS (
         SELECT
@@ -297,6 +495,74 @@ def _get_create_mvs_sql():
     WITH DATA;
     """
 
+# -- SQL for Materialized View Indexes -------------------
+# Each view gets a unique index on its natural key. Besides serving the per-date lookups,
+# the unique indexes are required for REFRESH MATERIALIZED VIEW CONCURRENTLY, which lets
+# readers keep using the old contents while a refresh runs (see mv_refresh.py).
+SUMMARY_MV_INDEXES_SQL = [ # Up to 0.21; the summary tables have primary keys instead
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_sum_totals_id ON mv_sum_totals (id);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_year_totals_year ON mv_year_totals (year);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_month_totals_year_month ON mv_month_totals (year, month);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_week_totals_week_start_date ON mv_week_totals (week_start_date);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_day_totals_day_date ON mv_day_totals (day_date);"
+]
+
+RANKING_MV_INDEXES_SQL = [
+    # A workout ranks at most once per ranking and rank type; leading workout_id serves the details page
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_workout_rankings_key ON mv_workout_rankings (workout_id, ranking_id, rank_type);",
+    # Ranking page: top N per ranking / rank type / year
+    "CREATE INDEX IF NOT EXISTS ix_mv_workout_rankings_lookup ON mv_workout_rankings (ranking_id, rank_type, year, rank);"
+]
+
+CREATE_MV_INDEXES_SQL = SUMMARY_MV_INDEXES_SQL + RANKING_MV_INDEXES_SQL # Up to 0.21
+
+# -- SQL for Per-Workout Sample Indexes -------------------
+# Also declared on the models, so create_all() builds them on new databases. Existing
+# databases build them with CREATE INDEX CONCURRENTLY (see build_indexes_concurrently),
+# which does not block imports while the index is built.
+SAMPLE_INDEXES_SQL = {
+    # Details page: a workout's HR samples in time order, answered from the index alone
+    'ix_heart_rate_samples_workout_time': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_heart_rate_samples_workout_time ON heart_rate_samples (workout_id, time_offset_seconds) INCLUDE (heart_rate_bpm);",
+    # ON DELETE CASCADE lookups when a workout is deleted
+    'ix_workout_hr_zones_workout_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workout_hr_zones_workout_id ON workout_hr_zones (workout_id);"
+}
+
+# -- SQL for List Page Indexes -------------------
+# Also declared on the models; built like SAMPLE_INDEXES_SQL on existing databases
+LIST_INDEXES_SQL = {
+    # Workouts list: keyset pagination by (workout_date, workout_id)
+    'ix_workouts_date_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_date_id ON workouts (workout_date, workout_id);",
+    # Workouts list sorts: keyset pagination by (sort column, workout_id). Full indexes: the
+    # workouts without a value are listed after the others, read from the NULLs at the end.
+    'ix_workouts_distance_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_distance_id ON workouts (total_distance_meters, workout_id);",
+    'ix_workouts_duration_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_duration_id ON workouts (duration_seconds, workout_id);",
+    'ix_workouts_split_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_split_id ON workouts (average_split_seconds_500m, workout_id);",
+    # Workouts list filtered by equipment type: the same sorts behind an equality prefix
+    'ix_workouts_equipment_date_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_equipment_date_id ON workouts (equipment_type_id, workout_date, workout_id);",
+    'ix_workouts_equipment_distance_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_equipment_distance_id ON workouts (equipment_type_id, total_distance_meters, workout_id);",
+    'ix_workouts_equipment_duration_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_equipment_duration_id ON workouts (equipment_type_id, duration_seconds, workout_id);",
+    'ix_workouts_equipment_split_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_equipment_split_id ON workouts (equipment_type_id, average_split_seconds_500m, workout_id);"
+}
+
+# --------------------------------------------------------
+# - Concurrent Index Builds
+#---------------------------------------------------------
+# Runs {index_name: CREATE INDEX CONCURRENTLY ...} statements outside a transaction, as
+# CONCURRENTLY requires. An interrupted concurrent build leaves an INVALID index that
+# IF NOT EXISTS would skip, so such leftovers are dropped and rebuilt.
+def build_indexes_concurrently(indexes):
+    autocommit_engine = db.engine.execution_options(isolation_level="AUTOCOMMIT")
+    with autocommit_engine.connect() as connection:
+        for index_name, create_sql in indexes.items():
+            is_valid = connection.execute(text(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"
+            ), {'index_name': index_name}).scalar()
+            if is_valid is False:
+                current_app.logger.warning(f"Dropping invalid index {index_name} left by an interrupted build.")
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};"))
+            current_app.logger.info(f"Building index {index_name}...")
+            connection.execute(text(create_sql))
+
 # Default settings for UserSetting table
 DEFAULT_USER_SETTINGS = {
     'per_page_workouts': '20',
@@ -342,10 +608,10 @@ def create_db_components():
 
         # == SQL Definitions for Materialized Views and Triggers ============================================
         # -- SQL for Dropping Materialized Views (now global) -------------------
-        # drop_mvs_sql is now DROP_MVS_SQL (global constant)
+        # Summary MVs of older schemas are dropped by DROP_SUMMARY_MVS_SQL, rankings by DROP_RANKING_MV_SQL
 
-        # -- SQL for Creating Materialized Views (now from helper) -------------------
-        create_mvs_sql = _get_create_mvs_sql()
+        # -- SQL for Creating the Ranking Materialized View (now from helper) -------------------
+        create_ranking_mv_sql = _get_create_ranking_mv_sql()
 
         # == Execute SQL Statements ============================================
         # Use a single transaction for all DDL operations.
@@ -382,20 +648,35 @@ def create_db_components():
                     
                     db.session.commit()
 
-            # Materialized views - second transaction
+            # Summary tables and ranking materialized view - second transaction
             with db.engine.connect() as connection:
                 with connection.begin():
+                    current_app.logger.info("Creating summary tables...")
+                    connection.execute(text(DROP_SUMMARY_MVS_SQL))
+                    for stmt in CREATE_SUMMARY_TABLES_SQL:
+                        connection.execute(text(stmt))
+
                     current_app.logger.info("Creating materialized views...")
-                    connection.execute(text(DROP_MVS_SQL))
-                    connection.execute(text(create_mvs_sql))
+                    connection.execute(text(DROP_RANKING_MV_SQL))
+                    connection.execute(text(create_ranking_mv_sql))
+                    for stmt in RANKING_MV_INDEXES_SQL:
+                        connection.execute(text(stmt))
                     
                     # Drop functions before recreating them
                     current_app.logger.info("Dropping existing functions...")
                     connection.execute(text(DROP_FUNCTIONS_SQL))
                     
                     current_app.logger.info("Creating database functions...")
-                    connection.execute(text(create_function_sql))
+                    for stmt in CREATE_SUMMARY_FUNCTIONS_SQL:
+                        connection.execute(text(stmt))
                     connection.execute(text(create_function_ranking_sql))
+                    connection.execute(text(create_function_metric_descriptors_sql))
+                    connection.execute(text(create_function_data_versions_sql))
+                    connection.execute(text(create_function_power_curve_repair_sql))
+
+                    current_app.logger.info("Filling summary tables...")
+                    for stmt in REBUILD_SUMMARY_TABLES_SQL:
+                        connection.execute(text(stmt))
 
             # Handle triggers differently - first create an engine with AUTOCOMMIT
             current_app.logger.info("Setting up AUTOCOMMIT engine for trigger operations")
@@ -403,14 +684,14 @@ def create_db_components():
 
             # Drop triggers one by one with explicit error handling
             current_app.logger.info("Starting trigger drop operations...")
-            for i, stmt in enumerate(drop_triggers_sql):
+            for i, stmt in enumerate(DROP_CURRENT_TRIGGERS_SQL):
                 try:
-                    current_app.logger.info(f"Dropping trigger {i+1}/{len(drop_triggers_sql)}: Starting")
+                    current_app.logger.info(f"Dropping trigger {i+1}/{len(DROP_CURRENT_TRIGGERS_SQL)}: Starting")
                     with autocommit_engine.connect() as connection:
                         # Keep statements extremely simple
                         current_app.logger.info(f"Executing drop: {stmt.strip()}")
                         connection.execute(text(stmt))
-                    current_app.logger.info(f"Dropping trigger {i+1}/{len(drop_triggers_sql)}: Complete")
+                    current_app.logger.info(f"Dropping trigger {i+1}/{len(DROP_CURRENT_TRIGGERS_SQL)}: Complete")
                 except Exception as e:
                     current_app.logger.warning(f"Error dropping trigger: {e}")
                     # Continue with the next one regardless of errors
@@ -422,14 +703,14 @@ def create_db_components():
 
             # Create triggers one by one, also with explicit error handling
             current_app.logger.info("Starting trigger create operations...")
-            for i, stmt in enumerate(create_triggers_sql):
+            for i, stmt in enumerate(CREATE_CURRENT_TRIGGERS_SQL):
                 try:
-                    current_app.logger.info(f"Creating trigger {i+1}/{len(create_triggers_sql)}: Starting")
+                    current_app.logger.info(f"Creating trigger {i+1}/{len(CREATE_CURRENT_TRIGGERS_SQL)}: Starting")
                     with autocommit_engine.connect() as connection:
                         # Keep statements extremely simple
                         current_app.logger.info(f"Executing create: {stmt.strip()}")
                         connection.execute(text(stmt))
-                    current_app.logger.info(f"Creating trigger {i+1}/{len(create_triggers_sql)}: Complete")
+                    current_app.logger.info(f"Creating trigger {i+1}/{len(CREATE_CURRENT_TRIGGERS_SQL)}: Complete")
                 except Exception as e:
                     current_app.logger.error(f"Error creating trigger: {e}")
                     # Continue regardless of errors
@@ -449,14 +730,34 @@ def update_db_schema(current_version, target_version):
     current_app.logger.info(f"Updating schema from {current_version} to {target_version}")
     
     # Import migration modules
-    from db_migrations import v0_13_to_0_15, v0_15_to_0_16, v0_16_to_0_17, v0_17_to_0_18
+    from db_migrations import v0_13_to_0_15, v0_15_to_0_16, v0_16_to_0_17, v0_17_to_0_18, v0_18_to_0_19, v0_19_to_0_20, v0_20_to_0_21, v0_21_to_0_22, v0_22_to_0_23, v0_23_to_0_24, v0_24_to_0_25, v0_25_to_0_26, v0_26_to_0_27, v0_27_to_0_28, v0_28_to_0_29, v0_29_to_0_30, v0_30_to_0_31, v0_31_to_0_32, v0_32_to_0_33, v0_33_to_0_34, v0_34_to_0_35, v0_35_to_0_36, v0_36_to_0_37, v0_37_to_0_38
     
     # Define available migrations
     migrations = {
         "0.13": {"target": "0.15", "upgrade": v0_13_to_0_15.upgrade},
         "0.15": {"target": "0.16", "upgrade": v0_15_to_0_16.upgrade},
         "0.16": {"target": "0.17", "upgrade": v0_16_to_0_17.upgrade},
-        "0.17": {"target": "0.18", "upgrade": v0_17_to_0_18.upgrade}
+        "0.17": {"target": "0.18", "upgrade": v0_17_to_0_18.upgrade},
+        "0.18": {"target": "0.19", "upgrade": v0_18_to_0_19.upgrade},
+        "0.19": {"target": "0.20", "upgrade": v0_19_to_0_20.upgrade},
+        "0.20": {"target": "0.21", "upgrade": v0_20_to_0_21.upgrade},
+        "0.21": {"target": "0.22", "upgrade": v0_21_to_0_22.upgrade},
+        "0.22": {"target": "0.23", "upgrade": v0_22_to_0_23.upgrade},
+        "0.23": {"target": "0.24", "upgrade": v0_23_to_0_24.upgrade},
+        "0.24": {"target": "0.25", "upgrade": v0_24_to_0_25.upgrade},
+        "0.25": {"target": "0.26", "upgrade": v0_25_to_0_26.upgrade},
+        "0.26": {"target": "0.27", "upgrade": v0_26_to_0_27.upgrade},
+        "0.27": {"target": "0.28", "upgrade": v0_27_to_0_28.upgrade},
+        "0.28": {"target": "0.29", "upgrade": v0_28_to_0_29.upgrade},
+        "0.29": {"target": "0.30", "upgrade": v0_29_to_0_30.upgrade},
+        "0.30": {"target": "0.31", "upgrade": v0_30_to_0_31.upgrade},
+        "0.31": {"target": "0.32", "upgrade": v0_31_to_0_32.upgrade},
+        "0.32": {"target": "0.33", "upgrade": v0_32_to_0_33.upgrade},
+        "0.33": {"target": "0.34", "upgrade": v0_33_to_0_34.upgrade},
+        "0.34": {"target": "0.35", "upgrade": v0_34_to_0_35.upgrade},
+        "0.35": {"target": "0.36", "upgrade": v0_35_to_0_36.upgrade},
+        "0.36": {"target": "0.37", "upgrade": v0_36_to_0_37.upgrade},
+        "0.37": {"target": "0.38", "upgrade": v0_37_to_0_38.upgrade}
     }
     
     effective_current_version = current_version
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import create_function_sql, create_function_ranking_sql
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.18 to 0.19."""
+    current_app.logger.info("Applying schema migration from 0.18 to 0.19 (Bulk mode aware refresh functions).")
+    try:
+        # Replace both refresh functions; the existing triggers keep pointing at them
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Replacing summary refresh function...")
+                connection.execute(text(create_function_sql))
+
+                current_app.logger.info("Replacing ranking refresh function...")
+                connection.execute(text(create_function_ranking_sql))
+
+        # Update the schema version
+        migrated_to_version = "0.19"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.18 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.18 to 0.19: {e}", exc_info=True)
+        return None
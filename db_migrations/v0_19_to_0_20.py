@@ -0,0 +1,41 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import create_function_sql, create_function_ranking_sql
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.19 to 0.20."""
+    current_app.logger.info("Applying schema migration from 0.19 to 0.20 (Background materialized view refresh).")
+    try:
+        # Create the mv_refresh_state table if it doesn't exist
+        current_app.logger.info("Ensuring mv_refresh_state table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Replace both refresh functions so the triggers only notify the background refresher
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Replacing summary refresh function...")
+                connection.execute(text(create_function_sql))
+
+                current_app.logger.info("Replacing ranking refresh function...")
+                connection.execute(text(create_function_ranking_sql))
+
+        # Update the schema version
+        migrated_to_version = "0.20"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.19 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.19 to 0.20: {e}", exc_info=True)
+        return None
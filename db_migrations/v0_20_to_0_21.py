@@ -0,0 +1,38 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import DROP_MVS_SQL, _get_create_mvs_sql, CREATE_MV_INDEXES_SQL
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.20 to 0.21."""
+    current_app.logger.info("Applying schema migration from 0.20 to 0.21 (Unique indexes on materialized views).")
+    try:
+        # Recreate the materialized views (mv_sum_totals gains its key column) and index them
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Recreating materialized views...")
+                connection.execute(text(DROP_MVS_SQL))
+                connection.execute(text(_get_create_mvs_sql()))
+
+                current_app.logger.info("Creating materialized view indexes...")
+                for stmt in CREATE_MV_INDEXES_SQL:
+                    connection.execute(text(stmt))
+
+        # Update the schema version
+        migrated_to_version = "0.21"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.20 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.20 to 0.21: {e}", exc_info=True)
+        return None
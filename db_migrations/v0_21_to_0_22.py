@@ -0,0 +1,61 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import drop_summary_mv_triggers_sql
+from summary_tables import (
+    DROP_SUMMARY_MVS_SQL,
+    CREATE_SUMMARY_TABLES_SQL,
+    CREATE_SUMMARY_FUNCTIONS_SQL,
+    REBUILD_SUMMARY_TABLES_SQL,
+    drop_summary_triggers_sql,
+    create_summary_triggers_sql
+)
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.21 to 0.22."""
+    current_app.logger.info("Applying schema migration from 0.21 to 0.22 (Incrementally maintained summary tables).")
+    try:
+        # Swap the summary materialized views for tables in one transaction, so the
+        # pages see either the old views or the filled tables
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Removing summary materialized view refresh triggers...")
+                for stmt in drop_summary_mv_triggers_sql:
+                    connection.execute(text(stmt))
+                connection.execute(text("DROP FUNCTION IF EXISTS refresh_rowing_summary_mvs() CASCADE;"))
+
+                current_app.logger.info("Replacing summary materialized views with tables...")
+                connection.execute(text(DROP_SUMMARY_MVS_SQL))
+                for stmt in CREATE_SUMMARY_TABLES_SQL:
+                    connection.execute(text(stmt))
+
+                current_app.logger.info("Creating summary delta functions and triggers...")
+                for stmt in CREATE_SUMMARY_FUNCTIONS_SQL:
+                    connection.execute(text(stmt))
+                for stmt in drop_summary_triggers_sql + create_summary_triggers_sql:
+                    connection.execute(text(stmt))
+
+                current_app.logger.info("Filling summary tables...")
+                for stmt in REBUILD_SUMMARY_TABLES_SQL:
+                    connection.execute(text(stmt))
+
+                connection.execute(text("DELETE FROM mv_refresh_state WHERE view_group = 'summary';"))
+
+        # Update the schema version
+        migrated_to_version = "0.22"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.21 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.21 to 0.22: {e}", exc_info=True)
+        return None
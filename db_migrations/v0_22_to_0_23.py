@@ -0,0 +1,57 @@
+from sqlalchemy import text
+from models import UserSetting
+
+# Packs the per-sample rows into one array row per workout metric, in time order
+# (sample_id breaks ties between samples recorded at the same offset)
+CONVERT_WORKOUT_SAMPLES_SQL = """
+    INSERT INTO workout_series (workout_id, metric_descriptor_id, time_offset_seconds, sample_values)
+    SELECT
+        workout_id,
+        metric_descriptor_id,
+        array_agg(time_offset_seconds ORDER BY time_offset_seconds, sample_id),
+        array_agg(value::double precision ORDER BY time_offset_seconds, sample_id)
+    FROM workout_samples
+    GROUP BY workout_id, metric_descriptor_id
+    ON CONFLICT (workout_id, metric_descriptor_id) DO NOTHING;
+"""
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.22 to 0.23."""
+    current_app.logger.info("Applying schema migration from 0.22 to 0.23 (Columnar workout series storage).")
+    try:
+        # Create the workout_series table if it doesn't exist
+        current_app.logger.info("Ensuring workout_series table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Convert and drop the old rows in one transaction
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                if connection.execute(text("SELECT to_regclass('workout_samples') IS NOT NULL")).scalar():
+                    current_app.logger.info("Converting workout_samples rows to workout_series arrays...")
+                    connection.execute(text("LOCK TABLE workout_samples IN SHARE MODE;")) # No new samples while converting
+                    converted = connection.execute(text(CONVERT_WORKOUT_SAMPLES_SQL)).rowcount
+                    current_app.logger.info(f"Created {converted} workout_series rows.")
+
+                    current_app.logger.info("Dropping workout_samples table...")
+                    connection.execute(text("DROP TABLE workout_samples;"))
+
+        # Update the schema version
+        migrated_to_version = "0.23"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.22 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.22 to 0.23: {e}", exc_info=True)
+        return None
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import SAMPLE_INDEXES_SQL, build_indexes_concurrently
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.23 to 0.24."""
+    current_app.logger.info("Applying schema migration from 0.23 to 0.24 (Per-workout sample indexes).")
+    try:
+        # Build the indexes without blocking writes (CONCURRENTLY, outside a transaction)
+        build_indexes_concurrently(SAMPLE_INDEXES_SQL)
+
+        # Index-only scans depend on the visibility map; refresh it and the statistics now
+        # instead of waiting for autovacuum
+        autocommit_engine = db_obj.engine.execution_options(isolation_level="AUTOCOMMIT")
+        with autocommit_engine.connect() as connection:
+            current_app.logger.info("Vacuuming heart_rate_samples...")
+            connection.execute(text("VACUUM (ANALYZE) heart_rate_samples;"))
+
+        # Update the schema version
+        migrated_to_version = "0.24"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.23 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.23 to 0.24: {e}", exc_info=True)
+        return None
@@ -0,0 +1,36 @@
+from models import UserSetting
+from workout_stats import backfill_workout_stats
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.24 to 0.25."""
+    current_app.logger.info("Applying schema migration from 0.24 to 0.25 (Precomputed workout statistics).")
+    try:
+        # Create the workout_stats table if it doesn't exist
+        current_app.logger.info("Ensuring workout_stats table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Compute the statistics of the existing workouts (committed in batches)
+        current_app.logger.info("Computing statistics for existing workouts...")
+        processed = backfill_workout_stats(only_missing=True)
+        current_app.logger.info(f"Computed statistics for {processed} workouts.")
+
+        # Update the schema version
+        migrated_to_version = "0.25"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.24 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.24 to 0.25: {e}", exc_info=True)
+        return None
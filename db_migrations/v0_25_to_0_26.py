@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from models import UserSetting
+from workout_splits import recompute_stale_splits
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.25 to 0.26."""
+    current_app.logger.info("Applying schema migration from 0.25 to 0.26 (Stored split tables).")
+    try:
+        # Create the workout_splits table if it doesn't exist
+        current_app.logger.info("Ensuring workout_splits table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Record which split schemes are stored per workout
+        current_app.logger.info("Adding split_schemes column to workout_stats...")
+        db_obj.session.execute(text("ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS split_schemes text[]"))
+        db_obj.session.commit()
+
+        # Store the splits of the configured schemes for the existing workouts (committed in batches)
+        current_app.logger.info("Computing split tables for existing workouts...")
+        processed = recompute_stale_splits()
+        current_app.logger.info(f"Computed split tables for {processed} workouts.")
+
+        # Update the schema version
+        migrated_to_version = "0.26"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.25 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.25 to 0.26: {e}", exc_info=True)
+        return None
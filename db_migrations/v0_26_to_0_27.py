@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from models import UserSetting
+from best_efforts import backfill_best_efforts
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.26 to 0.27."""
+    current_app.logger.info("Applying schema migration from 0.26 to 0.27 (Best efforts).")
+    try:
+        # Create the workout_best_efforts table (and its indexes) if it doesn't exist
+        current_app.logger.info("Ensuring workout_best_efforts table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Record which ranking settings were searched per workout
+        current_app.logger.info("Adding best_effort_ranking_ids column to workout_stats...")
+        db_obj.session.execute(text("ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS best_effort_ranking_ids integer[]"))
+        db_obj.session.commit()
+
+        # Search the best efforts of the existing workouts (committed in batches)
+        current_app.logger.info("Searching best efforts in existing workouts...")
+        processed = backfill_best_efforts(only_stale=True)
+        current_app.logger.info(f"Searched best efforts in {processed} workouts.")
+
+        # Update the schema version
+        migrated_to_version = "0.27"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.26 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.26 to 0.27: {e}", exc_info=True)
+        return None
@@ -0,0 +1,36 @@
+from models import UserSetting
+from power_curve import backfill_power_curves
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.27 to 0.28."""
+    current_app.logger.info("Applying schema migration from 0.27 to 0.28 (Power curves).")
+    try:
+        # Create the workout_power_curves and power_curve_records tables if they don't exist
+        current_app.logger.info("Ensuring power curve tables exist...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Compute the power curves of the existing workouts (committed in batches) and build the envelope
+        current_app.logger.info("Computing power curves for existing workouts...")
+        processed = backfill_power_curves(only_missing=True)
+        current_app.logger.info(f"Computed power curves for {processed} workouts.")
+
+        # Update the schema version
+        migrated_to_version = "0.28"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.27 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.27 to 0.28: {e}", exc_info=True)
+        return None
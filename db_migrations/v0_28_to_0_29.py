@@ -0,0 +1,36 @@
+from models import UserSetting
+from workout_stats import backfill_workout_stats
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.28 to 0.29."""
+    current_app.logger.info("Applying schema migration from 0.28 to 0.29 (Workout metric histograms).")
+    try:
+        # Create the workout_histograms table if it doesn't exist
+        current_app.logger.info("Ensuring workout_histograms table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Recompute the statistics of all workouts, which now also stores their histograms (committed in batches)
+        current_app.logger.info("Computing histograms for existing workouts...")
+        processed = backfill_workout_stats(only_missing=False)
+        current_app.logger.info(f"Computed histograms for {processed} workouts.")
+
+        # Update the schema version
+        migrated_to_version = "0.29"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.28 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.28 to 0.29: {e}", exc_info=True)
+        return None
@@ -0,0 +1,38 @@
+from sqlalchemy import text
+from models import UserSetting
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.29 to 0.30."""
+    current_app.logger.info("Applying schema migration from 0.29 to 0.30 (HR zone rows recomputed for the configured zones).")
+    try:
+        # Create the background_job_status table if it doesn't exist
+        current_app.logger.info("Ensuring background_job_status table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Zone bounds the stored workout_hr_zones rows were computed with (NULL: rows as imported)
+        current_app.logger.info("Adding hr_zone_rows_bounds column to workout_stats...")
+        db_obj.session.execute(text("ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS hr_zone_rows_bounds integer[]"))
+
+        # The zone rows themselves are recomputed by the background job worker, which runs
+        # every job when it starts (or `flask recompute-hr-zones`)
+
+        # Update the schema version
+        migrated_to_version = "0.30"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.29 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.29 to 0.30: {e}", exc_info=True)
+        return None
@@ -0,0 +1,38 @@
+from sqlalchemy import text
+from models import UserSetting
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.30 to 0.31."""
+    current_app.logger.info("Applying schema migration from 0.30 to 0.31 (Downsampled chart series).")
+    try:
+        # Create the workout_series_levels table if it doesn't exist
+        current_app.logger.info("Ensuring workout_series_levels table exists...")
+        with current_app.app_context():
+            db_obj.create_all()
+
+        # Bucket widths the stored levels were built with (NULL: not built yet)
+        current_app.logger.info("Adding series_level_buckets column to workout_stats...")
+        db_obj.session.execute(text("ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS series_level_buckets integer[]"))
+
+        # The levels are built by the background job worker, which runs every job when it
+        # starts (or `flask build-series-levels`); until then charts downsample on the fly
+
+        # Update the schema version
+        migrated_to_version = "0.31"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.30 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.30 to 0.31: {e}", exc_info=True)
+        return None
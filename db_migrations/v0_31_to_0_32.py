@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import (
+    create_function_metric_descriptors_sql,
+    drop_metric_descriptor_triggers_sql,
+    create_metric_descriptor_triggers_sql
+)
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.31 to 0.32."""
+    current_app.logger.info("Applying schema migration from 0.31 to 0.32 (Metric descriptor cache invalidation).")
+    try:
+        # Notify the app processes of any metric_descriptors change, so they drop their descriptor cache
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Creating metric descriptor notification function and trigger...")
+                connection.execute(text(create_function_metric_descriptors_sql))
+                for stmt in drop_metric_descriptor_triggers_sql + create_metric_descriptor_triggers_sql:
+                    connection.execute(text(stmt))
+
+        # Update the schema version
+        migrated_to_version = "0.32"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.31 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.31 to 0.32: {e}", exc_info=True)
+        return None
@@ -0,0 +1,29 @@
+from models import UserSetting
+from database_setup import LIST_INDEXES_SQL, build_indexes_concurrently
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.34 to 0.35."""
+    current_app.logger.info("Applying schema migration from 0.34 to 0.35 (Workouts list sort and filter indexes).")
+    try:
+        # Build the new indexes without blocking writes (CONCURRENTLY, outside a transaction)
+        build_indexes_concurrently(LIST_INDEXES_SQL)
+
+        # Update the schema version
+        migrated_to_version = "0.35"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.34 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.34 to 0.35: {e}", exc_info=True)
+        return None
@@ -0,0 +1,41 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import create_function_power_curve_repair_sql, drop_power_curve_triggers_sql, create_power_curve_triggers_sql
+from power_curve import REBUILD_ENVELOPE_SQL
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.36 to 0.37."""
+    current_app.logger.info("Applying schema migration from 0.36 to 0.37 (Power curve envelope repair on workout deletion).")
+    try:
+        # Refill the envelope points of deleted workouts from the remaining curves
+        with db_obj.engine.connect() as connection:
+            with connection.begin():
+                current_app.logger.info("Creating power curve envelope repair trigger...")
+                connection.execute(text(create_function_power_curve_repair_sql))
+                for stmt in drop_power_curve_triggers_sql + create_power_curve_triggers_sql:
+                    connection.execute(text(stmt))
+
+                # Workouts deleted before this version left gaps in the envelope
+                current_app.logger.info("Rebuilding the power curve envelope...")
+                for stmt in REBUILD_ENVELOPE_SQL:
+                    connection.execute(text(stmt))
+
+        # Update the schema version
+        migrated_to_version = "0.37"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.36 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.36 to 0.37: {e}", exc_info=True)
+        return None
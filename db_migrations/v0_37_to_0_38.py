@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from models import UserSetting
+from database_setup import LIST_INDEXES_SQL, build_indexes_concurrently
+
+def upgrade(db_obj, current_app):
+    """Upgrade database from version 0.37 to 0.38."""
+    current_app.logger.info("Applying schema migration from 0.37 to 0.38 (Full workouts list sort indexes).")
+    try:
+        # Drop the partial (column IS NOT NULL) sort indexes of 0.35; workouts without a value
+        # are now listed under every sort
+        autocommit_engine = db_obj.engine.execution_options(isolation_level="AUTOCOMMIT")
+        with autocommit_engine.connect() as connection:
+            for index_name in LIST_INDEXES_SQL:
+                is_partial = connection.execute(text(
+                    "SELECT indpred IS NOT NULL FROM pg_index WHERE indexrelid = to_regclass(:index_name)"
+                ), {'index_name': index_name}).scalar()
+                if is_partial:
+                    current_app.logger.info(f"Dropping partial index {index_name}...")
+                    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};"))
+
+        # Build them again as full indexes without blocking writes
+        build_indexes_concurrently(LIST_INDEXES_SQL)
+
+        # Update the schema version
+        migrated_to_version = "0.38"
+        setting = db_obj.session.query(UserSetting).filter_by(key='db_schema_ver').first()
+        if setting:
+            setting.value = migrated_to_version
+            current_app.logger.info(f"Updated db_schema_ver to {migrated_to_version}")
+        else:
+            new_setting = UserSetting(key='db_schema_ver', value=migrated_to_version)
+            db_obj.session.add(new_setting)
+            current_app.logger.info(f"Set initial db_schema_ver to {migrated_to_version}")
+
+        db_obj.session.commit()
+        current_app.logger.info(f"Database schema migration from 0.37 to {migrated_to_version} completed successfully.")
+        return migrated_to_version
+
+    except Exception as e:
+        db_obj.session.rollback()
+        current_app.logger.error(f"Error migrating schema from 0.37 to 0.38: {e}", exc_info=True)
+        return None
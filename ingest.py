@@ -0,0 +1,471 @@
+# ========================================================
+# = ingest.py - MyWellness JSON import and bulk write helpers
+# ========================================================
+import io
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from models import db, EquipmentType, Workout, WorkoutHRZone
+from metric_descriptors import metric_descriptors
+from sample_loader import build_workout_samples
+from workout_stats import refresh_workout_stats
+from workout_splits import refresh_workout_splits
+from best_efforts import refresh_workout_best_efforts
+from power_curve import refresh_workout_power_curve
+from workout_hr_zones import refresh_workout_hr_zones
+from series_levels import refresh_workout_series_levels
+
+# List of metric names to ignore for MetricDescriptor and WorkoutSeries creation
+IGNORED_METRIC_NAMES = ["MetsMin", "Calories", "Level", "IsoReps", "Duration"]
+
+# Default equipment for MyWellness JSON submissions
+JSON_IMPORT_EQUIPMENT_NAME = "SKILLROW"
+
+# --------------------------------------------------------
+# - Import Exceptions
+#---------------------------------------------------------
+# Raised when a MyWellness JSON document cannot be turned into a workout.
+# The message is safe to show to the user (flash message or import report).
+class WorkoutImportError(Exception):
+    pass
+
+# Raised when the document's cardioLogId has already been imported.
+class DuplicateWorkoutError(WorkoutImportError):
+    def __init__(self, cardio_log_id, workout_id):
+        super().__init__(f'Workout with Cardio Log ID {cardio_log_id} already exists.')
+        self.cardio_log_id = cardio_log_id
+        self.workout_id = workout_id # ID of the already stored workout
+
+# --------------------------------------------------------
+# - Columnar Row Buffer
+#---------------------------------------------------------
+# Collects rows for a single table column by column and writes them
+# with one PostgreSQL COPY FROM STDIN instead of one INSERT per row.
+class ColumnBuffer:
+    # -- Initialization Method -------------------
+    def __init__(self, table_name, column_names):
+        self.table_name = table_name # Target table
+        self.column_names = list(column_names) # Columns written by COPY, in order
+        self.columns = {name: [] for name in self.column_names} # One list per column
+
+    # -- Append a Row -------------------
+    def append(self, *values):
+        for name, value in zip(self.column_names, values):
+            self.columns[name].append(value)
+
+    def __len__(self):
+        return len(self.columns[self.column_names[0]]) if self.column_names else 0
+
+    # -- Serialize Buffer to COPY Text Format -------------------
+    def _to_copy_text(self):
+        output = io.StringIO()
+        for row in zip(*(self.columns[name] for name in self.column_names)):
+            output.write('\t'.join(_format_copy_value(value) for value in row))
+            output.write('\n')
+        output.seek(0)
+        return output
+
+    # -- Write Buffer Using COPY -------------------
+    # `connection` is the SQLAlchemy Connection of the current session transaction,
+    # so the rows are committed or rolled back together with the rest of the workout.
+    def copy_to(self, connection):
+        if not len(self):
+            return 0
+        copy_sql = f"COPY {self.table_name} ({', '.join(self.column_names)}) FROM STDIN"
+        cursor = connection.connection.cursor() # Raw psycopg2 cursor on the same connection
+        try:
+            cursor.copy_expert(copy_sql, self._to_copy_text())
+        finally:
+            cursor.close()
+        return len(self)
+
+# Formats a single value for the COPY text format (NULL is \N, special characters escaped).
+# Lists are written as PostgreSQL array literals ({1,2,NULL}); elements must be numbers.
+def _format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join('NULL' if element is None else str(element) for element in value) + '}'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+# --------------------------------------------------------
+# - Ingest Timing
+#---------------------------------------------------------
+# Accumulates wall time per ingest phase and logs a one-line breakdown.
+class IngestTimer:
+    # -- Initialization Method -------------------
+    def __init__(self):
+        self.phases = {} # Phase name -> seconds, in first-use order
+        self.counts = {} # Counter name -> total (e.g. rows written)
+
+    # -- Time a Phase -------------------
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - started)
+
+    # -- Count Items -------------------
+    def count(self, name, amount):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    # -- Log Breakdown -------------------
+    def log(self, label):
+        total = sum(self.phases.values())
+        breakdown = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.phases.items())
+        counters = ''.join(f", {name}={amount}" for name, amount in self.counts.items())
+        current_app.logger.info(f"Ingest timing for {label}: {breakdown}, total={total * 1000:.1f}ms{counters}")
+
+# --------------------------------------------------------
+# - Equipment Type for JSON Imports
+#---------------------------------------------------------
+# Returns the equipment type used for MyWellness imports, creating it if needed.
+def get_json_import_equipment_type():
+    equipment_type = EquipmentType.query.filter_by(name=JSON_IMPORT_EQUIPMENT_NAME).first()
+    if not equipment_type: # Create if not exists
+        equipment_type = EquipmentType(name=JSON_IMPORT_EQUIPMENT_NAME)
+        db.session.add(equipment_type)
+        db.session.flush() # Ensure ID is available
+    return equipment_type
+
+# --------------------------------------------------------
+# - MyWellness JSON Workout Import
+#---------------------------------------------------------
+# Builds a workout with its samples, heart rate samples, HR zones and statistics from a parsed
+# MyWellness JSON document and writes it to the current session transaction.
+# Does not commit; the caller decides the transaction boundary.
+# Raises WorkoutImportError (or DuplicateWorkoutError) for invalid or already imported documents.
+def import_mywellness_workout(json_data, workout_notes=None, ingest_timer=None, equipment_type=None, check_existing=True):
+    if ingest_timer is None:
+        ingest_timer = IngestTimer()
+
+    # == Main Workout Data Extraction ============================================
+    workout_main_container = json_data.get('data', {}) if isinstance(json_data, dict) else None # Main data object in JSON
+    if not workout_main_container:
+        raise WorkoutImportError('Main "data" object is missing or empty in the submitted JSON.')
+
+    # == Equipment Type Handling ============================================
+    if equipment_type is None: # Batch imports resolve the equipment type once and pass it in
+        equipment_type = get_json_import_equipment_type()
+
+    # == Cardio Log ID and Existing Workout Check ============================================
+    cardio_log_id = workout_main_container.get('cardioLogId')
+    if not cardio_log_id:
+        raise WorkoutImportError('Cardio Log ID is missing.')
+
+    if check_existing: # Batch imports dedupe all cardio log IDs with one query up front
+        existing_workout = Workout.query.filter_by(cardio_log_id=cardio_log_id).first()
+        if existing_workout:
+            # Future: Consider updating notes if new notes are provided for an existing workout
+            raise DuplicateWorkoutError(cardio_log_id, existing_workout.workout_id)
+
+    # == Workout Date Parsing ============================================
+    workout_date_str = workout_main_container.get('date')
+    try:
+        workout_date_obj = datetime.strptime(workout_date_str, '%d/%m/%Y').date() # Expected format DD/MM/YYYY
+    except (ValueError, TypeError):
+        raise WorkoutImportError(f'Invalid date format: {workout_date_str}. Expected DD/MM/YYYY.')
+
+    # == Create Initial Workout Object ============================================
+    new_workout = Workout(
+        cardio_log_id=cardio_log_id,
+        equipment_type_id=equipment_type.equipment_type_id if equipment_type else None,
+        workout_name=workout_main_container.get('name'),
+        workout_date=workout_date_obj,
+        target_description=workout_main_container.get('target'),
+        notes=workout_notes if workout_notes and workout_notes.strip() else None # Save notes if provided
+        # Summary fields (duration, distance, split, isoreps) will be populated later
+    )
+    db.session.add(new_workout)
+    db.session.flush() # Get new_workout.workout_id for foreign key relations
+
+    # == Metric Descriptor Processing ============================================
+    # -- Create or Get Metric Descriptors from JSON -------------------
+    descriptors_json = workout_main_container.get('analitics', {}).get('descriptor', [])
+    metric_descriptor_map_for_samples = {} # Maps JSON index 'i' to metric_descriptor_id
+    metric_names_by_descriptor_id = {} # Maps metric_descriptor_id to its metric name
+    metric_units_by_descriptor_id = {} # Maps metric_descriptor_id to its unit of measure
+    
+    isoreps_metric_json_index = None # To identify IsoReps metric JSON index for summary
+    level_metric_json_index = None # To identify Level metric JSON index for averaging
+
+    with ingest_timer.phase('descriptor_resolve'):
+        for desc_data_from_json in descriptors_json:
+            json_i = desc_data_from_json.get('i') # Index from JSON used to map samples
+            metric_name_from_json = desc_data_from_json.get('pr', {}).get('name')
+            unit_of_measure_from_json = desc_data_from_json.get('pr', {}).get('um')
+
+            if metric_name_from_json is None: # Skip if essential data is missing
+                current_app.logger.warning(f"Skipping descriptor due to missing name: {desc_data_from_json}")
+                continue
+
+            # Identify Level and IsoReps JSON indices even if they are ignored for DB storage
+            if metric_name_from_json == 'Level' and unit_of_measure_from_json == 'Number':
+                level_metric_json_index = json_i
+            elif metric_name_from_json == 'IsoReps' and unit_of_measure_from_json == 'Number':
+                isoreps_metric_json_index = json_i
+
+            # Skip creating MetricDescriptor and WorkoutSeries for ignored metrics
+            if metric_name_from_json in IGNORED_METRIC_NAMES:
+                current_app.logger.info(f"Ignoring metric descriptor: {metric_name_from_json} ({unit_of_measure_from_json})")
+                continue
+
+            # -- Find or Create MetricDescriptor in DB -------------------
+            # Cached per process; a missing descriptor is inserted in this transaction without
+            # conflicting with concurrent imports (see metric_descriptors.MetricDescriptorRegistry)
+            metric_descriptor_id = metric_descriptors.get_id(metric_name_from_json, unit_of_measure_from_json)
+
+            # -- Populate Map -------------------
+            if json_i is not None:
+                metric_descriptor_map_for_samples[json_i] = metric_descriptor_id
+                metric_names_by_descriptor_id[metric_descriptor_id] = metric_name_from_json
+                metric_units_by_descriptor_id[metric_descriptor_id] = unit_of_measure_from_json
+    
+    # == Workout Sample Processing ============================================
+    # Samples are gathered per metric and written as one workout_series row each (see below).
+    samples_json = workout_main_container.get('analitics', {}).get('samples', [])
+    last_isoreps_value = None # To store the final IsoReps count for summary
+    level_time_value_pairs = [] # To store (time, level) for averaging
+    samples_by_descriptor_id = {} # Maps metric_descriptor_id to its list of (time, value) samples
+
+    with ingest_timer.phase('parse'):
+        for sample_json in samples_json:
+            time_offset = sample_json.get('t') # Time offset for the sample
+            values_from_json = sample_json.get('vs', []) # List of values, index corresponds to descriptor's 'i'
+            
+            # Collect level values if Level metric exists
+            if level_metric_json_index is not None and \
+               level_metric_json_index < len(values_from_json) and \
+               time_offset is not None:
+                try:
+                    level_value_at_sample = float(values_from_json[level_metric_json_index])
+                    level_time_value_pairs.append((float(time_offset), level_value_at_sample))
+                except (ValueError, TypeError):
+                    current_app.logger.warning(f"Could not parse level value or time for averaging: time={time_offset}, value={values_from_json[level_metric_json_index]}")
+
+            # Process non-ignored samples and track last IsoReps value
+            for original_json_index, value in enumerate(values_from_json):
+                # Track Last IsoReps Value directly from samples using its identified JSON index
+                if isoreps_metric_json_index is not None and original_json_index == isoreps_metric_json_index:
+                    last_isoreps_value = value
+
+                metric_descriptor_id = metric_descriptor_map_for_samples.get(original_json_index) # Get corresponding descriptor id
+                if metric_descriptor_id is not None and time_offset is not None: # If a descriptor exists for this sample index (i.e., not ignored)
+                    samples_by_descriptor_id.setdefault(metric_descriptor_id, []).append((time_offset, value))
+
+        # -- Order Each Series by Time -------------------
+        # Stable sort, so samples sharing a time offset keep their document order
+        for descriptor_samples in samples_by_descriptor_id.values():
+            descriptor_samples.sort(key=lambda sample: sample[0])
+
+    # == Workout Summary Data Population ============================================
+    # -- Initialize Summary Variables -------------------
+    extracted_duration_seconds = None
+    calculated_total_distance_meters = None
+    calculated_average_split_seconds_500m = None
+    
+    # -- Extract Duration from Summary Data -------------------
+    summary_entries_json = workout_main_container.get('data', []) # This 'data' is different from the top-level 'data'
+    for entry_json in summary_entries_json:
+        property_key = entry_json.get('property')
+        if property_key == 'Move': continue # Skip 'Move' property
+        if property_key == 'Duration':
+            try:
+                raw_duration_value = float(entry_json.get('rawValue'))
+                unit = entry_json.get('uM', '').lower()
+                # Convert duration to seconds based on unit
+                if unit in ["min", "minute", "minutes"]: extracted_duration_seconds = raw_duration_value * 60
+                elif unit in ["h", "hour", "hours"]: extracted_duration_seconds = raw_duration_value * 3600
+                elif unit in ["ms", "millisecond", "milliseconds"]: extracted_duration_seconds = raw_duration_value / 1000.0
+                elif unit in ["s", "sec", "second", "seconds"] or not unit: extracted_duration_seconds = raw_duration_value
+                if extracted_duration_seconds is not None: break # Stop if duration found
+            except (ValueError, TypeError): pass # Ignore parsing errors for this field
+    
+    # -- Calculate Total Distance from Samples -------------------
+    distance_metric_descriptor_id_to_check = None
+    # Find a 'distance' metric descriptor
+    for metric_descriptor_id in metric_descriptor_map_for_samples.values():
+        if 'distance' in metric_names_by_descriptor_id[metric_descriptor_id].lower():
+            distance_metric_descriptor_id_to_check = metric_descriptor_id
+            break
+    
+    if distance_metric_descriptor_id_to_check: # If a distance descriptor was found
+        # Use the latest sample of this distance metric
+        distance_samples = samples_by_descriptor_id.get(distance_metric_descriptor_id_to_check)
+        last_distance_sample = distance_samples[-1] if distance_samples else None
+        if last_distance_sample and last_distance_sample[1] is not None:
+            calculated_total_distance_meters = float(last_distance_sample[1])
+    
+    # -- Fallback: Extract Distance from Summary Data if not found in samples -------------------
+    if calculated_total_distance_meters is None: 
+        for entry_json in summary_entries_json:
+            pkey = entry_json.get('property', '').lower()
+            if 'distance' in pkey:
+                try:
+                    val = float(entry_json.get('rawValue'))
+                    unit = entry_json.get('uM', '').lower()
+                    # Convert distance to meters based on unit
+                    if unit == 'km': calculated_total_distance_meters = val * 1000
+                    elif unit == 'mi': calculated_total_distance_meters = val * 1609.34 # Miles to meters
+                    elif unit == 'm' or not unit: calculated_total_distance_meters = val
+                    if calculated_total_distance_meters is not None: break # Stop if distance found
+                except (ValueError, TypeError): pass # Ignore parsing errors
+    
+    # -- Calculate Average Split -------------------
+    if extracted_duration_seconds is not None and calculated_total_distance_meters is not None and calculated_total_distance_meters > 0:
+        calculated_average_split_seconds_500m = (extracted_duration_seconds / calculated_total_distance_meters) * 500
+    
+    # -- Update Workout Object with Summary Data -------------------
+    new_workout.duration_seconds = extracted_duration_seconds
+    new_workout.total_distance_meters = calculated_total_distance_meters
+    new_workout.average_split_seconds_500m = calculated_average_split_seconds_500m
+    new_workout.total_isoreps = last_isoreps_value # Set total IsoReps from last sample
+
+    # == Calculate Time-Weighted Average Level ============================================
+    calculated_average_level = None
+    if level_metric_json_index is not None and level_time_value_pairs and \
+       extracted_duration_seconds is not None and extracted_duration_seconds > 0:
+        
+        level_time_value_pairs.sort(key=lambda x: x[0]) # Ensure sorted by time
+        
+        weighted_level_sum = 0.0
+        last_interval_end_time = 0.0
+        
+        for sample_time, level_value in level_time_value_pairs:
+            # The level `level_value` is recorded at `sample_time`.
+            # This level is considered active for the interval (last_interval_end_time, sample_time].
+            
+            effective_event_time = min(sample_time, extracted_duration_seconds)
+            interval_duration = effective_event_time - last_interval_end_time
+            
+            if interval_duration > 0:
+                weighted_level_sum += float(level_value) * interval_duration
+            
+            last_interval_end_time = effective_event_time
+            
+            if last_interval_end_time >= extracted_duration_seconds:
+                break # All relevant intervals covered up to total workout duration
+        
+        # If the last sample's time was before the total workout duration,
+        # the last known level persists for the remaining time.
+        if last_interval_end_time < extracted_duration_seconds and level_time_value_pairs:
+            # This condition implies the loop finished before reaching extracted_duration_seconds
+            # or all samples were processed and last_interval_end_time is still less.
+            last_recorded_level = float(level_time_value_pairs[-1][1])
+            remaining_duration = extracted_duration_seconds - last_interval_end_time
+            if remaining_duration > 0:
+                weighted_level_sum += last_recorded_level * remaining_duration
+        
+        if extracted_duration_seconds > 0: # Denominator must be positive
+            calculated_average_level = weighted_level_sum / extracted_duration_seconds
+    
+    elif level_time_value_pairs: # Fallback if duration is 0 or None, but levels exist
+        # Calculate a simple average if duration is not usable for weighted average
+        sum_of_levels = sum(lvl_pair[1] for lvl_pair in level_time_value_pairs)
+        calculated_average_level = sum_of_levels / len(level_time_value_pairs)
+
+    new_workout.level = calculated_average_level
+
+
+    # == Heart Rate Data Processing ============================================
+    # -- Process HeartRateSamples -------------------
+    # Look for HR samples in various possible locations in the JSON
+    hr_samples_json = json_data.get('hr', workout_main_container.get('hr', workout_main_container.get('analitics', {}).get('hr', [])))
+    heart_rate_sample_buffer = ColumnBuffer('heart_rate_samples', ['workout_id', 'time_offset_seconds', 'heart_rate_bpm'])
+    if hr_samples_json:
+        for hr_item in hr_samples_json:
+            if hr_item.get('hr') is not None: # Ensure HR value exists
+                heart_rate_sample_buffer.append(new_workout.workout_id, hr_item.get('t'), hr_item.get('hr'))
+    
+    # -- Process WorkoutHRZones -------------------
+    # Look for HR zones in various possible locations in the JSON. They are only stored for
+    # workouts without HR samples: with samples, the zone rows are computed for the configured
+    # zones below (refresh_workout_hr_zones).
+    hr_zones_json = json_data.get('hrZones', workout_main_container.get('hrZones', workout_main_container.get('analitics', {}).get('hrZones', [])))
+    if hr_zones_json and not len(heart_rate_sample_buffer):
+        for zone_item in hr_zones_json:
+            db.session.add(WorkoutHRZone(
+                workout_id=new_workout.workout_id, 
+                zone_name=zone_item.get('name'), 
+                color_hex=zone_item.get('color'), 
+                lower_bound_bpm=zone_item.get('lowerBound'), 
+                upper_bound_bpm=zone_item.get('upperBound'), 
+                seconds_in_zone=zone_item.get('secondsInZone')
+            ))
+
+    # == Bulk Sample Write ============================================
+    # One COPY round-trip per table, on the session's connection so it shares the workout transaction.
+    # Each metric becomes a single workout_series row holding its times and values as arrays.
+    workout_series_buffer = ColumnBuffer('workout_series', ['workout_id', 'metric_descriptor_id', 'time_offset_seconds', 'sample_values'])
+    written_samples = 0
+    for descriptor_id, descriptor_samples in samples_by_descriptor_id.items():
+        workout_series_buffer.append(
+            new_workout.workout_id,
+            descriptor_id,
+            [time_offset for time_offset, _value in descriptor_samples],
+            [value for _time_offset, value in descriptor_samples]
+        )
+        written_samples += len(descriptor_samples)
+
+    with ingest_timer.phase('sample_write'):
+        db.session.flush() # Write pending ORM rows (workout summary, HR zones) first
+        session_connection = db.session.connection()
+        workout_series_buffer.copy_to(session_connection)
+        written_hr_samples = heart_rate_sample_buffer.copy_to(session_connection)
+    ingest_timer.count('samples', written_samples)
+    ingest_timer.count('hr_samples', written_hr_samples)
+
+    # == Derived Statistics ============================================
+    # Averages, maxima and HR zone times for the details and list pages (workout_stats),
+    # the split tables of the configured schemes (workout_splits), the best efforts
+    # for the ranking settings (workout_best_efforts), the power curve with the
+    # envelope points it beats (workout_power_curves, power_curve_records), the
+    # downsampled chart series (workout_series_levels) and, with heart rate samples,
+    # the zone rows for the configured HR zones (workout_hr_zones)
+    with ingest_timer.phase('stats'):
+        # Built from the samples just written, without reading them back
+        workout_samples = build_workout_samples(
+            [(descriptor_id, metric_names_by_descriptor_id[descriptor_id], metric_units_by_descriptor_id[descriptor_id], descriptor_samples)
+             for descriptor_id, descriptor_samples in samples_by_descriptor_id.items()],
+            list(zip(heart_rate_sample_buffer.columns['time_offset_seconds'], heart_rate_sample_buffer.columns['heart_rate_bpm']))
+        )
+        refresh_workout_stats(new_workout.workout_id, workout_samples=workout_samples)
+        refresh_workout_splits(new_workout.workout_id, workout_samples)
+        refresh_workout_best_efforts(new_workout.workout_id, workout_samples)
+        refresh_workout_power_curve(new_workout.workout_id, workout_samples, new_workout.workout_date)
+        refresh_workout_series_levels(new_workout.workout_id, workout_samples)
+        refresh_workout_hr_zones(new_workout.workout_id, workout_samples=workout_samples)
+
+    return new_workout
+
+# --------------------------------------------------------
+# - JSON Backup
+#---------------------------------------------------------
+# Writes the original JSON document to json_backup/<date>-<workout_id>.json.
+# Returns None on success or an error message if the backup could not be written.
+def backup_workout_json(workout, raw_json_data_str):
+    try:
+        backup_dir = os.path.join(current_app.root_path, 'json_backup')
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+        
+        # Format date for filename (YYYY-MM-DD)
+        filename_date_str = workout.workout_date.strftime('%Y-%m-%d')
+        backup_filename = f"{filename_date_str}-{workout.workout_id}.json"
+        backup_filepath = os.path.join(backup_dir, backup_filename)
+        
+        # Encode it to bytes before writing to a file opened in binary mode
+        with open(backup_filepath, 'wb') as f: 
+            f.write(raw_json_data_str.encode('utf-8')) 
+        current_app.logger.info(f"Successfully backed up JSON to {backup_filepath}")
+        return None
+    except IOError as e:
+        current_app.logger.error(f"Failed to backup JSON for workout {workout.workout_id}: {e}", exc_info=True)
+        return f"JSON backup failed: {str(e)}"
+    except Exception as e: # Catch any other unexpected errors during backup
+        current_app.logger.error(f"Unexpected error during JSON backup for workout {workout.workout_id}: {e}", exc_info=True)
+        return f"JSON backup encountered an unexpected error: {str(e)}"
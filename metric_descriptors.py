@@ -0,0 +1,115 @@
+# ========================================================
+# = metric_descriptors.py - Process-wide metric descriptor registry
+# ========================================================
+import threading
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db
+from database_setup import METRIC_DESCRIPTORS_CHANNEL
+from cache_listener import invalidation_handler
+
+# Transaction-level advisory lock (with the metric name hash as second key) serializing the
+# creation of descriptors without a unit, which the unique constraint cannot catch (NULLs differ)
+METRIC_DESCRIPTOR_LOCK_KEY = 72_510_403
+
+# Session.info key of the descriptors created in the session's open transaction
+PENDING_DESCRIPTORS_KEY = 'pending_metric_descriptors'
+
+# --------------------------------------------------------
+# - Descriptor Registry
+#---------------------------------------------------------
+# Cache of {(metric_name, unit_of_measure): metric_descriptor_id}, loaded once per process.
+# Only committed descriptors are cached: ids created in an open transaction are kept on the
+# session until it commits (a rolled back import must not leave ids behind). Any change to
+# metric_descriptors notifies METRIC_DESCRIPTORS_CHANNEL, which clears the cache in every
+# process (cache_listener.CacheInvalidationListener).
+class MetricDescriptorRegistry:
+    def __init__(self):
+        self._ids = None # Not loaded yet
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = None
+
+    # Loads all committed descriptors on a connection of its own, outside the session transaction
+    def _committed_ids(self):
+        with self._lock:
+            if self._ids is None:
+                with db.engine.connect() as connection:
+                    rows = connection.execute(text(
+                        "SELECT metric_descriptor_id, metric_name, unit_of_measure FROM metric_descriptors ORDER BY metric_descriptor_id"
+                    )).fetchall()
+                ids = {}
+                for row in rows:
+                    ids.setdefault((row.metric_name, row.unit_of_measure), row.metric_descriptor_id) # Lowest id for duplicate NULL units
+                self._ids = ids
+            return self._ids
+
+    def add_committed(self, descriptor_ids):
+        with self._lock:
+            if self._ids is not None:
+                self._ids.update(descriptor_ids)
+
+    # Returns the id of the (metric_name, unit_of_measure) descriptor, creating it in the
+    # current session transaction when it does not exist. Concurrent imports creating the same
+    # descriptor wait for each other instead of failing, so no import is rolled back.
+    def get_id(self, metric_name, unit_of_measure):
+        key = (metric_name, unit_of_measure)
+        descriptor_id = self._committed_ids().get(key)
+        if descriptor_id is not None:
+            return descriptor_id
+        pending = db.session.info.setdefault(PENDING_DESCRIPTORS_KEY, {})
+        if key not in pending:
+            pending[key] = _create_descriptor(metric_name, unit_of_measure)
+        return pending[key]
+
+# Inserts a descriptor unless it exists and returns its id. ON CONFLICT waits for a concurrent
+# transaction inserting the same key and then finds its row, instead of raising IntegrityError.
+def _create_descriptor(metric_name, unit_of_measure):
+    params = {'metric_name': metric_name, 'unit_of_measure': unit_of_measure}
+    if unit_of_measure is None:
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:lock_key, hashtext(:metric_name))"), {**params, 'lock_key': METRIC_DESCRIPTOR_LOCK_KEY})
+        existing_id = db.session.execute(text("""
+            SELECT metric_descriptor_id FROM metric_descriptors
+            WHERE metric_name = :metric_name AND unit_of_measure IS NULL
+            ORDER BY metric_descriptor_id LIMIT 1
+        """), params).scalar()
+        if existing_id is not None:
+            return existing_id
+        return db.session.execute(text("""
+            INSERT INTO metric_descriptors (metric_name, unit_of_measure)
+            VALUES (:metric_name, NULL)
+            RETURNING metric_descriptor_id
+        """), params).scalar()
+
+    created_id = db.session.execute(text("""
+        INSERT INTO metric_descriptors (metric_name, unit_of_measure)
+        VALUES (:metric_name, :unit_of_measure)
+        ON CONFLICT ON CONSTRAINT uq_metric_descriptor_name_unit DO NOTHING
+        RETURNING metric_descriptor_id
+    """), params).scalar()
+    if created_id is not None:
+        return created_id
+    return db.session.execute(text("""
+        SELECT metric_descriptor_id FROM metric_descriptors
+        WHERE metric_name = :metric_name AND unit_of_measure = :unit_of_measure
+    """), params).scalar()
+
+metric_descriptors = MetricDescriptorRegistry() # The process-wide registry
+
+# Descriptors created in a transaction become cacheable once it commits
+@event.listens_for(Session, 'after_commit')
+def _cache_committed_descriptors(session):
+    pending = session.info.pop(PENDING_DESCRIPTORS_KEY, None)
+    if pending:
+        metric_descriptors.add_committed(pending)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_descriptors(session, previous_transaction):
+    session.info.pop(PENDING_DESCRIPTORS_KEY, None) # Looked up again if still needed
+
+# Any change to metric_descriptors, in any process (notify trigger, delivered on commit)
+@invalidation_handler(METRIC_DESCRIPTORS_CHANNEL)
+def _invalidate_descriptors(payload):
+    metric_descriptors.invalidate()
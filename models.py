@@ -41,9 +41,28 @@ class Workout(db.Model):
     level = db.Column(db.Float, nullable=True) # User-defined difficulty level or intensity (float)
     
     # -- Relationships -------------------
-    workout_samples = db.relationship('WorkoutSample', backref='workout', lazy='select', cascade="all, delete-orphan")
+    workout_series = db.relationship('WorkoutSeries', backref='workout', lazy='select', cascade="all, delete-orphan")
     heart_rate_samples = db.relationship('HeartRateSample', backref='workout', lazy='select', cascade="all, delete-orphan")
     workout_hr_zones = db.relationship('WorkoutHRZone', backref='workout', lazy='select', cascade="all, delete-orphan")
+    stats = db.relationship('WorkoutStats', backref='workout', lazy='select', uselist=False, cascade="all, delete-orphan")
+    splits = db.relationship('WorkoutSplit', backref='workout', lazy='select', cascade="all, delete-orphan")
+    best_efforts = db.relationship('WorkoutBestEffort', backref='workout', lazy='select', cascade="all, delete-orphan")
+    power_curve = db.relationship('WorkoutPowerCurve', backref='workout', lazy='select', uselist=False, cascade="all, delete-orphan")
+    histograms = db.relationship('WorkoutHistogram', backref='workout', lazy='select', cascade="all, delete-orphan")
+    series_levels = db.relationship('WorkoutSeriesLevel', backref='workout', lazy='select', cascade="all, delete-orphan")
+
+    # == Table Arguments ============================================
+    __table_args__ = (
+        db.Index('ix_workouts_date_id', 'workout_date', 'workout_id'), # Workouts list: keyset pages, newest first (backward scan)
+        # Workouts list sorts and equipment filter (see views/workouts.py WORKOUT_LIST_INDEXES)
+        db.Index('ix_workouts_distance_id', 'total_distance_meters', 'workout_id'),
+        db.Index('ix_workouts_duration_id', 'duration_seconds', 'workout_id'),
+        db.Index('ix_workouts_split_id', 'average_split_seconds_500m', 'workout_id'),
+        db.Index('ix_workouts_equipment_date_id', 'equipment_type_id', 'workout_date', 'workout_id'),
+        db.Index('ix_workouts_equipment_distance_id', 'equipment_type_id', 'total_distance_meters', 'workout_id'),
+        db.Index('ix_workouts_equipment_duration_id', 'equipment_type_id', 'duration_seconds', 'workout_id'),
+        db.Index('ix_workouts_equipment_split_id', 'equipment_type_id', 'average_split_seconds_500m', 'workout_id'),
+    )
 
     # -- Representation -------------------
     def __repr__(self):
@@ -65,23 +84,28 @@ class MetricDescriptor(db.Model):
         db.UniqueConstraint('metric_name', 'unit_of_measure', name='uq_metric_descriptor_name_unit'),
     )
     # -- Relationships -------------------
-    samples = db.relationship('WorkoutSample', backref='metric_descriptor_ref', lazy='select')
+    series = db.relationship('WorkoutSeries', backref='metric_descriptor_ref', lazy='select')
 
     # -- Representation -------------------
     def __repr__(self):
         return f"<MetricDescriptor {self.metric_descriptor_id} - {self.metric_name} ({self.unit_of_measure})>"
 
 # --------------------------------------------------------
-# - WorkoutSample Model
+# - WorkoutSeries Model
 #---------------------------------------------------------
-# Stores individual data points (samples) for a workout metric over time
-class WorkoutSample(db.Model):
-    __tablename__ = 'workout_samples'
-    sample_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), nullable=False)
-    metric_descriptor_id = db.Column(db.Integer, db.ForeignKey('metric_descriptors.metric_descriptor_id'), nullable=False)
-    time_offset_seconds = db.Column(db.Integer, nullable=False)
-    value = db.Column(db.Numeric, nullable=False)
+# Stores all samples of one workout metric as a single row of parallel arrays,
+# ordered by time: sample_values[i] was recorded at time_offset_seconds[i]
+class WorkoutSeries(db.Model):
+    __tablename__ = 'workout_series'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    metric_descriptor_id = db.Column(db.Integer, db.ForeignKey('metric_descriptors.metric_descriptor_id'), primary_key=True)
+    time_offset_seconds = db.Column(db.ARRAY(db.Integer), nullable=False) # Sample times, ascending
+    sample_values = db.Column(db.ARRAY(db.Float), nullable=False) # Sample values (double precision), same length
+
+    # -- Sample Pairs -------------------
+    # Yields (time_offset_seconds, value) in time order
+    def samples(self):
+        return zip(self.time_offset_seconds, self.sample_values)
 
 # --------------------------------------------------------
 # - HeartRateSample Model
@@ -94,6 +118,12 @@ class HeartRateSample(db.Model):
     time_offset_seconds = db.Column(db.Integer, nullable=False)
     heart_rate_bpm = db.Column(db.Integer)
 
+    # == Table Arguments ============================================
+    # Covers the details page read (workout's samples in time order) as an index-only scan
+    __table_args__ = (
+        db.Index('ix_heart_rate_samples_workout_time', 'workout_id', 'time_offset_seconds', postgresql_include=['heart_rate_bpm']),
+    )
+
 # --------------------------------------------------------
 # - WorkoutHRZone Model
 #---------------------------------------------------------
@@ -108,6 +138,151 @@ class WorkoutHRZone(db.Model):
     upper_bound_bpm = db.Column(db.Numeric)
     seconds_in_zone = db.Column(db.Numeric, nullable=False)
 
+    # == Table Arguments ============================================
+    # Lets ON DELETE CASCADE from workouts find the zone rows without a full scan
+    __table_args__ = (
+        db.Index('ix_workout_hr_zones_workout_id', 'workout_id'),
+    )
+
+# --------------------------------------------------------
+# - WorkoutStats Model
+#---------------------------------------------------------
+# Per-workout statistics derived from the samples at import (see workout_stats.py),
+# so the details and list pages read one row instead of the sample series
+class WorkoutStats(db.Model):
+    __tablename__ = 'workout_stats'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    avg_power = db.Column(db.Float) # Mean of the positive power samples (W)
+    max_power = db.Column(db.Float)
+    power_sample_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_spm = db.Column(db.Float) # Mean of the positive stroke rate samples
+    max_spm = db.Column(db.Float)
+    spm_sample_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_hr = db.Column(db.Float) # Mean of the positive heart rate samples (bpm)
+    max_hr = db.Column(db.Integer)
+    hr_sample_count = db.Column(db.Integer, nullable=False, default=0)
+    first_offset_seconds = db.Column(db.Integer) # First / last sample time of any metric
+    last_offset_seconds = db.Column(db.Integer)
+    hr_zone_bounds = db.Column(db.ARRAY(db.Integer)) # HR zone lower bounds the zone times were computed with
+    hr_zone_seconds = db.Column(db.ARRAY(db.Integer)) # Seconds per zone, same order (workout_stats.HR_ZONE_DEFINITIONS)
+    split_schemes = db.Column(db.ARRAY(db.Text)) # Split schemes stored in workout_splits for this workout
+    best_effort_ranking_ids = db.Column(db.ARRAY(db.Integer)) # Ranking settings searched for workout_best_efforts (sorted)
+    hr_zone_rows_bounds = db.Column(db.ARRAY(db.Integer)) # HR zone bounds the workout_hr_zones rows were computed with (NULL: imported rows)
+    series_level_buckets = db.Column(db.ARRAY(db.Integer)) # Bucket widths stored in workout_series_levels for this workout
+    computed_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+
+# --------------------------------------------------------
+# - WorkoutHistogram Model
+#---------------------------------------------------------
+# Time-weighted histogram of one metric of a workout (workout_stats.HISTOGRAM_BIN_WIDTHS):
+# seconds spent per value bin, so zone times for any thresholds are a sum over the bins
+class WorkoutHistogram(db.Model):
+    __tablename__ = 'workout_histograms'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    metric_name = db.Column(db.String(50), primary_key=True) # Metric name, 'HeartRate' for the heart rate samples
+    bin_width = db.Column(db.Float, nullable=False) # e.g. 1 bpm, 10 W
+    first_bin = db.Column(db.Float, nullable=False) # Lower edge of the first bin
+    bin_seconds = db.Column(db.ARRAY(db.Float), nullable=False) # Seconds per bin, bin i starts at first_bin + i * bin_width
+
+# --------------------------------------------------------
+# - WorkoutSeriesLevel Model
+#---------------------------------------------------------
+# Min/max downsampled chart series of one metric at one resolution (series_levels.SERIES_LEVEL_BUCKETS)
+class WorkoutSeriesLevel(db.Model):
+    __tablename__ = 'workout_series_levels'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    metric_name = db.Column(db.String(50), primary_key=True) # Metric name, 'HeartRate' for the heart rate samples
+    bucket_seconds = db.Column(db.SmallInteger, primary_key=True) # Bucket width; each bucket keeps its min and max point
+    time_offset_seconds = db.Column(db.ARRAY(db.Integer), nullable=False) # Times of the kept points, ascending
+    sample_values = db.Column(db.ARRAY(db.Float), nullable=False) # Values of the kept points, same order
+
+# --------------------------------------------------------
+# - WorkoutSplit Model
+#---------------------------------------------------------
+# Precomputed split table rows, one per split of each configured scheme (workout_splits.SPLIT_SCHEMES)
+class WorkoutSplit(db.Model):
+    __tablename__ = 'workout_splits'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    scheme = db.Column(db.String(20), primary_key=True) # e.g. 'distance_500', 'time_120'
+    split_number = db.Column(db.SmallInteger, primary_key=True) # 1-based
+    end_distance_meters = db.Column(db.Float, nullable=False) # Distance covered at the end of the split
+    end_time_seconds = db.Column(db.Float, nullable=False) # Time at the end of the split
+    split_seconds = db.Column(db.Float, nullable=False) # Duration of the split
+    pace_seconds_500m = db.Column(db.Float) # Pace per 500m (NULL when no distance was covered)
+    avg_power = db.Column(db.Float)
+    avg_spm = db.Column(db.Float)
+    avg_hr = db.Column(db.Float)
+
+# --------------------------------------------------------
+# - WorkoutBestEffort Model
+#---------------------------------------------------------
+# Best effort of a workout for one ranking setting: the fastest time over the setting's
+# distance, or the longest distance in its duration, anywhere inside the workout
+class WorkoutBestEffort(db.Model):
+    __tablename__ = 'workout_best_efforts'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    ranking_id = db.Column(db.Integer, db.ForeignKey('ranking_settings.ranking_id', ondelete='CASCADE'), primary_key=True)
+    duration_seconds = db.Column(db.Float, nullable=False) # Effort time (the setting's value for time rankings)
+    distance_meters = db.Column(db.Float, nullable=False) # Effort distance (the setting's value for distance rankings)
+    start_offset_seconds = db.Column(db.Float, nullable=False) # Where the effort starts in the workout
+    pace_seconds_500m = db.Column(db.Float) # Average pace over the effort
+    __table_args__ = (
+        db.Index('ix_workout_best_efforts_ranking_duration', 'ranking_id', 'duration_seconds'), # Distance rankings: fastest first
+        db.Index('ix_workout_best_efforts_ranking_distance', 'ranking_id', 'distance_meters') # Time rankings: longest first (backward scan)
+    )
+
+# --------------------------------------------------------
+# - WorkoutPowerCurve Model
+#---------------------------------------------------------
+# Mean-maximal power curve of a workout: best average watts per window length, one array
+# row per workout (durations the workout is too short for are left out)
+class WorkoutPowerCurve(db.Model):
+    __tablename__ = 'workout_power_curves'
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), primary_key=True)
+    durations_seconds = db.Column(db.ARRAY(db.Integer), nullable=False) # Window lengths (power_curve.POWER_CURVE_DURATIONS)
+    mean_max_watts = db.Column(db.ARRAY(db.Float), nullable=False) # Best average power per window length, same order
+
+    # Returns (duration, watts) pairs
+    def points(self):
+        return list(zip(self.durations_seconds, self.mean_max_watts))
+
+# --------------------------------------------------------
+# - PowerCurveRecord Model
+#---------------------------------------------------------
+# Power curve envelope: the best mean-maximal power per window length over all workouts
+# ('all') and per year ('2024', ...), with the workout that set it
+class PowerCurveRecord(db.Model):
+    __tablename__ = 'power_curve_records'
+    period = db.Column(db.String(10), primary_key=True) # 'all' or the year
+    duration_seconds = db.Column(db.Integer, primary_key=True)
+    watts = db.Column(db.Float, nullable=False)
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.workout_id', ondelete='CASCADE'), nullable=False)
+    workout_date = db.Column(db.Date, nullable=False)
+
+# --------------------------------------------------------
+# - BackgroundJobStatus Model
+#---------------------------------------------------------
+# Progress of the latest run of each background job (background_jobs.py), readable from any process
+class BackgroundJobStatus(db.Model):
+    __tablename__ = 'background_job_status'
+    job_name = db.Column(db.String(100), primary_key=True)
+    state = db.Column(db.String(20), nullable=False) # 'running', 'finished' or 'failed'
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime(timezone=True))
+    updated_at = db.Column(db.DateTime(timezone=True))
+
+# --------------------------------------------------------
+# - DataVersion Model
+#---------------------------------------------------------
+# Change counters of groups of data, bumped by statement triggers (see database_setup
+# create_data_version_triggers_sql) and used as cache keys (data_versions.py)
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(50), primary_key=True) # e.g. 'workouts', 'mv_refresh'
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime(timezone=True))
+
 # --------------------------------------------------------
 # - UserSettings Model
 #---------------------------------------------------------
@@ -134,4 +309,18 @@ class RankingSetting(db.Model):
     label = db.Column(db.String(100), nullable=False) # e.g., '2000m', '1:00'
 
     def __repr__(self):
-        return f"<RankingSetting(ranking_id={self.ranking_id}, type='{self.type}', value={self.value}, label='{self.label}')>"
\ No newline at end of file
+        return f"<RankingSetting(ranking_id={self.ranking_id}, type='{self.type}', value={self.value}, label='{self.label}')>"
+
+# --------------------------------------------------------
+# - MaterializedViewRefresh Model
+#---------------------------------------------------------
+# Records when each group of materialized views was last refreshed ("data as of")
+class MaterializedViewRefresh(db.Model):
+    __tablename__ = 'mv_refresh_state'
+
+    view_group = db.Column(db.String(50), primary_key=True) # 'summary' or 'rankings' (see database_setup.MV_REFRESH_GROUPS)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False) # Completion time of the last refresh
+    duration_ms = db.Column(db.Integer) # How long the last refresh took
+
+    def __repr__(self):
+        return f"<MaterializedViewRefresh {self.view_group} at {self.refreshed_at}>"
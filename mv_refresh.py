@@ -0,0 +1,185 @@
+# ========================================================
+# = mv_refresh.py - Materialized view refresh control
+# ========================================================
+import select
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app
+from sqlalchemy import event, text
+from models import db
+from database_setup import MV_REFRESH_GROUPS, MV_REFRESH_CHANNEL, SUSPEND_MV_REFRESH_SETTING
+
+# Nesting depth of bulk_mode() in the current thread / request context
+_bulk_mode_depth = ContextVar('bulk_mode_depth', default=0)
+
+# Session-level advisory lock held by the one process that runs refreshes
+MV_REFRESHER_LOCK_KEY = 72_510_401
+
+# --------------------------------------------------------
+# - Refresh Functions
+#---------------------------------------------------------
+# Refreshes the given view groups (all when None), one transaction per group,
+# and records the completion time in mv_refresh_state.
+# CONCURRENTLY (backed by the unique indexes in CREATE_MV_INDEXES_SQL) only takes an
+# EXCLUSIVE lock, so pages keep reading the previous contents during the refresh.
+def refresh_materialized_views(groups=None):
+    for group in (groups or MV_REFRESH_GROUPS):
+        started = time.perf_counter()
+        with db.engine.connect() as connection:
+            with connection.begin():
+                for view_name in MV_REFRESH_GROUPS[group]:
+                    connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}"))
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                connection.execute(text("""
+                    INSERT INTO mv_refresh_state (view_group, refreshed_at, duration_ms)
+                    VALUES (:group, clock_timestamp(), :duration_ms)
+                    ON CONFLICT (view_group) DO UPDATE
+                    SET refreshed_at = EXCLUDED.refreshed_at, duration_ms = EXCLUDED.duration_ms
+                """), {'group': group, 'duration_ms': duration_ms})
+        current_app.logger.info(f"Materialized views refreshed: {group} ({duration_ms} ms).")
+
+# Asks the background refresher to refresh the given view groups (all when None).
+# Cheap and non-blocking; used where the triggers were suspended.
+def request_refresh(groups=None):
+    with db.engine.connect() as connection:
+        with connection.begin():
+            for group in (groups or MV_REFRESH_GROUPS):
+                connection.execute(text("SELECT pg_notify(:channel, :group)"), {'channel': MV_REFRESH_CHANNEL, 'group': group})
+
+# Returns {view_group: refreshed_at} for the "data as of" display
+def get_refresh_times(connection):
+    rows = connection.execute(text("SELECT view_group, refreshed_at FROM mv_refresh_state")).fetchall()
+    return {row.view_group: row.refreshed_at for row in rows}
+
+# --------------------------------------------------------
+# - Background Refresher
+#---------------------------------------------------------
+# Daemon thread that LISTENs for refresh requests and rebuilds the materialized views
+# outside the writers' transactions. Every serving app process (not CLI commands) starts
+# one; an advisory lock elects a single leader, the others retry in case the leader goes away.
+#
+# Requests are coalesced: a refresh runs once no new request arrived for
+# `debounce_seconds`, but at the latest `max_delay_seconds` after the first pending one.
+class MaterializedViewRefresher(threading.Thread):
+    IDLE_POLL_SECONDS = 5.0 # Wake-up interval while idle, so stop() is noticed
+    RETRY_SECONDS = 15.0 # Wait before retrying leadership / after a connection error
+
+    def __init__(self, app, debounce_seconds=2.0, max_delay_seconds=30.0):
+        super().__init__(name='mv-refresher', daemon=True)
+        self.app = app
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max(debounce_seconds, max_delay_seconds)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # -- Thread Main Loop -------------------
+    def run(self):
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    self._run_while_leader()
+                except Exception as e:
+                    current_app.logger.error(f"Materialized view refresher error: {e}", exc_info=True)
+                self._stop_event.wait(self.RETRY_SECONDS)
+
+    # Time at which the pending requests are refreshed
+    def _due_at(self, first_request_at, last_request_at):
+        return min(last_request_at + self.debounce_seconds, first_request_at + self.max_delay_seconds)
+
+    # -- Leader Loop -------------------
+    # Returns when leadership could not be taken or the refresher is stopped.
+    def _run_while_leader(self):
+        pool_connection = db.engine.raw_connection()
+        pool_connection.detach() # Long-lived LISTEN connection, kept out of the pool
+        listen_connection = pool_connection.driver_connection
+        try:
+            listen_connection.autocommit = True # Notifications are only delivered outside a transaction
+            with listen_connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (MV_REFRESHER_LOCK_KEY,))
+                if not cursor.fetchone()[0]:
+                    return # Another process is the refresher
+                cursor.execute(f"LISTEN {MV_REFRESH_CHANNEL}")
+            current_app.logger.info("Materialized view refresher started (leader).")
+
+            # Refresh everything on taking over: requests sent while no leader was listening are lost
+            pending_groups = set(MV_REFRESH_GROUPS)
+            first_request_at = last_request_at = 0.0
+
+            while not self._stop_event.is_set():
+                timeout = max(0.0, self._due_at(first_request_at, last_request_at) - time.monotonic()) if pending_groups else self.IDLE_POLL_SECONDS
+
+                # == Collect Refresh Requests ============================================
+                readable, _, _ = select.select([listen_connection], [], [], timeout)
+                if readable:
+                    listen_connection.poll()
+                    while listen_connection.notifies:
+                        notify = listen_connection.notifies.pop(0)
+                        if notify.payload not in MV_REFRESH_GROUPS:
+                            continue # Stale request for a view group that no longer exists
+                        now = time.monotonic()
+                        if not pending_groups:
+                            first_request_at = now
+                        last_request_at = now
+                        pending_groups.add(notify.payload)
+
+                # == Refresh Once the Window Has Passed ============================================
+                if pending_groups and time.monotonic() >= self._due_at(first_request_at, last_request_at):
+                    groups, pending_groups = pending_groups, set()
+                    try:
+                        refresh_materialized_views(sorted(groups))
+                    except Exception as e:
+                        current_app.logger.error(f"Error refreshing materialized views: {e}", exc_info=True)
+        finally:
+            listen_connection.close() # Also releases the advisory lock
+
+# Starts the background refresher for this process unless disabled in the config
+def start_mv_refresher(app):
+    if not app.config.get('MV_REFRESHER_ENABLED', True):
+        app.logger.info("Materialized view refresher disabled.")
+        return None
+    refresher = MaterializedViewRefresher(
+        app,
+        debounce_seconds=app.config.get('MV_REFRESH_DEBOUNCE_SECONDS', 2.0),
+        max_delay_seconds=app.config.get('MV_REFRESH_MAX_DELAY_SECONDS', 30.0)
+    )
+    refresher.start()
+    app.extensions['mv_refresher'] = refresher
+    return refresher
+
+# --------------------------------------------------------
+# - Bulk Mode
+#---------------------------------------------------------
+# Marks a session transaction so the ranking refresh triggers on workouts and
+# ranking_settings return early (the summary table delta triggers always run).
+# The setting is transaction-local, so other workers writing at the same time
+# still request refreshes as usual.
+def _suspend_refresh_for_transaction(connection):
+    connection.execute(text("SELECT set_config(:name, 'on', true)"), {'name': SUSPEND_MV_REFRESH_SETTING})
+
+# Session hook: applies the setting to every transaction begun while bulk mode is active
+@event.listens_for(db.session, 'after_begin')
+def _apply_bulk_mode_on_begin(session, transaction, connection):
+    if _bulk_mode_depth.get() > 0 and not transaction.nested:
+        _suspend_refresh_for_transaction(connection)
+
+# Context manager for imports, restores and migrations that write many workouts.
+# Trigger notifications are skipped for the whole block (across any number of commits)
+# and a single refresh of all views is requested when the outermost block exits.
+@contextmanager
+def bulk_mode():
+    depth_token = _bulk_mode_depth.set(_bulk_mode_depth.get() + 1)
+    try:
+        if _bulk_mode_depth.get() == 1 and db.session.in_transaction():
+            _suspend_refresh_for_transaction(db.session.connection()) # Transaction already open
+        yield
+    finally:
+        _bulk_mode_depth.reset(depth_token)
+        if _bulk_mode_depth.get() == 0:
+            try:
+                request_refresh() # One consolidated refresh, also after partial failures
+            except Exception as e:
+                current_app.logger.error(f"Error requesting materialized view refresh after bulk operation: {e}", exc_info=True)
@@ -0,0 +1,169 @@
+# ========================================================
+# = power_curve.py - Mean-maximal power curves and their all-time / yearly envelope
+# ========================================================
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db, Workout, WorkoutPowerCurve
+from sample_loader import load_workout_samples
+from data_versions import mark_data_changed
+from series import SampleSeries, mean_max_curve
+
+# Window lengths of the power curve (seconds): 1 s ... 60 min
+POWER_CURVE_DURATIONS = [1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600]
+
+ALL_TIME_PERIOD = 'all' # power_curve_records.period of the all-time envelope
+
+# --------------------------------------------------------
+# - Power Curve Calculation
+#---------------------------------------------------------
+# Returns (durations, watts) lists for a loaded WorkoutSampleSet, leaving out the
+# durations longer than the power recording. Both lists are empty without power samples.
+def compute_power_curve(workout_samples):
+    power = SampleSeries(*workout_samples.samples('Power'))
+    curve = mean_max_curve(power, POWER_CURVE_DURATIONS)
+    points = [(duration, watts) for duration, watts in zip(POWER_CURVE_DURATIONS, curve) if watts is not None]
+    return [duration for duration, _watts in points], [watts for _duration, watts in points]
+
+# Label of a curve duration, e.g. '5s', '2min'
+def format_curve_duration(duration_seconds):
+    return f"{duration_seconds // 60}min" if duration_seconds >= 60 else f"{duration_seconds}s"
+
+# --------------------------------------------------------
+# - Power Curve Storage
+#---------------------------------------------------------
+UPSERT_POWER_CURVE_SQL = """
+    INSERT INTO workout_power_curves (workout_id, durations_seconds, mean_max_watts)
+    VALUES (:workout_id, CAST(:durations AS integer[]), CAST(:watts AS double precision[]))
+    ON CONFLICT (workout_id) DO UPDATE SET
+        durations_seconds = EXCLUDED.durations_seconds,
+        mean_max_watts = EXCLUDED.mean_max_watts
+"""
+
+# Incremental envelope update: the workout's points are offered to the all-time and the
+# workout year's envelope, and only the points it beats are written
+UPDATE_ENVELOPE_SQL = """
+    INSERT INTO power_curve_records (period, duration_seconds, watts, workout_id, workout_date)
+    SELECT p.period, c.duration_seconds, c.watts, :workout_id, :workout_date
+    FROM unnest(CAST(:durations AS integer[]), CAST(:watts AS double precision[])) AS c(duration_seconds, watts)
+    CROSS JOIN (VALUES ('""" + ALL_TIME_PERIOD + """'), (:year_period)) AS p(period)
+    ON CONFLICT (period, duration_seconds) DO UPDATE SET
+        watts = EXCLUDED.watts,
+        workout_id = EXCLUDED.workout_id,
+        workout_date = EXCLUDED.workout_date
+    WHERE EXCLUDED.watts > power_curve_records.watts
+"""
+
+# Full envelope rebuild from the stored curves (not the samples), for curves recomputed
+# lower than a record (deleted workouts are repaired by the repair_power_curve_records()
+# trigger, see database_setup.py). Ties go to the earliest workout, as with the
+# incremental update, which only replaces a record it beats.
+REBUILD_ENVELOPE_SQL = [
+    "DELETE FROM power_curve_records",
+    """
+    INSERT INTO power_curve_records (period, duration_seconds, watts, workout_id, workout_date)
+    SELECT DISTINCT ON (p.period, u.duration_seconds)
+        p.period, u.duration_seconds, u.watts, c.workout_id, w.workout_date
+    FROM workout_power_curves c
+    JOIN workouts w ON w.workout_id = c.workout_id
+    CROSS JOIN LATERAL unnest(c.durations_seconds, c.mean_max_watts) AS u(duration_seconds, watts)
+    CROSS JOIN LATERAL (VALUES ('""" + ALL_TIME_PERIOD + """'), (EXTRACT(YEAR FROM w.workout_date)::integer::text)) AS p(period)
+    ORDER BY p.period, u.duration_seconds, u.watts DESC, w.workout_date, c.workout_id
+    """
+]
+
+# Computes and stores the power curve of one workout in the current session transaction
+# and raises the envelope points it beats. Returns the number of curve points.
+def refresh_workout_power_curve(workout_id, workout_samples=None, workout_date=None):
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+    if workout_date is None:
+        workout_date = db.session.query(Workout.workout_date).filter_by(workout_id=workout_id).scalar()
+
+    durations, watts = compute_power_curve(workout_samples)
+    if not durations:
+        db.session.execute(text("DELETE FROM workout_power_curves WHERE workout_id = :workout_id"), {'workout_id': workout_id})
+        return 0
+    params = {'workout_id': workout_id, 'durations': durations, 'watts': watts}
+    db.session.execute(text(UPSERT_POWER_CURVE_SQL), params)
+    mark_data_changed() # The envelope update bumps the 'rankings' data version
+    db.session.execute(text(UPDATE_ENVELOPE_SQL), {**params, 'workout_date': workout_date, 'year_period': str(workout_date.year)})
+    return len(durations)
+
+# Rebuilds the whole envelope from workout_power_curves in the current session transaction
+def rebuild_power_curve_envelope():
+    mark_data_changed()
+    for stmt in REBUILD_ENVELOPE_SQL:
+        db.session.execute(text(stmt))
+
+# --------------------------------------------------------
+# - Power Curve Reads
+#---------------------------------------------------------
+# Returns the envelope of one period ('all' or a year) as rows ordered by duration
+def get_power_curve_envelope(period=ALL_TIME_PERIOD):
+    return db.session.execute(text("""
+        SELECT duration_seconds, watts, workout_id, workout_date
+        FROM power_curve_records
+        WHERE period = :period
+        ORDER BY duration_seconds
+    """), {'period': str(period)}).fetchall()
+
+# Returns the power curve table of a workout for the details page: one dict per point with
+# the workout's watts and the all-time / workout-year records
+def get_workout_power_curve(workout):
+    curve_row = db.session.get(WorkoutPowerCurve, workout.workout_id)
+    if curve_row is None:
+        return []
+    records = {}
+    for row in db.session.execute(text("""
+        SELECT period, duration_seconds, watts
+        FROM power_curve_records
+        WHERE period IN (:all_period, :year_period)
+    """), {'all_period': ALL_TIME_PERIOD, 'year_period': str(workout.workout_date.year)}).fetchall():
+        records[(row.period, row.duration_seconds)] = row.watts
+    return [{
+        'label': format_curve_duration(duration),
+        'watts': watts,
+        'year_best': records.get((str(workout.workout_date.year), duration)),
+        'all_time_best': records.get((ALL_TIME_PERIOD, duration))
+    } for duration, watts in curve_row.points()]
+
+# --------------------------------------------------------
+# - Power Curve Backfill
+#---------------------------------------------------------
+# Computes the power curves of the workouts without one (all workouts when only_missing
+# is False; workouts without power samples are always revisited), committing every
+# `batch_size` workouts, then rebuilds the envelope. Returns the number of workouts processed.
+def backfill_power_curves(only_missing=True, batch_size=100):
+    workout_query = db.session.query(Workout.workout_id, Workout.workout_date).order_by(Workout.workout_id)
+    if only_missing:
+        workout_query = workout_query.outerjoin(WorkoutPowerCurve, WorkoutPowerCurve.workout_id == Workout.workout_id).filter(WorkoutPowerCurve.workout_id.is_(None))
+    workout_rows = workout_query.all()
+
+    for position, row in enumerate(workout_rows, start=1):
+        refresh_workout_power_curve(row.workout_id, workout_date=row.workout_date)
+        if position % batch_size == 0:
+            db.session.commit()
+            current_app.logger.info(f"Power curves computed for {position}/{len(workout_rows)} workouts.")
+    rebuild_power_curve_envelope()
+    db.session.commit()
+    return len(workout_rows)
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the power curve commands with `flask`
+def register_commands(app):
+    @app.cli.command('backfill-power-curves')
+    @click.option('--all', 'recompute_all', is_flag=True, help='Recompute every workout, not only those without a power curve.')
+    def backfill_power_curves_command(recompute_all):
+        """Compute the power curves of existing workouts and rebuild the envelope."""
+        processed = backfill_power_curves(only_missing=not recompute_all)
+        click.echo(f"Power curves computed for {processed} workout(s).")
+
+    @app.cli.command('rebuild-power-curve-envelope')
+    def rebuild_power_curve_envelope_command():
+        """Rebuild the all-time / yearly power curve envelope from the stored curves."""
+        rebuild_power_curve_envelope()
+        db.session.commit()
+        click.echo("Power curve envelope rebuilt.")
@@ -0,0 +1,108 @@
+# ========================================================
+# = query_plans.py - EXPLAIN checks for the per-workout sample read and the workouts list
+# ========================================================
+import datetime
+import json
+from decimal import Decimal
+import click
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from models import db
+from sample_loader import WORKOUT_SAMPLES_SQL
+from views.workouts import WORKOUT_SORTS, WORKOUT_LIST_INDEXES, build_workout_list_queries
+
+# Scan node types accepted per sample table (anything else fails the check)
+EXPECTED_SCANS = {
+    'workout_series': {'Index Scan'}, # Primary key lookup; the arrays live in the heap/TOAST
+    'heart_rate_samples': {'Index Only Scan'}
+}
+
+# --------------------------------------------------------
+# - Plan Inspection
+#---------------------------------------------------------
+# Yields (node_type, relation_name, index_name) for every node of an EXPLAIN (FORMAT JSON) plan
+def _walk_plan(plan_node):
+    yield plan_node.get('Node Type'), plan_node.get('Relation Name'), plan_node.get('Index Name')
+    for child_node in plan_node.get('Plans', []):
+        yield from _walk_plan(child_node)
+
+# Returns all nodes of a statement's plan.
+# On a small database the planner rightly prefers sequential scans, so they are
+# disabled for the EXPLAIN: the check proves the index path exists and is index-only,
+# not which path the current statistics favour.
+def explain_nodes(connection, sql, params):
+    with connection.begin():
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        connection.execute(text("SET LOCAL enable_bitmapscan = off"))
+        plan_json = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    plan = plan_json if isinstance(plan_json, list) else json.loads(plan_json)
+    return list(_walk_plan(plan[0]['Plan']))
+
+# Returns the scan nodes of a statement's plan
+def explain_scans(connection, sql, params):
+    return [node for node in explain_nodes(connection, sql, params) if node[1]] # Only nodes that read a relation
+
+# Returns {table: (scan nodes, ok)} for the details page sample read of one workout
+# (the small metric_descriptors lookup is not checked)
+def check_details_plans(connection, workout_id):
+    scans = explain_scans(connection, WORKOUT_SAMPLES_SQL, {'workout_id': workout_id})
+    results = {}
+    for table, expected_node_types in EXPECTED_SCANS.items():
+        table_scans = [node for node in scans if node[1] == table]
+        ok = bool(table_scans) and all(node_type in expected_node_types for node_type, _relation, _index in table_scans)
+        results[table] = (table_scans, ok)
+    return results
+
+# Sample cursor values per key type; the plan shape does not depend on them
+SAMPLE_CURSOR_VALUES = {datetime.date: datetime.date(2024, 1, 1), Decimal: Decimal('1000')}
+
+# Returns {(equipment filter, sort key, read direction): (plan nodes, ok)} for every
+# whitelisted workouts list combination, read from a cursor in both directions (nullable
+# sorts: from a cursor in each segment, so both segment queries are read). A plan is ok
+# when every query reads workouts through the combination's index and has no Sort node.
+def check_workout_list_plans(connection, equipment_type_id):
+    results = {}
+    for (with_equipment, sort_key), index_name in WORKOUT_LIST_INDEXES.items():
+        sort_def = WORKOUT_SORTS[sort_key]
+        options = {'sort': sort_key, 'dir': sort_def['default_dir'], 'equipment_type_id': equipment_type_id if with_equipment else None, 'ranges': {}}
+        cursors = [(SAMPLE_CURSOR_VALUES[sort_def['key_type']], 1)] + ([(None, 1)] if sort_def['nullable'] else [])
+        for direction in ('desc', 'asc'):
+            nodes, ok = [], True
+            for cursor in cursors:
+                for list_query in build_workout_list_queries(options, direction, cursor):
+                    sql = str(list_query.limit(20).statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+                    query_nodes = explain_nodes(connection, sql, {})
+                    workout_scans = [node for node in query_nodes if node[1] == 'workouts']
+                    ok = ok and bool(workout_scans) and all(index == index_name for _node_type, _relation, index in workout_scans) and not any(node_type == 'Sort' for node_type, _relation, _index in query_nodes)
+                    nodes += query_nodes
+            results[(with_equipment, sort_key, direction)] = (nodes, ok)
+    return results
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the plan check with `flask`
+def register_commands(app):
+    @app.cli.command('explain-details')
+    @click.argument('workout_id', type=int)
+    def explain_details_command(workout_id):
+        """Check that the details page sample read uses the sample table indexes."""
+        with db.engine.connect() as connection:
+            results = check_details_plans(connection, workout_id)
+        for table, (scans, ok) in results.items():
+            plan_text = ', '.join(f"{node_type} on {relation}" + (f" using {index}" if index else '') for node_type, relation, index in scans)
+            click.echo(f"{table}: {'ok' if ok else 'UNEXPECTED'} ({plan_text})")
+        if not all(ok for _scans, ok in results.values()):
+            raise SystemExit(1) # Non-zero exit for scripts / CI
+
+    @app.cli.command('explain-workouts')
+    @click.option('--equipment-type-id', type=int, default=1, show_default=True, help='Equipment type of the filtered combinations.')
+    def explain_workouts_command(equipment_type_id):
+        """Check that every workouts list sort/filter combination is an index scan without a sort."""
+        with db.engine.connect() as connection:
+            results = check_workout_list_plans(connection, equipment_type_id)
+        for (with_equipment, sort_key, direction), (nodes, ok) in results.items():
+            plan_text = ', '.join(node_type + (f" on {relation}" if relation else '') + (f" using {index}" if index else '') for node_type, relation, index in nodes)
+            click.echo(f"{sort_key}{' + equipment' if with_equipment else ''} ({direction}): {'ok' if ok else 'UNEXPECTED'} ({plan_text})")
+        if not all(ok for _nodes, ok in results.values()):
+            raise SystemExit(1) # Non-zero exit for scripts / CI
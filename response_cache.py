@@ -0,0 +1,231 @@
+# ========================================================
+# = response_cache.py - Data version keyed cache of rendered pages and fragments
+# ========================================================
+import pickle
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, has_app_context, request, session, message_flashed
+from data_versions import data_versions
+from user_settings import get_settings
+
+# Data versions every cached entry depends on: workout writes, materialized view refreshes
+# and ranking data written outside the workouts table (best efforts, power curve records,
+# ranking settings). Together with the settings version they make up the entry stamp.
+CACHE_DATA_VERSIONS = ('workouts', 'mv_refresh', 'rankings')
+
+ENTRY_OVERHEAD_BYTES = 256 # Rough per-entry cost of the key, the dict slot and the value object
+
+# --------------------------------------------------------
+# - LRU Backend
+#---------------------------------------------------------
+# In-process least recently used store with a memory budget. Values are sized by the caller;
+# the least recently used entries are evicted until a new entry fits. Another backend
+# (e.g. shared between processes) can replace it if it offers get / set / clear / stats.
+class LRUBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # {key: (value, size)}, least recently used first
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size):
+        size += ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return False # Would evict everything else
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            while self._bytes + size > self.max_bytes:
+                _evicted_key, (_evicted_value, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+            self._entries[key] = (value, size)
+            self._bytes += size
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes, 'evictions': self._evictions}
+
+# Approximate size of a cached value in bytes
+def _value_size(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], (str, bytes)):
+        return len(value[0]) # Cached page: (body, mimetype)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception: # Unpicklable values: count the overhead only
+        return 0
+
+# --------------------------------------------------------
+# - Response Cache
+#---------------------------------------------------------
+# Entries are keyed by (kind, name, arguments, stamp). The stamp is taken from the data
+# version and settings caches, which follow committed changes in every process through
+# cache_listener notifications; without a running listener nothing is cached. Entries of an
+# older stamp can never be hit again, so the backend is cleared when the stamp moves on.
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._current_stamp = None
+        self._counters = {} # {kind: {'hits': n, 'misses': n, 'bypasses': n}}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def configure(self, backend):
+        self.backend = backend
+        self._current_stamp = None
+
+    def _count(self, kind, counter):
+        with self._lock:
+            kind_counters = self._counters.setdefault(kind, {'hits': 0, 'misses': 0, 'bypasses': 0})
+            kind_counters[counter] += 1
+
+    # Current stamp, or None while entries cannot be kept current (or caching is disabled)
+    def stamp(self):
+        if self.backend is None:
+            return None
+        data_stamp = data_versions.stamp(*CACHE_DATA_VERSIONS)
+        if data_stamp is None:
+            return None
+        stamp = data_stamp + (get_settings().version,)
+        with self._lock:
+            stale = self._current_stamp is not None and self._current_stamp != stamp
+            self._current_stamp = stamp
+            if stale:
+                self._invalidations += 1
+        if stale:
+            self.backend.clear()
+        return stamp
+
+    # Returns the cached value of (kind, name, args) at the current stamp, building and
+    # caching it on a miss. `build` returns (value, cacheable).
+    def get_or_build(self, kind, name, args, build):
+        stamp = self.stamp()
+        if stamp is None:
+            self._count(kind, 'bypasses')
+            value, _cacheable = build()
+            return value
+        key = (kind, name, args, stamp)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(kind, 'hits')
+            return value
+        self._count(kind, 'misses')
+        value, cacheable = build()
+        if cacheable and value is not None:
+            self.backend.set(key, value, _value_size(value))
+        return value
+
+    def bypass(self, kind):
+        self._count(kind, 'bypasses')
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = {kind: dict(kind_counters) for kind, kind_counters in self._counters.items()}
+            invalidations = self._invalidations
+            stamp = self._current_stamp
+        for kind_counters in counters.values():
+            lookups = kind_counters['hits'] + kind_counters['misses']
+            kind_counters['hit_ratio'] = round(kind_counters['hits'] / lookups, 3) if lookups else None
+        return {
+            'enabled': self.backend is not None,
+            'stamp': list(stamp) if stamp is not None else None,
+            'invalidations': invalidations,
+            'kinds': counters,
+            'backend': self.backend.stats() if self.backend is not None else None
+        }
+
+response_cache = ResponseCache() # The process-wide cache, configured by init_response_cache()
+
+# Sets up the cache backend from the app configuration (no backend: caching disabled)
+def init_response_cache(app, backend=None):
+    if not app.config.get('RESPONSE_CACHE_ENABLED', True):
+        app.logger.info("Response cache disabled.")
+        response_cache.configure(None)
+        return
+    if backend is None:
+        backend = LRUBackend(int(app.config.get('RESPONSE_CACHE_MAX_MB', 32) * 1024 * 1024))
+    response_cache.configure(backend)
+
+# --------------------------------------------------------
+# - Full Page Cache
+#---------------------------------------------------------
+# Keeps the page rendered by the current request out of the cache, e.g. when it shows
+# fallback data after a failed query
+def skip_response_cache():
+    g.response_cache_skip = True
+
+# A page that flashed a message shows it once, so it is not cached
+@message_flashed.connect
+def _skip_flashed_page(sender, message, category):
+    skip_response_cache()
+
+# View decorator caching the rendered body of successful GET responses by path and query
+# string. Requests with pending flash messages render afresh (the page would show them),
+# and pages that flashed or called skip_response_cache() are not stored.
+def cached_page(view):
+    @wraps(view)
+    def cached_view(*args, **kwargs):
+        if request.method != 'GET' or session.get('_flashes'):
+            response_cache.bypass('page')
+            return view(*args, **kwargs)
+        query_args = tuple(sorted(request.args.items(multi=True)))
+
+        def render():
+            g.response_cache_skip = False
+            response = current_app.make_response(view(*args, **kwargs))
+            g.response_cache_response = response
+            cacheable = response.status_code == 200 and not response.direct_passthrough and not g.response_cache_skip
+            return ((response.get_data() if cacheable else None), response.mimetype), cacheable
+
+        g.response_cache_response = None
+        body, mimetype = response_cache.get_or_build('page', request.path, query_args, render)
+        if g.response_cache_response is not None:
+            return g.response_cache_response # Rendered by this request
+        return current_app.response_class(body, mimetype=mimetype)
+    return cached_view
+
+# --------------------------------------------------------
+# - Fragment Cache
+#---------------------------------------------------------
+# Runs build() for a fragment and returns (value, cacheable): not cacheable when the build
+# called skip_response_cache(). The flag still applies to the page afterwards.
+def _build_fragment(build):
+    if not has_app_context():
+        return build(), True
+    page_skipped = g.get('response_cache_skip', False)
+    g.response_cache_skip = False
+    try:
+        value = build()
+        fragment_skipped = g.response_cache_skip
+    finally:
+        g.response_cache_skip = page_skipped or g.response_cache_skip
+    return value, not fragment_skipped
+
+# Returns the cached result of build() for (name, key_args), e.g. the rows of a table or a
+# chart payload shared by several pages or query strings. The value must only depend on the
+# data versions and settings, plus the key arguments, and is shared: callers must not modify it.
+def cached_fragment(name, build, *key_args):
+    return response_cache.get_or_build('fragment', name, key_args, lambda: _build_fragment(build))
@@ -0,0 +1,145 @@
+# ========================================================
+# = sample_loader.py - One-query loading of a workout's samples
+# ========================================================
+from collections import namedtuple
+from sqlalchemy import text
+from models import db
+
+# Pseudo metric name under which the heart rate samples are returned
+HEART_RATE_METRIC = 'HeartRate'
+
+# All metric series of a workout with their descriptors, plus the heart rate samples
+# packed into the same (times, values) array shape. Metrics come first, ordered by
+# descriptor id; the heart rate row is only present when the workout has HR samples.
+# Both halves are index reads (workout_series primary key, ix_heart_rate_samples_workout_time).
+WORKOUT_SAMPLES_SQL = """
+    SELECT
+        md.metric_descriptor_id,
+        md.metric_name,
+        md.unit_of_measure,
+        ws.time_offset_seconds,
+        ws.sample_values
+    FROM workout_series ws
+    JOIN metric_descriptors md ON md.metric_descriptor_id = ws.metric_descriptor_id
+    WHERE ws.workout_id = :workout_id
+    UNION ALL
+    SELECT
+        NULL,
+        '""" + HEART_RATE_METRIC + """',
+        'bpm',
+        array_agg(hr.time_offset_seconds ORDER BY hr.time_offset_seconds),
+        array_agg(hr.heart_rate_bpm::double precision ORDER BY hr.time_offset_seconds)
+    FROM heart_rate_samples hr
+    WHERE hr.workout_id = :workout_id
+    HAVING count(*) > 0
+    ORDER BY 1 NULLS LAST
+"""
+
+# --------------------------------------------------------
+# - Workout Sample Set
+#---------------------------------------------------------
+# A workout's samples pivoted in memory. `times` is the sorted union of all metric
+# sample times (heart rate excluded, it is recorded on its own clock), and
+# aligned(name) returns a metric's values on that axis, None where it has no sample.
+class WorkoutSampleSet:
+    # -- Initialization Method -------------------
+    def __init__(self, rows):
+        self.series = {} # metric_name -> (time list, value list), in time order
+        self.units = {} # metric_name -> unit_of_measure
+        for row in rows:
+            if row.metric_name in self.series:
+                continue # Same name with another unit: keep the lowest descriptor id
+            self.series[row.metric_name] = (list(row.time_offset_seconds), list(row.sample_values))
+            self.units[row.metric_name] = row.unit_of_measure
+
+        self.times = sorted({t for name, (times, _values) in self.series.items() if name != HEART_RATE_METRIC for t in times})
+        self._index_by_time = {t: i for i, t in enumerate(self.times)}
+        self._aligned = {} # Cache of pivoted value lists
+
+    def __contains__(self, metric_name):
+        return metric_name in self.series
+
+    # -- Raw Samples -------------------
+    # Returns (times, values) of a metric, or two empty lists when it was not recorded
+    def samples(self, metric_name):
+        return self.series.get(metric_name, ([], []))
+
+    def unit(self, metric_name):
+        return self.units.get(metric_name)
+
+    # -- Values on the Shared Time Axis -------------------
+    # For duplicate time offsets the last sample wins
+    def aligned(self, metric_name):
+        if metric_name not in self._aligned:
+            aligned_values = [None] * len(self.times)
+            times, values = self.samples(metric_name)
+            for t, value in zip(times, values):
+                position = self._index_by_time.get(t)
+                if position is not None:
+                    aligned_values[position] = value
+            self._aligned[metric_name] = aligned_values
+        return self._aligned[metric_name]
+
+# Loads all samples of a workout with a single query
+def load_workout_samples(workout_id):
+    rows = db.session.execute(text(WORKOUT_SAMPLES_SQL), {'workout_id': workout_id}).fetchall()
+    return WorkoutSampleSet(rows)
+
+# Row shape of WORKOUT_SAMPLES_SQL, for sample sets built without a query
+WorkoutSampleRow = namedtuple('WorkoutSampleRow', ['metric_descriptor_id', 'metric_name', 'unit_of_measure', 'time_offset_seconds', 'sample_values'])
+
+# Builds the sample set of a workout from samples still in memory (e.g. the ones an import
+# just wrote), equal to what load_workout_samples() would read back.
+# metric_series: [(metric_descriptor_id, metric_name, unit_of_measure, [(time, value)] in time order)]
+# heart_rate_samples: [(time, bpm)] in any order
+def build_workout_samples(metric_series, heart_rate_samples):
+    rows = [
+        WorkoutSampleRow(descriptor_id, metric_name, unit_of_measure,
+                         [int(t) for t, _value in samples], [None if value is None else float(value) for _t, value in samples])
+        for descriptor_id, metric_name, unit_of_measure, samples in sorted(metric_series, key=lambda series: series[0])
+    ]
+    if heart_rate_samples:
+        heart_rate_samples = sorted(heart_rate_samples, key=lambda sample: sample[0])
+        rows.append(WorkoutSampleRow(None, HEART_RATE_METRIC, 'bpm',
+                                     [int(t) for t, _bpm in heart_rate_samples], [float(bpm) for _t, bpm in heart_rate_samples]))
+    return WorkoutSampleSet(rows)
+
+# --------------------------------------------------------
+# - Lazy Sample Set
+#---------------------------------------------------------
+# Stands in for a WorkoutSampleSet and loads it on first use, for pages that normally read
+# the precomputed tables and only need the samples as a fallback
+class LazyWorkoutSampleSet:
+    def __init__(self, workout_id):
+        self.workout_id = workout_id
+        self._sample_set = None
+
+    @property
+    def loaded(self):
+        return self._sample_set is not None
+
+    def _load(self):
+        if self._sample_set is None:
+            self._sample_set = load_workout_samples(self.workout_id)
+        return self._sample_set
+
+    def __contains__(self, metric_name):
+        return metric_name in self._load()
+
+    def __getattr__(self, name): # Only called for attributes not set above
+        return getattr(self._load(), name)
+
+# Units of the metrics recorded for a workout, {metric_name: unit_of_measure}, without
+# reading the sample arrays
+def load_workout_metric_units(workout_id):
+    rows = db.session.execute(text("""
+        SELECT md.metric_name, md.unit_of_measure
+        FROM workout_series ws
+        JOIN metric_descriptors md ON md.metric_descriptor_id = ws.metric_descriptor_id
+        WHERE ws.workout_id = :workout_id
+        ORDER BY md.metric_descriptor_id
+    """), {'workout_id': workout_id}).fetchall()
+    metric_units = {}
+    for row in rows:
+        metric_units.setdefault(row.metric_name, row.unit_of_measure) # Lowest descriptor id, as WorkoutSampleSet
+    return metric_units
@@ -0,0 +1,549 @@
+# ========================================================
+# = series.py - NumPy series engine for splits, HR zone times, histograms, best efforts, power curves and chart downsampling
+# ========================================================
+import random
+import statistics
+import time
+import click
+import numpy as np
+
+SPLIT_DISTANCE_METERS = 500 # Split table step
+POWER_HOLD_SECONDS = 5 # A power sample counts for at most this long; longer recording gaps count as 0 W
+
+# --------------------------------------------------------
+# - Sample Series
+#---------------------------------------------------------
+# One metric's samples as NumPy arrays. Times must be ascending (workout_series rows
+# and the HR query are stored / read in time order); samples without a value are dropped.
+class SampleSeries:
+    # -- Initialization Method -------------------
+    def __init__(self, times, values):
+        pairs = [(t, v) for t, v in zip(times, values) if v is not None]
+        self.times = np.array([t for t, _v in pairs], dtype=np.float64)
+        self.values = np.array([v for _t, v in pairs], dtype=np.float64)
+        self._value_list = [float(v) for _t, v in pairs] # For exact Python sums, see interval_means()
+        # Prefix sums of integral values (power, SPM, HR) are exact, so differences of them
+        # equal the sequential sums of the original code bit for bit
+        self._exact_prefix = bool(np.all(self.values == np.rint(self.values))) and float(np.abs(self.values).sum()) < 2 ** 53
+        self._prefix = np.concatenate(([0.0], np.cumsum(self.values))) if self._exact_prefix else None
+
+    def __len__(self):
+        return len(self.times)
+
+    # -- Interval Means -------------------
+    # Mean of the samples with start <= time < end for each (start, end) pair. An interval
+    # without samples takes the last value before it (0 when there is none), and an empty
+    # series gives 0 everywhere.
+    def interval_means(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        if not len(self):
+            return [0] * len(starts)
+
+        lows = np.searchsorted(self.times, starts, side='left')
+        highs = np.searchsorted(self.times, ends, side='left')
+        counts = highs - lows
+
+        means = []
+        for low, high, count in zip(lows.tolist(), highs.tolist(), counts.tolist()):
+            if count > 0:
+                if self._exact_prefix:
+                    means.append(float((self._prefix[high] - self._prefix[low]) / count))
+                else: # Fractional values: a sequential slice sum keeps the original rounding
+                    means.append(sum(self._value_list[low:high]) / count)
+            elif low > 0:
+                means.append(self._value_list[low - 1]) # Last sample before the interval
+            else:
+                means.append(0)
+        return means
+
+# --------------------------------------------------------
+# - Split Calculation
+#---------------------------------------------------------
+# Returns the split rows (every `split_distance` meters) from the distance, power, SPM and
+# HR series, as {'distance', 'time', 'pace', 'avg_power', 'avg_spm', 'avg_hr'} dicts, where
+# 'pace' is the split's duration. A split's time is interpolated linearly between the two
+# distance samples that cross it.
+def calculate_splits(distance, power, spm, hr, split_distance=SPLIT_DISTANCE_METERS):
+    if not len(distance) or distance.values[-1] < split_distance:
+        return []
+
+    times, distances = distance.times, distance.values
+    if times[0] != 0:
+        times = np.concatenate(([0.0], times)) # Splits are measured from a zero point
+        distances = np.concatenate(([0.0], distances))
+    elif distances[0] >= split_distance:
+        # First sample already past the first split; never seen in real data, so the
+        # scalar code handles it rather than complicating the crossing search
+        return _reference_splits(distance, power, spm, hr, split_distance)
+
+    # == Split Crossings ============================================
+    # With the running maximum, the first sample reaching a target is a searchsorted lookup;
+    # the sample before it is still below the target, so it brackets the crossing
+    running_max = np.maximum.accumulate(distances)
+    split_count = int(running_max[-1] // split_distance)
+    targets = np.arange(1, split_count + 1, dtype=np.float64) * split_distance
+    crossing = np.searchsorted(running_max, targets, side='left')
+
+    previous_distance, current_distance = distances[crossing - 1], distances[crossing]
+    previous_time, current_time = times[crossing - 1], times[crossing]
+    fraction = (targets - previous_distance) / (current_distance - previous_distance)
+    split_times = previous_time + ((current_time - previous_time) * fraction)
+    split_starts = np.concatenate(([0.0], split_times[:-1]))
+    paces = split_times - split_starts
+
+    # == Interval Averages ============================================
+    avg_powers = power.interval_means(split_starts, split_times)
+    avg_spms = spm.interval_means(split_starts, split_times)
+    avg_hrs = hr.interval_means(split_starts, split_times)
+
+    return [
+        {'distance': int(target), 'time': split_time, 'pace': pace, 'avg_power': avg_power, 'avg_spm': avg_spm, 'avg_hr': avg_hr}
+        for target, split_time, pace, avg_power, avg_spm, avg_hr
+        in zip(targets.tolist(), split_times.tolist(), paces.tolist(), avg_powers, avg_spms, avg_hrs)
+    ]
+
+# Returns time-based split rows (every `split_seconds`), same dict shape as calculate_splits()
+# with 'distance' the distance covered at the end of the split and 'pace' its duration.
+# The distance at a split boundary is interpolated linearly; a trailing partial split is
+# left out, as for distance splits.
+def calculate_time_splits(distance, power, spm, hr, split_seconds):
+    if not len(distance):
+        return []
+
+    times, distances = distance.times, distance.values
+    if times[0] != 0:
+        times = np.concatenate(([0.0], times)) # Splits are measured from a zero point
+        distances = np.concatenate(([0.0], distances))
+
+    split_count = int(times[-1] // split_seconds)
+    if not split_count:
+        return []
+    split_times = np.arange(1, split_count + 1, dtype=np.float64) * split_seconds
+    split_starts = np.concatenate(([0.0], split_times[:-1]))
+    # Running maximum, so a dip in the distance reading never gives a negative split
+    split_distances = np.interp(split_times, times, np.maximum.accumulate(distances))
+
+    avg_powers = power.interval_means(split_starts, split_times)
+    avg_spms = spm.interval_means(split_starts, split_times)
+    avg_hrs = hr.interval_means(split_starts, split_times)
+
+    return [
+        {'distance': split_distance, 'time': split_time, 'pace': float(split_seconds), 'avg_power': avg_power, 'avg_spm': avg_spm, 'avg_hr': avg_hr}
+        for split_distance, split_time, avg_power, avg_spm, avg_hr
+        in zip(split_distances.tolist(), split_times.tolist(), avg_powers, avg_spms, avg_hrs)
+    ]
+
+# --------------------------------------------------------
+# - HR Zone Time
+#---------------------------------------------------------
+# Returns the seconds spent in each (start, end) bpm range. Each interval between two
+# consecutive points counts for the range containing the heart rate at its start (the first
+# matching range when they overlap); points without a heart rate (None) count for no range.
+def zone_durations(times, heart_rates, zone_bounds):
+    if len(times) < 2 or not zone_bounds:
+        return [0] * len(zone_bounds)
+
+    times = np.asarray(times)
+    durations = np.diff(times)
+    interval_rates = np.array([np.nan if rate is None else rate for rate in heart_rates[:-1]], dtype=np.float64)
+
+    zone_index = np.full(len(durations), len(zone_bounds)) # Last bucket collects unmatched intervals
+    for index in range(len(zone_bounds) - 1, -1, -1): # Reversed, so the first matching range wins
+        start, end = zone_bounds[index]
+        zone_index[(interval_rates >= start) & (interval_rates < end)] = index
+
+    totals = np.bincount(zone_index, weights=durations, minlength=len(zone_bounds) + 1)[:len(zone_bounds)]
+    if np.issubdtype(durations.dtype, np.integer):
+        return np.rint(totals).astype(np.int64).tolist() # Whole seconds, as summed by the original loop
+    return totals.tolist()
+
+# Heart rate points as charted and zoned: valid (> 0) readings as int, preceded by an
+# empty point at 0 when the recording starts later. Returns (times, bpm values).
+def heart_rate_points(hr_times, hr_values):
+    point_times, point_rates = [], []
+    if hr_times and hr_times[0] is not None and hr_times[0] > 0:
+        point_times.append(0)
+        point_rates.append(None)
+    for time_offset, heart_rate_bpm in zip(hr_times, hr_values):
+        if heart_rate_bpm is not None and heart_rate_bpm > 0:
+            point_times.append(time_offset)
+            point_rates.append(int(heart_rate_bpm))
+    return point_times, point_rates
+
+# Zone seconds for a batch of workouts, [(workout_id, [seconds per range])] for
+# [(workout_id, hr_times, hr_values)]. A plain module-level function of plain data, so it
+# can run in a worker process (see workout_hr_zones.recompute_workout_hr_zones()).
+def hr_zone_seconds_batch(workouts, zone_bounds):
+    return [
+        (workout_id, zone_durations(*heart_rate_points(hr_times, hr_values), zone_bounds))
+        for workout_id, hr_times, hr_values in workouts
+    ]
+
+# --------------------------------------------------------
+# - Time Histograms
+#---------------------------------------------------------
+# Time-weighted histogram with bins of `bin_width`: each interval between two consecutive
+# points counts for the bin of the value at its start, as in zone_durations(); points without
+# a value (None) count for no bin. Returns (first_bin, bin_seconds) where bin i holds values
+# in [first_bin + i * bin_width, first_bin + (i + 1) * bin_width), or (None, []) when no time
+# is attributed. Whole seconds stay integers.
+def time_histogram(times, values, bin_width):
+    if len(times) < 2:
+        return None, []
+    times = np.asarray(times)
+    durations = np.diff(times)
+    interval_values = np.array([np.nan if value is None else value for value in values[:-1]], dtype=np.float64)
+    counted = ~np.isnan(interval_values)
+    if not counted.any():
+        return None, []
+
+    bins = np.floor(interval_values[counted] / bin_width).astype(np.int64)
+    first_bin_index = int(bins.min())
+    totals = np.bincount(bins - first_bin_index, weights=durations[counted])
+    if np.issubdtype(durations.dtype, np.integer):
+        totals = np.rint(totals).astype(np.int64)
+    return first_bin_index * bin_width, totals.tolist()
+
+# Seconds per (start, end) range from a time histogram with bins of `bin_width`, the first
+# matching range winning for each bin as in zone_durations(). Equals zone_durations() on the
+# original points whenever the range bounds fall on bin edges (1-bpm bins and integer bpm
+# bounds for HR zones), so zone times can be recomputed for new bounds without the samples.
+def histogram_zone_seconds(first_bin, bin_width, bin_seconds, zone_bounds):
+    zone_times = [0] * len(zone_bounds)
+    for index, seconds in enumerate(bin_seconds):
+        if not seconds:
+            continue
+        bin_value = first_bin + index * bin_width
+        for zone_index, (start, end) in enumerate(zone_bounds):
+            if start <= bin_value < end:
+                zone_times[zone_index] += seconds
+                break
+    return zone_times
+
+# --------------------------------------------------------
+# - Best Efforts
+#---------------------------------------------------------
+# The cumulative distance curve searched for best efforts: measured from a zero point and
+# made non-decreasing (running maximum), so it is piecewise linear and monotone.
+# Returns (times, distances) arrays, or None without distance samples.
+def _effort_curve(distance):
+    if not len(distance):
+        return None
+    times, distances = distance.times, distance.values
+    if times[0] != 0:
+        times = np.concatenate(([0.0], times))
+        distances = np.concatenate(([0.0], distances))
+    return times, np.maximum.accumulate(distances)
+
+# np.searchsorted(values, queries, side) for queries that are sorted themselves, in linear
+# time: the two-pointer sweep over both arrays, done as one stable merge. The stable sort
+# (timsort) finds the two presorted runs and merges them in a single pass; equal values
+# keep their array order, which gives the 'left' / 'right' tie rule.
+def _sorted_search(values, queries, side):
+    if side == 'right':
+        merged, first_query = np.concatenate((values, queries)), len(values)
+    else:
+        merged, first_query = np.concatenate((queries, values)), 0
+    order = np.argsort(merged, kind='stable')
+    query_positions = np.flatnonzero((order >= first_query) & (order < first_query + len(queries)))
+    return query_positions - np.arange(len(queries)) # Values merged in before each query
+
+# Fastest `target_distance` anywhere in the workout, as {'duration_seconds',
+# 'distance_meters', 'start_offset_seconds'}, or None when the workout is shorter.
+# On a piecewise linear curve the optimal window starts or ends at a sample, so both
+# sample-aligned window sets are searched; the other end is interpolated. Each window
+# set is a two-pointer sweep (both ends only move forward), O(n) via _sorted_search().
+def best_distance_effort(distance, target_distance):
+    curve = _effort_curve(distance)
+    if curve is None or curve[1][-1] - curve[1][0] < target_distance:
+        return None
+    times, distances = curve
+
+    # == Windows Ending at a Sample ============================================
+    ends = np.flatnonzero(distances - target_distance >= distances[0])
+    start_distances = distances[ends] - target_distance
+    k = _sorted_search(distances, start_distances, 'right') # distances[k-1] <= start < distances[k]
+    end_aligned_starts = times[k - 1] + (start_distances - distances[k - 1]) / (distances[k] - distances[k - 1]) * (times[k] - times[k - 1])
+    end_aligned_durations = times[ends] - end_aligned_starts
+
+    # == Windows Starting at a Sample ============================================
+    starts = np.flatnonzero(distances + target_distance <= distances[-1])
+    end_distances = distances[starts] + target_distance
+    k = _sorted_search(distances, end_distances, 'left') # distances[k-1] < end <= distances[k]
+    start_aligned_ends = times[k - 1] + (end_distances - distances[k - 1]) / (distances[k] - distances[k - 1]) * (times[k] - times[k - 1])
+    start_aligned_durations = start_aligned_ends - times[starts]
+
+    durations = np.concatenate((end_aligned_durations, start_aligned_durations))
+    window_starts = np.concatenate((end_aligned_starts, times[starts]))
+    best = int(np.argmin(durations))
+    return {'duration_seconds': float(durations[best]), 'distance_meters': float(target_distance), 'start_offset_seconds': float(window_starts[best])}
+
+# Longest distance covered in any `duration_seconds` window, same dict shape as
+# best_distance_effort(), or None when the workout is shorter. Same search, on the time axis.
+def best_time_effort(distance, duration_seconds):
+    curve = _effort_curve(distance)
+    if curve is None or curve[0][-1] - curve[0][0] < duration_seconds:
+        return None
+    times, distances = curve
+
+    # == Windows Ending at a Sample ============================================
+    ends = np.flatnonzero(times - duration_seconds >= times[0])
+    start_times = times[ends] - duration_seconds
+    k = _sorted_search(times, start_times, 'right') # times[k-1] <= start < times[k]
+    end_aligned_meters = distances[ends] - (distances[k - 1] + (start_times - times[k - 1]) / (times[k] - times[k - 1]) * (distances[k] - distances[k - 1]))
+
+    # == Windows Starting at a Sample ============================================
+    starts = np.flatnonzero(times + duration_seconds <= times[-1])
+    end_times = times[starts] + duration_seconds
+    k = _sorted_search(times, end_times, 'left') # times[k-1] < end <= times[k]
+    start_aligned_meters = (distances[k - 1] + (end_times - times[k - 1]) / (times[k] - times[k - 1]) * (distances[k] - distances[k - 1])) - distances[starts]
+
+    meters = np.concatenate((end_aligned_meters, start_aligned_meters))
+    window_starts = np.concatenate((start_times, times[starts]))
+    best = int(np.argmax(meters))
+    return {'duration_seconds': float(duration_seconds), 'distance_meters': float(meters[best]), 'start_offset_seconds': float(window_starts[best])}
+
+# --------------------------------------------------------
+# - Mean-Maximal Power
+#---------------------------------------------------------
+# Best average of a metric over each window length in `durations` (seconds), the
+# mean-maximal (power-duration) curve. The samples are laid on a 1 s grid, each value
+# held until the next sample (at most POWER_HOLD_SECONDS), so the windows are time based
+# whatever the recording rate. Every window is a difference of two prefix sums, so each
+# duration is one vectorized pass. Returns floats aligned with `durations`, None for
+# durations longer than the recording.
+def mean_max_curve(series, durations):
+    if not len(series):
+        return [None] * len(durations)
+
+    grid = np.arange(np.ceil(series.times[0]), np.floor(series.times[-1]) + 1)
+    held = np.searchsorted(series.times, grid, side='right') - 1 # Last sample at or before each second
+    grid_values = np.where(grid - series.times[held] < POWER_HOLD_SECONDS, series.values[held], 0.0)
+    prefix = np.concatenate(([0.0], np.cumsum(grid_values)))
+
+    curve = []
+    for duration in durations:
+        if duration > len(grid_values):
+            curve.append(None)
+        else:
+            curve.append(float(np.max(prefix[duration:] - prefix[:-duration]) / duration))
+    return curve
+
+# --------------------------------------------------------
+# - Min/Max Downsampling
+#---------------------------------------------------------
+# Chart downsampling of a SampleSeries into time buckets of `bucket_seconds`: the minimum
+# and the maximum sample of every bucket are kept (one point when they coincide), so
+# peaks and dips survive at any zoom level. Returns (times, values) lists in time order,
+# original sample points only.
+def min_max_downsample(series, bucket_seconds):
+    if not len(series):
+        return [], []
+    buckets = np.floor(series.times / bucket_seconds)
+    keys = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1]))) # First point of each bucket
+    # Within a bucket, lexsort puts the smallest (resp. largest) value first; ties go to the earliest point
+    by_min = np.lexsort((np.arange(len(series)), series.values, buckets))
+    by_max = np.lexsort((np.arange(len(series)), -series.values, buckets))
+    kept = np.unique(np.concatenate((by_min[keys], by_max[keys])))
+    return series.times[kept].tolist(), series.values[kept].tolist()
+
+# --------------------------------------------------------
+# - Reference Implementations
+#---------------------------------------------------------
+# The original per-split scans, kept as the parity baseline for `flask benchmark-series`
+# and for the first-sample-past-the-first-split corner case of calculate_splits().
+def _reference_splits(distance, power, spm, hr, split_distance=SPLIT_DISTANCE_METERS):
+    def to_samples(series):
+        return [{'time': t, 'value': v} for t, v in zip(series.times.tolist(), series._value_list)]
+
+    distance_samples, power_samples, spm_samples, hr_samples = (to_samples(s) for s in (distance, power, spm, hr))
+    if not distance_samples or distance_samples[-1]['value'] < split_distance:
+        return []
+
+    def get_average_for_interval(samples, start_time, end_time):
+        if not samples:
+            return 0
+        relevant_samples = [s['value'] for s in samples if start_time <= s['time'] < end_time]
+        if not relevant_samples:
+            last_sample_before = [s['value'] for s in samples if s['time'] < start_time]
+            if last_sample_before:
+                return last_sample_before[-1]
+            return 0
+        return sum(relevant_samples) / len(relevant_samples)
+
+    if distance_samples[0]['time'] != 0:
+        distance_samples.insert(0, {'time': 0.0, 'value': 0.0})
+
+    split_data = []
+    target_distance = split_distance
+    last_time = 0.0
+    i = 1
+    while i < len(distance_samples):
+        prev_sample = distance_samples[i-1]
+        curr_sample = distance_samples[i]
+        if prev_sample['value'] < target_distance <= curr_sample['value']:
+            dist_range = curr_sample['value'] - prev_sample['value']
+            time_range = curr_sample['time'] - prev_sample['time']
+            if dist_range > 0:
+                fraction = (target_distance - prev_sample['value']) / dist_range
+                split_time = prev_sample['time'] + (time_range * fraction)
+            else:
+                split_time = curr_sample['time']
+            split_data.append({
+                'distance': int(target_distance),
+                'time': split_time,
+                'pace': split_time - last_time,
+                'avg_power': get_average_for_interval(power_samples, last_time, split_time),
+                'avg_spm': get_average_for_interval(spm_samples, last_time, split_time),
+                'avg_hr': get_average_for_interval(hr_samples, last_time, split_time)
+            })
+            last_time = split_time
+            target_distance += split_distance
+        else:
+            i += 1
+    return split_data
+
+def _reference_zone_durations(times, heart_rates, zone_bounds):
+    zone_times = [0] * len(zone_bounds)
+    for i in range(1, len(times)):
+        if heart_rates[i-1] is None:
+            continue
+        for index, (start, end) in enumerate(zone_bounds):
+            if start <= heart_rates[i-1] < end:
+                zone_times[index] += times[i] - times[i-1]
+                break
+    return zone_times
+
+# Plain two-pointer sweeps over the same effort curve, the parity baseline for
+# best_distance_effort() / best_time_effort()
+def _reference_distance_effort(distance, target_distance):
+    curve = _effort_curve(distance)
+    if curve is None or curve[1][-1] - curve[1][0] < target_distance:
+        return None
+    times, distances = curve[0].tolist(), curve[1].tolist()
+    candidates = [] # (duration, start time) in the order the vectorized search produces them
+
+    k = 1
+    for j in range(len(times)):
+        start_distance = distances[j] - target_distance
+        if start_distance < distances[0]:
+            continue
+        while distances[k] <= start_distance:
+            k += 1
+        start_time = times[k-1] + (start_distance - distances[k-1]) / (distances[k] - distances[k-1]) * (times[k] - times[k-1])
+        candidates.append((times[j] - start_time, start_time))
+
+    k = 1
+    for i in range(len(times)):
+        end_distance = distances[i] + target_distance
+        if end_distance > distances[-1]:
+            continue
+        while distances[k] < end_distance:
+            k += 1
+        end_time = times[k-1] + (end_distance - distances[k-1]) / (distances[k] - distances[k-1]) * (times[k] - times[k-1])
+        candidates.append((end_time - times[i], times[i]))
+
+    best_duration, best_start = candidates[0]
+    for duration, start_time in candidates[1:]:
+        if duration < best_duration:
+            best_duration, best_start = duration, start_time
+    return {'duration_seconds': best_duration, 'distance_meters': float(target_distance), 'start_offset_seconds': best_start}
+
+def _reference_time_effort(distance, duration_seconds):
+    curve = _effort_curve(distance)
+    if curve is None or curve[0][-1] - curve[0][0] < duration_seconds:
+        return None
+    times, distances = curve[0].tolist(), curve[1].tolist()
+    candidates = [] # (meters, start time)
+
+    k = 1
+    for j in range(len(times)):
+        start_time = times[j] - duration_seconds
+        if start_time < times[0]:
+            continue
+        while times[k] <= start_time:
+            k += 1
+        start_distance = distances[k-1] + (start_time - times[k-1]) / (times[k] - times[k-1]) * (distances[k] - distances[k-1])
+        candidates.append((distances[j] - start_distance, start_time))
+
+    k = 1
+    for i in range(len(times)):
+        end_time = times[i] + duration_seconds
+        if end_time > times[-1]:
+            continue
+        while times[k] < end_time:
+            k += 1
+        end_distance = distances[k-1] + (end_time - times[k-1]) / (times[k] - times[k-1]) * (distances[k] - distances[k-1])
+        candidates.append((end_distance - distances[i], times[i]))
+
+    best_meters, best_start = candidates[0]
+    for meters, start_time in candidates[1:]:
+        if meters > best_meters:
+            best_meters, best_start = meters, start_time
+    return {'duration_seconds': float(duration_seconds), 'distance_meters': best_meters, 'start_offset_seconds': best_start}
+
+# --------------------------------------------------------
+# - Micro-Benchmark
+#---------------------------------------------------------
+# Synthetic 1 Hz workout: distance with one decimal, integral power / SPM / HR
+def _synthetic_workout(duration_seconds, seed=500):
+    rng = random.Random(seed)
+    times = list(range(1, duration_seconds + 1))
+    distances, meters = [], 0.0
+    for _t in times:
+        meters = round(meters + rng.uniform(3.0, 5.0), 1)
+        distances.append(meters)
+    power = [rng.randint(120, 260) for _t in times]
+    spm = [rng.randint(18, 32) for _t in times]
+    hr = [rng.randint(95, 185) for _t in times]
+    return times, distances, power, spm, hr
+
+# Times the NumPy engine against the reference loops and checks both give identical results.
+# Returns ({name: [seconds per run]}, consistent).
+def benchmark_series(duration_seconds, repeat):
+    times, distances, power, spm, hr = _synthetic_workout(duration_seconds)
+    zone_bounds = [(95, 114), (114, 133), (133, 152), (152, 171), (171, float('inf'))]
+    hr_times, hr_values = [0] + times, [None] + hr # Leading null point, as on the details page
+    effort_distance = SampleSeries(times, distances)
+
+    variants = {
+        'splits (reference)': lambda: _reference_splits(*(SampleSeries(times, values) for values in (distances, power, spm, hr))),
+        'splits (numpy)': lambda: calculate_splits(*(SampleSeries(times, values) for values in (distances, power, spm, hr))),
+        'zone times (reference)': lambda: _reference_zone_durations(hr_times, hr_values, zone_bounds),
+        'zone times (numpy)': lambda: zone_durations(hr_times, hr_values, zone_bounds),
+        'best efforts (reference)': lambda: [_reference_distance_effort(effort_distance, meters) for meters in (500, 1000, 2000, 5000)] +
+            [_reference_time_effort(effort_distance, seconds) for seconds in (60, 240, 1800)],
+        'best efforts (numpy)': lambda: [best_distance_effort(effort_distance, meters) for meters in (500, 1000, 2000, 5000)] +
+            [best_time_effort(effort_distance, seconds) for seconds in (60, 240, 1800)]
+    }
+    timings, results = {}, {}
+    for name, run in variants.items():
+        timings[name] = []
+        for _run in range(repeat):
+            started = time.perf_counter()
+            results[name] = run()
+            timings[name].append(time.perf_counter() - started)
+
+    consistent = results['splits (reference)'] == results['splits (numpy)'] and \
+        results['zone times (reference)'] == results['zone times (numpy)'] and \
+        results['best efforts (reference)'] == results['best efforts (numpy)']
+    return timings, consistent
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the series benchmark with `flask`
+def register_commands(app):
+    @app.cli.command('benchmark-series')
+    @click.option('--minutes', default=120, show_default=True, help='Length of the synthetic 1 Hz workout.')
+    @click.option('--repeat', default=5, show_default=True, help='Timed runs per variant.')
+    def benchmark_series_command(minutes, repeat):
+        """Time the split, HR zone and best effort calculations on a synthetic workout."""
+        timings, consistent = benchmark_series(minutes * 60, max(1, repeat))
+        click.echo(f"Synthetic {minutes} min workout at 1 Hz ({minutes * 60:,} samples per metric)")
+        for name, runs in timings.items():
+            click.echo(f"  {name}: median {statistics.median(runs) * 1000:.2f} ms, best {min(runs) * 1000:.2f} ms ({len(runs)} runs)")
+        click.echo(f"  numpy results identical to reference: {'yes' if consistent else 'NO'}")
+        if not consistent:
+            raise SystemExit(1)
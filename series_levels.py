@@ -0,0 +1,218 @@
+# ========================================================
+# = series_levels.py - Downsampled chart series pyramid for the details page charts
+# ========================================================
+import bisect
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from background_jobs import background_job
+from sample_loader import HEART_RATE_METRIC, LazyWorkoutSampleSet, load_workout_samples
+from series import SampleSeries, min_max_downsample
+from workout_stats import hr_points, refresh_workout_stats
+
+CHART_METRICS = ['RowingSplit', 'Power', 'Spm', HEART_RATE_METRIC] # Metrics charted on the details page
+SERIES_LEVEL_BUCKETS = [5, 20, 80, 320] # Pyramid levels (bucket seconds), finest first
+CHART_POINTS = 1000 # Default points per chart request
+MAX_CHART_POINTS = 5000 # Upper bound for the `points` request argument
+BUILD_SERIES_LEVELS_JOB = 'build_series_levels' # Background job name
+
+# --------------------------------------------------------
+# - Chart Points
+#---------------------------------------------------------
+# The charted points of a metric: positive values only, as on the details page
+# (heart rate: the valid readings of hr_points()). Returns a SampleSeries.
+def chart_series(times, values):
+    positive_points = [(t, float(value)) for t, value in zip(times, values) if value is not None and float(value) > 0]
+    return SampleSeries([t for t, _v in positive_points], [v for _t, v in positive_points])
+
+def workout_chart_series(workout_samples, metric_name):
+    if metric_name == HEART_RATE_METRIC:
+        return chart_series(*hr_points(workout_samples))
+    return chart_series(*workout_samples.samples(metric_name))
+
+# Returns {metric_name: [(bucket_seconds, times, values)]} for a loaded WorkoutSampleSet,
+# leaving out metrics without chart points
+def compute_series_levels(workout_samples):
+    levels = {}
+    for metric_name in CHART_METRICS:
+        series = workout_chart_series(workout_samples, metric_name)
+        if len(series):
+            levels[metric_name] = [(bucket_seconds, *min_max_downsample(series, bucket_seconds)) for bucket_seconds in SERIES_LEVEL_BUCKETS]
+    return levels
+
+# --------------------------------------------------------
+# - Series Level Storage
+#---------------------------------------------------------
+INSERT_SERIES_LEVEL_SQL = """
+    INSERT INTO workout_series_levels (workout_id, metric_name, bucket_seconds, time_offset_seconds, sample_values)
+    VALUES (:workout_id, :metric_name, :bucket_seconds, CAST(:times AS integer[]), CAST(:values AS double precision[]))
+"""
+
+# Replaces the stored pyramid of one workout in the current session transaction and records
+# the bucket widths on its workout_stats row (which must exist). Returns the number of levels.
+def refresh_workout_series_levels(workout_id, workout_samples=None):
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+
+    level_rows = [{
+        'workout_id': workout_id,
+        'metric_name': metric_name,
+        'bucket_seconds': bucket_seconds,
+        'times': [int(t) for t in times],
+        'values': values
+    } for metric_name, metric_levels in compute_series_levels(workout_samples).items() for bucket_seconds, times, values in metric_levels]
+
+    db.session.execute(text("DELETE FROM workout_series_levels WHERE workout_id = :workout_id"), {'workout_id': workout_id})
+    if level_rows:
+        db.session.execute(text(INSERT_SERIES_LEVEL_SQL), level_rows) # executemany
+    db.session.execute(
+        text("UPDATE workout_stats SET series_level_buckets = CAST(:buckets AS integer[]) WHERE workout_id = :workout_id"),
+        {'workout_id': workout_id, 'buckets': SERIES_LEVEL_BUCKETS}
+    )
+    return len(level_rows)
+
+# --------------------------------------------------------
+# - Series Window Reads
+#---------------------------------------------------------
+# Chart points of one metric within [start, end] straight from the samples
+def load_raw_chart_series(workout_id, metric_name, start, end):
+    if metric_name == HEART_RATE_METRIC: # Range scan on ix_heart_rate_samples_workout_time
+        row = db.session.execute(text("""
+            SELECT
+                array_agg(time_offset_seconds ORDER BY time_offset_seconds) AS times,
+                array_agg(heart_rate_bpm ORDER BY time_offset_seconds) AS sample_values
+            FROM heart_rate_samples
+            WHERE workout_id = :workout_id AND time_offset_seconds BETWEEN :start AND :end
+        """), {'workout_id': workout_id, 'start': start, 'end': end}).first()
+    else: # One workout_series row (lowest descriptor id, as load_workout_samples())
+        row = db.session.execute(text("""
+            SELECT ws.time_offset_seconds AS times, ws.sample_values
+            FROM workout_series ws
+            JOIN metric_descriptors md ON md.metric_descriptor_id = ws.metric_descriptor_id
+            WHERE ws.workout_id = :workout_id AND md.metric_name = :metric_name
+            ORDER BY md.metric_descriptor_id
+            LIMIT 1
+        """), {'workout_id': workout_id, 'metric_name': metric_name}).first()
+    if row is None or row.times is None:
+        return SampleSeries([], [])
+    window_points = [(t, value) for t, value in zip(row.times, row.sample_values) if start <= t <= end]
+    return chart_series([t for t, _v in window_points], [v for _t, v in window_points])
+
+# The points of ascending `times` within [start, end]
+def _window(times, values, start, end):
+    low, high = bisect.bisect_left(times, start), bisect.bisect_right(times, end)
+    return times[low:high], values[low:high]
+
+# Returns the chart points of one metric for the window [start, end] (the whole workout when
+# None) with at most `points` points: the raw samples when they fit, otherwise the finest
+# pyramid level that fits (the coarsest level, downsampled further, for very long windows).
+# A workout whose pyramid is not stored yet is downsampled on the fly from its samples.
+# Returns {'metric', 'bucket_seconds' (0: raw samples), 'x', 'y'}.
+def get_series_window(workout_id, metric_name, start=None, end=None, points=CHART_POINTS, workout_samples=None):
+    start = 0 if start is None else start
+    end = float('inf') if end is None else end
+    levels = [(row.bucket_seconds, list(row.time_offset_seconds), list(row.sample_values)) for row in db.session.execute(text("""
+        SELECT bucket_seconds, time_offset_seconds, sample_values
+        FROM workout_series_levels
+        WHERE workout_id = :workout_id AND metric_name = :metric_name
+        ORDER BY bucket_seconds
+    """), {'workout_id': workout_id, 'metric_name': metric_name}).fetchall()]
+    if not levels:
+        if workout_samples is None:
+            workout_samples = load_workout_samples(workout_id)
+        levels = compute_series_levels(workout_samples).get(metric_name, [])
+    if not levels:
+        return {'metric': metric_name, 'bucket_seconds': 0, 'x': [], 'y': []}
+
+    for level_number, (bucket_seconds, level_times, level_values) in enumerate(levels):
+        times, values = _window(level_times, level_values, start, end)
+        if len(times) > points:
+            continue
+        if level_number == 0: # Zoomed in as far as the finest level: the raw samples may fit as well
+            raw_series = load_raw_chart_series(workout_id, metric_name, start, end)
+            if len(raw_series) <= points:
+                return {'metric': metric_name, 'bucket_seconds': 0, 'x': raw_series.times.tolist(), 'y': raw_series.values.tolist()}
+        return {'metric': metric_name, 'bucket_seconds': bucket_seconds, 'x': times, 'y': values}
+
+    # Window longer than the coarsest level can show: merge its buckets further
+    bucket_seconds = SERIES_LEVEL_BUCKETS[-1]
+    while len(times) > points:
+        bucket_seconds *= 2
+        times, values = min_max_downsample(SampleSeries(times, values), bucket_seconds)
+    return {'metric': metric_name, 'bucket_seconds': bucket_seconds, 'x': times, 'y': values}
+
+# Whether the details page has chart points for a metric: a stored pyramid, otherwise (not
+# built yet) its positive samples, as get_series_window() would serve them
+def has_chart_points(workout_id, metric_name, workout_samples=None):
+    has_levels = db.session.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM workout_series_levels WHERE workout_id = :workout_id AND metric_name = :metric_name)"
+    ), {'workout_id': workout_id, 'metric_name': metric_name}).scalar()
+    if has_levels:
+        return True
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+    return len(workout_chart_series(workout_samples, metric_name)) > 0
+
+# Columns of the details page charts response (details_charts) and their metrics
+CHART_COLUMNS = {'pace': 'RowingSplit', 'power': 'Power', 'spm': 'Spm', 'hr': HEART_RATE_METRIC}
+
+# Returns the overview of all charted metrics in columnar form: a shared, ascending 't'
+# array and one value array per CHART_COLUMNS key (None where that metric has no point),
+# each metric limited to `points` points as in get_series_window()
+def get_chart_columns(workout_id, points=CHART_POINTS, workout_samples=None):
+    if workout_samples is None:
+        workout_samples = LazyWorkoutSampleSet(workout_id) # Loaded once, only for metrics without stored levels
+    windows = {column: get_series_window(workout_id, metric_name, points=points, workout_samples=workout_samples) for column, metric_name in CHART_COLUMNS.items()}
+    shared_times = sorted({int(t) if float(t).is_integer() else t for series_window in windows.values() for t in series_window['x']})
+    position_by_time = {t: i for i, t in enumerate(shared_times)}
+
+    chart_columns = {'t': shared_times}
+    for column, series_window in windows.items():
+        column_values = [None] * len(shared_times)
+        for t, value in zip(series_window['x'], series_window['y']):
+            column_values[position_by_time[t]] = value
+        chart_columns[column] = column_values
+    chart_columns['bucket_seconds'] = {column: series_window['bucket_seconds'] for column, series_window in windows.items()}
+    return chart_columns
+
+# --------------------------------------------------------
+# - Series Level Backfill
+#---------------------------------------------------------
+# Builds the pyramid of every workout not yet stored with the current SERIES_LEVEL_BUCKETS
+# (all workouts when only_stale is False), committing every `batch_size` workouts.
+# Returns the number of workouts processed.
+@background_job(BUILD_SERIES_LEVELS_JOB)
+def build_series_levels(only_stale=True, batch_size=50):
+    workout_rows = db.session.execute(text("""
+        SELECT w.workout_id, s.workout_id IS NULL AS missing_stats
+        FROM workouts w
+        LEFT JOIN workout_stats s ON s.workout_id = w.workout_id
+        WHERE NOT :only_stale
+            OR s.workout_id IS NULL
+            OR s.series_level_buckets IS DISTINCT FROM CAST(:buckets AS integer[])
+        ORDER BY w.workout_id
+    """), {'only_stale': only_stale, 'buckets': SERIES_LEVEL_BUCKETS}).fetchall()
+
+    for position, row in enumerate(workout_rows, start=1):
+        workout_samples = load_workout_samples(row.workout_id)
+        if row.missing_stats:
+            refresh_workout_stats(row.workout_id, workout_samples=workout_samples)
+        refresh_workout_series_levels(row.workout_id, workout_samples)
+        if position % batch_size == 0:
+            db.session.commit()
+            current_app.logger.info(f"Chart series levels built for {position}/{len(workout_rows)} workouts.")
+    db.session.commit()
+    return len(workout_rows)
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the series level backfill command with `flask`
+def register_commands(app):
+    @app.cli.command('build-series-levels')
+    @click.option('--all', 'rebuild_all', is_flag=True, help='Rebuild every workout, not only those without current levels.')
+    def build_series_levels_command(rebuild_all):
+        """Build the downsampled chart series of existing workouts."""
+        processed = build_series_levels(only_stale=not rebuild_all)
+        click.echo(f"Chart series levels built for {processed} workout(s).")
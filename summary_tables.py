@@ -0,0 +1,470 @@
+# ========================================================
+# = summary_tables.py - Incrementally maintained day/week/month/year/overall totals
+# ========================================================
+# The totals live in ordinary tables that keep the names and columns of the former
+# materialized views (mv_day_totals, ...), so the summary pages read them unchanged.
+# Statement-level triggers on workouts and equipment_types apply the delta of the
+# changed rows to exactly the affected buckets.
+import statistics
+import time
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db
+
+# --------------------------------------------------------
+# - Bucket Definitions
+#---------------------------------------------------------
+# (table, ((key column, column type, key expression on a date), ...)) for every bucketed level.
+# mv_sum_totals holds the single overall row and is handled separately.
+SUMMARY_LEVELS = [
+    ('mv_day_totals', (('day_date', 'date', "{date}"),)),
+    ('mv_week_totals', (('week_start_date', 'date', "DATE_TRUNC('week', {date})::date"),)),
+    ('mv_month_totals', (('year', 'integer', "EXTRACT(YEAR FROM {date})::integer"),
+                         ('month', 'integer', "EXTRACT(MONTH FROM {date})::integer"))),
+    ('mv_year_totals', (('year', 'integer', "EXTRACT(YEAR FROM {date})::integer"),)),
+]
+SUMMARY_TABLES = [table for table, _keys in SUMMARY_LEVELS] + ['mv_sum_totals']
+
+# Running totals stored per bucket; the displayed columns are generated from them
+SUMMARY_VALUE_COLUMNS = ['workout_count', 'total_meters_rowed', 'total_seconds_rowed', 'isoreps_count', 'isoreps_total']
+
+# A workout counts towards the totals under the same conditions the materialized views used
+_QUALIFYING_CONDITION = "{w}.total_distance_meters IS NOT NULL AND {w}.duration_seconds IS NOT NULL"
+
+# --------------------------------------------------------
+# - Table DDL
+#---------------------------------------------------------
+_SUMMARY_VALUE_COLUMNS_DDL = """
+    workout_count integer NOT NULL DEFAULT 0, -- Qualifying workouts in the bucket; the row is deleted at 0
+    total_meters_rowed numeric NOT NULL DEFAULT 0,
+    total_seconds_rowed numeric NOT NULL DEFAULT 0,
+    isoreps_count integer NOT NULL DEFAULT 0, -- Workouts with total_isoreps set (NULL sum when 0, like SUM())
+    isoreps_total numeric NOT NULL DEFAULT 0,
+    average_split_seconds_per_500m numeric GENERATED ALWAYS AS (
+        CASE
+            WHEN total_meters_rowed > 0 AND total_seconds_rowed > 0 THEN total_seconds_rowed / (total_meters_rowed / 500.0)
+            ELSE 0
+        END
+    ) STORED,
+    total_isoreps_sum numeric GENERATED ALWAYS AS (CASE WHEN isoreps_count > 0 THEN isoreps_total END) STORED"""
+
+def _get_create_summary_tables_sql():
+    statements = []
+    for table, keys in SUMMARY_LEVELS:
+        key_ddl = ''.join(f"\n    {column} {column_type} NOT NULL," for column, column_type, _expr in keys)
+        primary_key = ', '.join(column for column, _type, _expr in keys)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} ({key_ddl}{_SUMMARY_VALUE_COLUMNS_DDL},\n    PRIMARY KEY ({primary_key})\n);")
+    statements.append(f"CREATE TABLE IF NOT EXISTS mv_sum_totals (\n    id integer PRIMARY KEY CHECK (id = 1),{_SUMMARY_VALUE_COLUMNS_DDL}\n);")
+    statements.append("INSERT INTO mv_sum_totals (id) VALUES (1) ON CONFLICT (id) DO NOTHING;")
+    return statements
+
+CREATE_SUMMARY_TABLES_SQL = _get_create_summary_tables_sql()
+
+# Drops the pre-0.22 summary materialized views. Guarded by relkind so it is a no-op
+# once the same names are ordinary tables.
+DROP_SUMMARY_MVS_SQL = """
+DO $$
+DECLARE
+    view_name text;
+BEGIN
+    FOREACH view_name IN ARRAY ARRAY['mv_sum_totals', 'mv_year_totals', 'mv_month_totals', 'mv_week_totals', 'mv_day_totals'] LOOP
+        IF EXISTS (SELECT 1 FROM pg_class WHERE relname = view_name AND relkind = 'm' AND pg_table_is_visible(oid)) THEN
+            EXECUTE format('DROP MATERIALIZED VIEW %I', view_name);
+        END IF;
+    END LOOP;
+END;
+$$;
+"""
+
+# --------------------------------------------------------
+# - Delta Functions and Triggers
+#---------------------------------------------------------
+# apply_summary_deltas() takes per-day deltas as parallel arrays and upserts every level
+# set-based, in key order, then removes buckets that no longer hold any workout.
+def _get_apply_deltas_function_sql():
+    deltas = ("unnest(p_dates, p_counts, p_meters, p_seconds, p_isoreps_counts, p_isoreps) "
+              "AS d(day_date, workout_count, total_meters_rowed, total_seconds_rowed, isoreps_count, isoreps_total)")
+    value_sums = ', '.join(f"SUM(d.{column})" for column in SUMMARY_VALUE_COLUMNS)
+    value_updates = ',\n            '.join(f"{column} = t.{column} + EXCLUDED.{column}" for column in SUMMARY_VALUE_COLUMNS)
+    body = []
+    for table, keys in SUMMARY_LEVELS:
+        key_columns = ', '.join(column for column, _type, _expr in keys)
+        key_exprs = ', '.join(expr.format(date='d.day_date') for _column, _type, expr in keys)
+        key_exprs_plain = ', '.join(expr.format(date='day_date') for _column, _type, expr in keys)
+        group_positions = ', '.join(str(i + 1) for i in range(len(keys)))
+        body.append(f"""
+        INSERT INTO {table} AS t ({key_columns}, {', '.join(SUMMARY_VALUE_COLUMNS)})
+        SELECT {key_exprs}, {value_sums}
+        FROM {deltas}
+        GROUP BY {group_positions}
+        ORDER BY {group_positions}
+        ON CONFLICT ({key_columns}) DO UPDATE SET
+            {value_updates};
+        DELETE FROM {table}
+        WHERE ({key_columns}) IN (SELECT {key_exprs_plain} FROM unnest(p_dates) AS day_date)
+          AND workout_count <= 0;""")
+    sum_updates = ',\n            '.join(f"{column} = t.{column} + s.{column}" for column in SUMMARY_VALUE_COLUMNS)
+    body.append(f"""
+        UPDATE mv_sum_totals AS t SET
+            {sum_updates}
+        FROM (SELECT {', '.join(f"SUM(d.{column}) AS {column}" for column in SUMMARY_VALUE_COLUMNS)} FROM {deltas}) s
+        WHERE t.id = 1;""")
+    return f"""
+CREATE OR REPLACE FUNCTION apply_summary_deltas(
+    p_dates date[], p_counts integer[], p_meters numeric[], p_seconds numeric[], p_isoreps_counts integer[], p_isoreps numeric[]
+) RETURNS void AS $$
+BEGIN{''.join(body)}
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Aggregates signed workout rows from `source` into per-day delta arrays.
+# With `check_included`, rows of equipment types excluded from the totals are skipped.
+def _apply_deltas_from_source_sql(source, check_included=True):
+    included = " AND et.settings_include_in_totals" if check_included else ""
+    return f"""
+        SELECT
+            array_agg(d.day_date ORDER BY d.day_date), array_agg(d.workout_count ORDER BY d.day_date),
+            array_agg(d.total_meters_rowed ORDER BY d.day_date), array_agg(d.total_seconds_rowed ORDER BY d.day_date),
+            array_agg(d.isoreps_count ORDER BY d.day_date), array_agg(d.isoreps_total ORDER BY d.day_date)
+        INTO v_dates, v_counts, v_meters, v_seconds, v_isoreps_counts, v_isoreps
+        FROM (
+            SELECT
+                c.workout_date AS day_date,
+                SUM(c.sign)::integer AS workout_count,
+                SUM(c.sign * c.total_distance_meters) AS total_meters_rowed,
+                SUM(c.sign * c.duration_seconds) AS total_seconds_rowed,
+                SUM(CASE WHEN c.total_isoreps IS NOT NULL THEN c.sign ELSE 0 END)::integer AS isoreps_count,
+                COALESCE(SUM(c.sign * c.total_isoreps), 0) AS isoreps_total
+            FROM ({source}) c
+                JOIN equipment_types et ON et.equipment_type_id = c.equipment_type_id
+            WHERE {_QUALIFYING_CONDITION.format(w='c')}{included}
+            GROUP BY c.workout_date
+        ) d
+        WHERE d.workout_count <> 0 OR d.total_meters_rowed <> 0 OR d.total_seconds_rowed <> 0
+           OR d.isoreps_count <> 0 OR d.isoreps_total <> 0; -- Skip no-op updates (e.g. notes edits)"""
+
+_DELTA_VARIABLES = """
+DECLARE
+    v_dates date[];
+    v_counts integer[];
+    v_meters numeric[];
+    v_seconds numeric[];
+    v_isoreps_counts integer[];
+    v_isoreps numeric[];"""
+
+_APPLY_DELTA_ARRAYS = """
+    IF v_dates IS NOT NULL THEN
+        PERFORM apply_summary_deltas(v_dates, v_counts, v_meters, v_seconds, v_isoreps_counts, v_isoreps);
+    END IF;
+    RETURN NULL; -- Result is ignored since this is an AFTER trigger"""
+
+def _get_workout_deltas_function_sql():
+    columns = "workout_date, equipment_type_id, total_distance_meters, duration_seconds, total_isoreps"
+    new_rows = f"SELECT {columns}, 1 AS sign FROM summary_new_rows"
+    old_rows = f"SELECT {columns}, -1 AS sign FROM summary_old_rows"
+    return f"""
+CREATE OR REPLACE FUNCTION apply_workout_summary_deltas()
+RETURNS TRIGGER AS $${_DELTA_VARIABLES}
+BEGIN
+    IF TG_OP = 'INSERT' THEN{_apply_deltas_from_source_sql(new_rows)}
+    ELSIF TG_OP = 'DELETE' THEN{_apply_deltas_from_source_sql(old_rows)}
+    ELSE{_apply_deltas_from_source_sql(f"{old_rows} UNION ALL {new_rows}")}
+    END IF;{_APPLY_DELTA_ARRAYS}
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Flipping settings_include_in_totals adds or removes all workouts of that equipment type
+# (the sign already encodes inclusion, so the inclusion filter is not applied)
+def _get_equipment_deltas_function_sql():
+    source = """
+                SELECT w.workout_date, w.equipment_type_id, w.total_distance_meters, w.duration_seconds, w.total_isoreps,
+                       CASE WHEN n.settings_include_in_totals THEN 1 ELSE -1 END AS sign
+                FROM summary_new_rows n
+                    JOIN summary_old_rows o ON o.equipment_type_id = n.equipment_type_id
+                    JOIN workouts w ON w.equipment_type_id = n.equipment_type_id
+                WHERE n.settings_include_in_totals IS DISTINCT FROM o.settings_include_in_totals"""
+    return f"""
+CREATE OR REPLACE FUNCTION apply_equipment_summary_deltas()
+RETURNS TRIGGER AS $${_DELTA_VARIABLES}
+BEGIN{_apply_deltas_from_source_sql(source, check_included=False)}{_APPLY_DELTA_ARRAYS}
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_SUMMARY_FUNCTIONS_SQL = [
+    _get_apply_deltas_function_sql(),
+    _get_workout_deltas_function_sql(),
+    _get_equipment_deltas_function_sql()
+]
+
+DROP_SUMMARY_FUNCTIONS_SQL = """
+DROP FUNCTION IF EXISTS apply_workout_summary_deltas() CASCADE;
+DROP FUNCTION IF EXISTS apply_equipment_summary_deltas() CASCADE;
+DROP FUNCTION IF EXISTS apply_summary_deltas(date[], integer[], numeric[], numeric[], integer[], numeric[]);
+"""
+
+# Transition tables are only allowed on single-event triggers, hence one trigger per operation
+drop_summary_triggers_sql = [
+    "DROP TRIGGER IF EXISTS trg_summary_deltas_on_workout_insert ON workouts;",
+    "DROP TRIGGER IF EXISTS trg_summary_deltas_on_workout_update ON workouts;",
+    "DROP TRIGGER IF EXISTS trg_summary_deltas_on_workout_delete ON workouts;",
+    "DROP TRIGGER IF EXISTS trg_summary_deltas_on_equipment_update ON equipment_types;"
+]
+
+create_summary_triggers_sql = [
+    """
+    CREATE TRIGGER trg_summary_deltas_on_workout_insert
+    AFTER INSERT ON workouts
+    REFERENCING NEW TABLE AS summary_new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_workout_summary_deltas();
+    """,
+    """
+    CREATE TRIGGER trg_summary_deltas_on_workout_update
+    AFTER UPDATE ON workouts
+    REFERENCING OLD TABLE AS summary_old_rows NEW TABLE AS summary_new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_workout_summary_deltas();
+    """,
+    """
+    CREATE TRIGGER trg_summary_deltas_on_workout_delete
+    AFTER DELETE ON workouts
+    REFERENCING OLD TABLE AS summary_old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_workout_summary_deltas();
+    """,
+    """
+    CREATE TRIGGER trg_summary_deltas_on_equipment_update
+    AFTER UPDATE ON equipment_types
+    REFERENCING OLD TABLE AS summary_old_rows NEW TABLE AS summary_new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_equipment_summary_deltas();
+    """
+]
+
+# --------------------------------------------------------
+# - Full Rebuild and Consistency Check SQL
+#---------------------------------------------------------
+_EXPECTED_VALUES_SQL = """
+    COUNT(*) AS workout_count,
+    COALESCE(SUM(w.total_distance_meters), 0) AS total_meters_rowed,
+    COALESCE(SUM(w.duration_seconds), 0) AS total_seconds_rowed,
+    COUNT(w.total_isoreps) AS isoreps_count,
+    COALESCE(SUM(w.total_isoreps), 0) AS isoreps_total"""
+
+_QUALIFYING_WORKOUTS_SQL = f"""
+    FROM workouts w
+        JOIN equipment_types et ON w.equipment_type_id = et.equipment_type_id
+    WHERE {_QUALIFYING_CONDITION.format(w='w')} AND et.settings_include_in_totals = TRUE"""
+
+def _expected_level_sql(keys):
+    key_selects = ', '.join(f"{expr.format(date='w.workout_date')} AS {column}" for column, _type, expr in keys)
+    group_positions = ', '.join(str(i + 1) for i in range(len(keys)))
+    return f"SELECT {key_selects},{_EXPECTED_VALUES_SQL}{_QUALIFYING_WORKOUTS_SQL}\n    GROUP BY {group_positions}"
+
+# -- Single-Pass Aggregation -------------------
+# All levels are computed from one scan of workouts with GROUPING SETS. GROUPING()
+# yields a bit mask of the key columns a row is NOT grouped by, which tells the levels apart.
+_GROUPING_COLUMNS = list(dict.fromkeys(column for _table, keys in SUMMARY_LEVELS for column, _type, _expr in keys))
+_GROUPING_EXPRS = {column: expr for _table, keys in SUMMARY_LEVELS for column, _type, expr in keys}
+
+def _grouping_mask(key_columns):
+    mask = 0
+    for column in _GROUPING_COLUMNS:
+        mask = (mask << 1) | (0 if column in key_columns else 1)
+    return mask
+
+OVERALL_GROUPING_MASK = _grouping_mask(())
+
+def _get_grouped_totals_cte():
+    bucket_columns = ',\n            '.join(f"{_GROUPING_EXPRS[column].format(date='w.workout_date')} AS {column}" for column in _GROUPING_COLUMNS)
+    grouping_sets = ', '.join(f"({', '.join(column for column, _type, _expr in keys)})" for _table, keys in SUMMARY_LEVELS) + ', ()'
+    return f"""
+    WITH qualifying AS (
+        SELECT
+            {bucket_columns},
+            w.total_distance_meters, w.duration_seconds, w.total_isoreps{_QUALIFYING_WORKOUTS_SQL}
+    ),
+    grouped AS (
+        SELECT
+            GROUPING({', '.join(_GROUPING_COLUMNS)}) AS grouping_mask,
+            {', '.join(_GROUPING_COLUMNS)},
+            COUNT(*) AS workout_count,
+            COALESCE(SUM(total_distance_meters), 0) AS total_meters_rowed,
+            COALESCE(SUM(duration_seconds), 0) AS total_seconds_rowed,
+            COUNT(total_isoreps) AS isoreps_count,
+            COALESCE(SUM(total_isoreps), 0) AS isoreps_total
+        FROM qualifying
+        GROUP BY GROUPING SETS ({grouping_sets})
+    )"""
+
+def _get_rebuild_summary_tables_sql():
+    # SHARE locks block writers for the duration, so no delta is applied twice or lost.
+    # DELETE rather than TRUNCATE keeps the pages reading the old totals meanwhile.
+    statements = ["LOCK TABLE workouts, equipment_types IN SHARE MODE;"]
+    statements += [f"DELETE FROM {table};" for table, _keys in SUMMARY_LEVELS]
+    # One statement: `grouped` is referenced by every INSERT, so it is materialized once
+    inserts = []
+    for table, keys in SUMMARY_LEVELS:
+        key_columns = ', '.join(column for column, _type, _expr in keys)
+        insert_columns = f"{key_columns}, {', '.join(SUMMARY_VALUE_COLUMNS)}"
+        inserts.append(f"""
+    insert_{table} AS (
+        INSERT INTO {table} ({insert_columns})
+        SELECT {insert_columns} FROM grouped WHERE grouping_mask = {_grouping_mask(key_columns.split(', '))}
+    )""")
+    statements.append(f"""{_get_grouped_totals_cte()},{','.join(inserts)}
+    UPDATE mv_sum_totals AS t SET {', '.join(f"{column} = s.{column}" for column in SUMMARY_VALUE_COLUMNS)}
+    FROM grouped s
+    WHERE s.grouping_mask = {OVERALL_GROUPING_MASK} AND t.id = 1;""")
+    return statements
+
+REBUILD_SUMMARY_TABLES_SQL = _get_rebuild_summary_tables_sql()
+
+# One statement per level, each scanning workouts on its own. This is how the tables were
+# rebuilt before the single-pass version; kept as the baseline for `flask benchmark-summaries`.
+def _get_rebuild_per_level_sql():
+    statements = [f"DELETE FROM {table};" for table, _keys in SUMMARY_LEVELS]
+    for table, keys in SUMMARY_LEVELS:
+        key_columns = ', '.join(column for column, _type, _expr in keys)
+        statements.append(f"INSERT INTO {table} ({key_columns}, {', '.join(SUMMARY_VALUE_COLUMNS)})\n{_expected_level_sql(keys)};")
+    statements.append(f"""
+    UPDATE mv_sum_totals AS t SET {', '.join(f"{column} = s.{column}" for column in SUMMARY_VALUE_COLUMNS)}
+    FROM (SELECT{_EXPECTED_VALUES_SQL}{_QUALIFYING_WORKOUTS_SQL}) s
+    WHERE t.id = 1;""")
+    return statements
+
+# Returns the buckets whose stored values differ from a fresh aggregation (missing or extra
+# rows included), for all levels from the same single-pass aggregation
+def _get_check_summary_tables_sql():
+    comparisons = []
+    for table, keys in SUMMARY_LEVELS + [('mv_sum_totals', ())]:
+        key_columns = [column for column, _type, _expr in keys]
+        if key_columns:
+            join = f"FULL OUTER JOIN {table} t ON {' AND '.join(f't.{column} = e.{column}' for column in key_columns)}"
+            key_display = " || '-' || ".join(f"COALESCE(e.{column}, t.{column})::text" for column in key_columns)
+        else:
+            join = f"LEFT JOIN {table} t ON t.id = 1" # The grand total row always exists
+            key_display = "'overall'"
+        differs = ' OR '.join(f"e.{column} IS DISTINCT FROM t.{column}" for column in SUMMARY_VALUE_COLUMNS)
+        comparisons.append(f"""
+    SELECT '{table}' AS table_name, {key_display} AS bucket,
+           e.workout_count AS expected_count, t.workout_count AS stored_count,
+           e.total_meters_rowed AS expected_meters, t.total_meters_rowed AS stored_meters
+    FROM (SELECT * FROM grouped WHERE grouping_mask = {_grouping_mask(key_columns)}) e
+        {join}
+    WHERE {differs}""")
+    return f"{_get_grouped_totals_cte()}{(chr(10) + '    UNION ALL').join(comparisons)}\n    ORDER BY 1, 2"
+
+# --------------------------------------------------------
+# - Rebuild and Check Functions
+#---------------------------------------------------------
+# Recomputes every summary table from workouts in one transaction
+def rebuild_summary_tables(connection):
+    for stmt in REBUILD_SUMMARY_TABLES_SQL:
+        connection.execute(text(stmt))
+
+# Compares the summary tables against a fresh aggregation of workouts.
+# Returns {table: [mismatching rows]}; an empty dict means the tables are consistent.
+def check_summary_tables(connection):
+    mismatches = {}
+    for row in connection.execute(text(_get_check_summary_tables_sql())).fetchall():
+        mismatches.setdefault(row.table_name, []).append(row)
+    return mismatches
+
+# --------------------------------------------------------
+# - Rebuild Benchmark
+#---------------------------------------------------------
+# Synthetic data in temporary tables that shadow workouts / equipment_types / the summary
+# tables for the session (pg_temp is searched first). The caller rolls the transaction back.
+_BENCHMARK_SETUP_SQL = [
+    "CREATE TEMP TABLE equipment_types (equipment_type_id integer PRIMARY KEY, settings_include_in_totals boolean NOT NULL);",
+    "INSERT INTO equipment_types VALUES (1, TRUE), (2, FALSE);",
+    """CREATE TEMP TABLE workouts (
+        workout_id serial PRIMARY KEY,
+        equipment_type_id integer,
+        workout_date date NOT NULL,
+        duration_seconds numeric,
+        total_distance_meters numeric,
+        total_isoreps numeric
+    );""",
+    """INSERT INTO workouts (equipment_type_id, workout_date, duration_seconds, total_distance_meters, total_isoreps)
+    SELECT
+        CASE WHEN random() < 0.9 THEN 1 ELSE 2 END,
+        day::date,
+        round((600 + random() * 3000)::numeric, 1),
+        round((2000 + random() * 10000)::numeric),
+        CASE WHEN random() < 0.2 THEN round((random() * 500)::numeric) END
+    FROM generate_series(current_date - make_interval(years => :years), current_date, interval '1 day') AS day,
+        generate_series(1, :workouts_per_day);"""
+] + [stmt.replace("CREATE TABLE IF NOT EXISTS", "CREATE TEMP TABLE") for stmt in CREATE_SUMMARY_TABLES_SQL] + [
+    "ANALYZE workouts;", # Autovacuum never analyzes temporary tables
+    "ANALYZE equipment_types;"
+]
+
+# Times the per-level and the single-pass rebuild on synthetic data.
+# Returns (workout count, {variant: [seconds per run]}, consistent after single-pass rebuild).
+def benchmark_summary_rebuild(connection, years, workouts_per_day, repeat):
+    for stmt in _BENCHMARK_SETUP_SQL:
+        connection.execute(text(stmt), {'years': years, 'workouts_per_day': workouts_per_day})
+    workout_count = connection.execute(text("SELECT COUNT(*) FROM workouts")).scalar()
+
+    variants = {'per-level (5 scans)': _get_rebuild_per_level_sql(), 'single-pass (GROUPING SETS)': REBUILD_SUMMARY_TABLES_SQL}
+    timings = {name: [] for name in variants}
+    for _run in range(repeat):
+        for name, statements in variants.items(): # Interleaved so caching favours neither variant
+            started = time.perf_counter()
+            for stmt in statements:
+                connection.execute(text(stmt))
+            timings[name].append(time.perf_counter() - started)
+    consistent = not check_summary_tables(connection) # Last run was the single-pass rebuild
+    return workout_count, timings, consistent
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers `flask rebuild-summaries`, `flask check-summaries` and `flask benchmark-summaries`
+def register_commands(app):
+    @app.cli.command('rebuild-summaries')
+    def rebuild_summaries_command():
+        """Rebuild the day/week/month/year/overall totals from workouts."""
+        with db.engine.connect() as connection:
+            with connection.begin():
+                rebuild_summary_tables(connection)
+        current_app.logger.info("Summary tables rebuilt.")
+        click.echo("Summary tables rebuilt.")
+
+    @app.cli.command('check-summaries')
+    def check_summaries_command():
+        """Compare the summary tables against the workouts table."""
+        with db.engine.connect() as connection:
+            mismatches = check_summary_tables(connection)
+        if not mismatches:
+            click.echo("Summary tables are consistent with workouts.")
+            return
+        for table, rows in mismatches.items():
+            click.echo(f"{table}: {len(rows)} mismatching bucket(s)")
+            for row in rows[:20]:
+                click.echo(f"  {row.bucket}: count {row.stored_count} (expected {row.expected_count}), "
+                           f"meters {row.stored_meters} (expected {row.expected_meters})")
+        raise SystemExit(1) # Non-zero exit for scripts / cron
+
+    @app.cli.command('benchmark-summaries')
+    @click.option('--years', default=10, show_default=True, help='Years of synthetic workouts.')
+    @click.option('--workouts-per-day', default=2, show_default=True, help='Synthetic workouts per day.')
+    @click.option('--repeat', default=3, show_default=True, help='Timed runs per rebuild variant.')
+    def benchmark_summaries_command(years, workouts_per_day, repeat):
+        """Time the summary table rebuild on synthetic data (nothing is saved)."""
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            try:
+                workout_count, timings, consistent = benchmark_summary_rebuild(connection, years, workouts_per_day, max(1, repeat))
+            finally:
+                transaction.rollback() # Temporary tables and data are discarded
+        click.echo(f"{workout_count:,} synthetic workouts over {years} years")
+        for name, runs in timings.items():
+            click.echo(f"  {name}: median {statistics.median(runs) * 1000:.1f} ms, best {min(runs) * 1000:.1f} ms ({len(runs)} runs)")
+        click.echo(f"  single-pass result consistent: {'yes' if consistent else 'NO'}")
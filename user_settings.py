@@ -0,0 +1,132 @@
+# ========================================================
+# = user_settings.py - Cached, versioned access to the user_settings table
+# ========================================================
+import threading
+from types import MappingProxyType
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db, UserSetting
+from database_setup import DEFAULT_USER_SETTINGS
+from cache_listener import invalidation_handler, is_listening
+
+# Channel notified (on commit) by save_settings(); payload: the new settings version
+SETTINGS_CHANNEL = 'rowergdiary_settings'
+
+# UserSetting key of the settings version, bumped by every save_settings()
+SETTINGS_VERSION_KEY = 'settings_version'
+
+# Session.info key marking a transaction that saved settings
+SETTINGS_SAVED_KEY = 'user_settings_saved'
+
+# --------------------------------------------------------
+# - Settings Snapshot
+#---------------------------------------------------------
+# Immutable view of all user_settings rows as loaded at one settings version.
+# Accessors fall back to DEFAULT_USER_SETTINGS (then to their `default`) for missing keys.
+class SettingsSnapshot:
+    __slots__ = ('version', 'values')
+
+    def __init__(self, version, values):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'values', MappingProxyType(dict(values)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot is immutable.")
+
+    def get(self, key, default=None):
+        value = self.values.get(key)
+        if value is None:
+            return DEFAULT_USER_SETTINGS.get(key, default)
+        return value
+
+    # Integer setting; the default for missing, non-numeric and (when positive) non-positive values
+    def get_int(self, key, default=None, positive=False):
+        value = self.get(key)
+        if value is None or not value.isdigit() or (positive and int(value) <= 0):
+            fallback = DEFAULT_USER_SETTINGS.get(key, default)
+            return int(fallback) if fallback is not None else None
+        return int(value)
+
+    # Items per page of a list view (key e.g. 'per_page_workouts')
+    def per_page(self, key):
+        return self.get_int(key, positive=True)
+
+    # Returns {zone key: lower bound bpm} for the configured zones
+    def hr_zones(self):
+        return {key: int(value) for key, value in self.values.items() if key.startswith('HR_') and value and value.isdigit()}
+
+# --------------------------------------------------------
+# - Settings Cache
+#---------------------------------------------------------
+# Process-wide snapshot, loaded on first use after an invalidation. Saving settings bumps
+# the version and notifies SETTINGS_CHANNEL, which drops the snapshot in every process
+# (cache_listener.CacheInvalidationListener); the saving process drops it on commit.
+class UserSettingsCache:
+    def __init__(self):
+        self._snapshot = None # Not loaded yet
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    # Keeps a snapshot already loaded at `version` (the saving process reloads on commit)
+    def invalidate_unless_version(self, version):
+        with self._lock:
+            if self._snapshot is not None and str(self._snapshot.version) != version:
+                self._snapshot = None
+
+    # Loads the committed settings on a connection of its own, outside the session transaction.
+    # Without a running cache listener every call loads them afresh.
+    def snapshot(self):
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            with db.engine.connect() as connection:
+                values = {row.key: row.value for row in connection.execute(text("SELECT key, value FROM user_settings")).fetchall()}
+            version = values.get(SETTINGS_VERSION_KEY)
+            snapshot = SettingsSnapshot(int(version) if version and version.isdigit() else 0, values)
+            if is_listening():
+                self._snapshot = snapshot
+            return snapshot
+
+user_settings = UserSettingsCache() # The process-wide cache
+
+# The current settings snapshot; no query unless settings changed since the last page view
+def get_settings():
+    return user_settings.snapshot()
+
+# Saves {key: value} in the current session transaction and bumps the settings version.
+# Other processes reload their snapshot once the transaction commits; values read through
+# get_settings() before that are the committed ones.
+def save_settings(values):
+    for key, value in values.items():
+        setting_obj = UserSetting.query.filter_by(key=key).first()
+        if not setting_obj:
+            setting_obj = UserSetting(key=key)
+            db.session.add(setting_obj)
+        setting_obj.value = value
+    version = db.session.execute(text("""
+        INSERT INTO user_settings (key, value) VALUES (:key, '1')
+        ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(user_settings.value AS integer) + 1 AS text)
+        RETURNING value
+    """), {'key': SETTINGS_VERSION_KEY}).scalar()
+    db.session.execute(text("SELECT pg_notify(:channel, :version)"), {'channel': SETTINGS_CHANNEL, 'version': version})
+    db.session.info[SETTINGS_SAVED_KEY] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_saved_settings(session):
+    if session.info.pop(SETTINGS_SAVED_KEY, False):
+        user_settings.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_saved_settings(session, previous_transaction):
+    session.info.pop(SETTINGS_SAVED_KEY, None)
+
+# Settings saved by any process; a snapshot already at that version is kept
+@invalidation_handler(SETTINGS_CHANNEL)
+def _invalidate_settings(payload):
+    if payload is None:
+        user_settings.invalidate()
+    else:
+        user_settings.invalidate_unless_version(payload)
@@ -1,8 +1,14 @@
 # ========================================================
 # = utils.py - Utility functions and context processors
 # ========================================================
-from flask import current_app
+import gzip
+import hashlib
+import json
+from flask import current_app, request
 from models import db
+from mv_refresh import get_refresh_times
+from data_versions import data_versions
+from response_cache import skip_response_cache
 from sqlalchemy import text
 from decimal import Decimal
 from markupsafe import Markup # Import Markup for custom filters
@@ -120,6 +126,12 @@ def format_seconds_to_hms(total_seconds_input): # Renamed from format_duration_h
 # --------------------------------------------------------
 # - Custom Jinja2 Filters
 #---------------------------------------------------------
+# Formats a refresh timestamp ("data as of") in server local time
+def format_data_as_of(refreshed_at):
+    if refreshed_at is None: # Views not refreshed yet
+        return "pending"
+    return refreshed_at.astimezone().strftime('%Y-%m-%d %H:%M:%S')
+
 # Converts newline characters in a string to HTML <br> tags.
 def nl2br_filter(value):
     if value is None:
@@ -129,29 +141,52 @@ def nl2br_filter(value):
 # --------------------------------------------------------
 # - Context Processors
 #---------------------------------------------------------
+# Data versions the sidebar statistics depend on (see data_versions.py)
+SIDEBAR_DATA_VERSIONS = ('workouts', 'mv_refresh')
+
+# Sidebar statistics of the current data version stamp: {stamp: stats}, at most one entry
+_sidebar_stats_cache = {}
+
 # Fetches overall rowing statistics for the sidebar
-def sidebar_stats_processor():
-    stats = {}
-    try:
-        with db.engine.connect() as connection:
-            # Query materialized view for summed totals
-            overall_totals_result = connection.execute(text("SELECT * FROM mv_sum_totals LIMIT 1")).fetchone()
-            if overall_totals_result:
-                stats['overall_totals'] = {
-                    'meters': float(overall_totals_result.total_meters_rowed) if overall_totals_result.total_meters_rowed is not None else 0,
-                    'seconds': float(overall_totals_result.total_seconds_rowed) if overall_totals_result.total_seconds_rowed is not None else 0,
-                    'split': float(overall_totals_result.average_split_seconds_per_500m) if overall_totals_result.average_split_seconds_per_500m is not None else 0,
-                    'isoreps': int(overall_totals_result.total_isoreps_sum) if overall_totals_result.total_isoreps_sum is not None else 0
-                }
-            else: # Handle empty materialized view
-                stats['overall_totals'] = {'meters': 0, 'seconds': 0, 'split': 0, 'isoreps': 0}
+def load_sidebar_stats():
+    with db.engine.connect() as connection:
+        stats = {}
+        # Query the overall totals row (kept current by the summary table triggers)
+        overall_totals_result = connection.execute(text("SELECT * FROM mv_sum_totals LIMIT 1")).fetchone()
+        if overall_totals_result:
+            stats['overall_totals'] = {
+                'meters': float(overall_totals_result.total_meters_rowed) if overall_totals_result.total_meters_rowed is not None else 0,
+                'seconds': float(overall_totals_result.total_seconds_rowed) if overall_totals_result.total_seconds_rowed is not None else 0,
+                'split': float(overall_totals_result.average_split_seconds_per_500m) if overall_totals_result.average_split_seconds_per_500m is not None else 0,
+                'isoreps': int(overall_totals_result.total_isoreps_sum) if overall_totals_result.total_isoreps_sum is not None else 0
+            }
+        else: # Handle missing totals row
+            stats['overall_totals'] = {'meters': 0, 'seconds': 0, 'split': 0, 'isoreps': 0}
 
+        # Completion time of the last ranking refresh, shown as "rankings as of" (refreshed in the background)
+        stats['rankings_as_of'] = get_refresh_times(connection).get('rankings')
+    return stats
 
+# Makes the sidebar statistics available to every template. They are loaded once per data
+# version stamp and process, so most pages render them without a query or connection.
+def sidebar_stats_processor():
+    try:
+        # The stamp is taken before loading: data changed meanwhile is cached under the old
+        # stamp and reloaded once its notification advances the stamp
+        stamp = data_versions.stamp(*SIDEBAR_DATA_VERSIONS)
+        stats = _sidebar_stats_cache.get(stamp) if stamp is not None else None
+        if stats is None:
+            stats = load_sidebar_stats()
+            if stamp is not None:
+                _sidebar_stats_cache.clear()
+                _sidebar_stats_cache[stamp] = stats
     except Exception as e: # Catch potential database errors
         current_app.logger.error(f"Error fetching sidebar stats: {e}", exc_info=True)
+        skip_response_cache() # Keep the placeholder totals out of the page cache
         # Provide default stats on error
         stats = {
             'overall_totals': {'meters': 0, 'seconds': 0, 'split': 0, 'isoreps': 0},
+            'rankings_as_of': None
         }
     
     return dict(sidebar_stats=stats) # Make stats available to templates
@@ -160,13 +195,116 @@ def sidebar_stats_processor():
 def utility_processor():
     return dict(now=datetime.datetime.now)
 
+# --------------------------------------------------------
+# - JSON Responses
+#---------------------------------------------------------
+GZIP_MIN_BYTES = 1024 # Smaller bodies are sent uncompressed
+
+# JSON response for data endpoints: a weak ETag over the compact JSON body answers
+# unchanged repeat requests with 304, and bodies are gzipped for clients that accept it.
+# The ETag is weak because the gzipped and plain bodies are the same representation.
+def conditional_json_response(payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'no-cache' # Cache, but revalidate with the ETag
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if response.status_code == 200 and len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# --------------------------------------------------------
+# - Keyset Pagination
+#---------------------------------------------------------
+# List pages are read by key (e.g. (workout_date, workout_id)) instead of OFFSET: the page
+# links carry the key of the first or last row shown ('before' / 'after' cursors), so
+# every page is an index range scan of one page, however deep it is.
+
+# Encodes a row key (tuple of dates and numbers) as a URL cursor, e.g. '2024-05-01_123'.
+# A NULL key value is an empty part, e.g. '_123'.
+def encode_cursor(key):
+    return '_'.join('' if value is None else value.isoformat() if isinstance(value, datetime.date) else str(value) for value in key)
+
+# Decodes a cursor into a key of the given types (datetime.date, int or Decimal); None when
+# missing or malformed. With `nullable_sort_key` the first key value may be NULL (None).
+def decode_cursor(cursor, key_types, nullable_sort_key=False):
+    if not cursor:
+        return None
+    parts = cursor.split('_')
+    if len(parts) != len(key_types):
+        return None
+    if nullable_sort_key and parts[0] == '':
+        rest = decode_cursor('_'.join(parts[1:]), key_types[1:])
+        return (None,) + rest if rest is not None else None
+    try:
+        key = tuple(datetime.date.fromisoformat(part) if key_type is datetime.date else key_type(part) for part, key_type in zip(parts, key_types))
+    except (ValueError, ArithmeticError): # ArithmeticError: decimal.InvalidOperation
+        return None
+    if any(isinstance(value, Decimal) and not value.is_finite() for value in key):
+        return None
+    return key
+
+# Returns how to read page `page` of a list in descending key order from the request's
+# cursor arguments, as (direction, cursor, offset, limit):
+# 'desc': rows with keys below `cursor` (all rows when None) in descending order,
+# 'asc': rows with keys above `cursor` in ascending order (to be reversed for display).
+# Only the first and last pages and cursor links are constant-time; a page number without
+# a cursor (typed URL) falls back to OFFSET.
+def keyset_window(page, per_page, total_count, key_types, args, nullable_sort_key=False):
+    pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
+    skip = max(args.get('skip', 0, type=int) or 0, 0) # Further pages from the cursor (nearby page links)
+    after = decode_cursor(args.get('after'), key_types, nullable_sort_key)
+    if after is not None:
+        return 'desc', after, skip, per_page
+    before = decode_cursor(args.get('before'), key_types, nullable_sort_key)
+    if before is not None:
+        return 'asc', before, skip, per_page
+    if page > 1 and page == pages: # Last page: the oldest rows, read from the other end of the index
+        return 'asc', None, 0, total_count - (pages - 1) * per_page
+    return 'desc', None, max(page - 1, 0) * per_page, per_page
+
+# WHERE and ORDER BY clauses (and parameters) of a keyset_window() for raw SQL
+def keyset_clauses(key_columns, direction, cursor):
+    order_by = ', '.join(f"{column} {direction.upper()}" for column in key_columns)
+    if cursor is None:
+        return 'TRUE', order_by, {}
+    params = {f"cursor_{i}": value for i, value in enumerate(cursor)}
+    comparison = '<' if direction == 'desc' else '>'
+    where = f"({', '.join(key_columns)}) {comparison} ({', '.join(':' + name for name in params)})" # Row comparison: one index range
+    return where, order_by, params
+
+# Row counts of the list pages, cached per process until the data version changes:
+# {(name, params): (data version stamp, count)}
+_count_cache = {}
+COUNT_CACHE_MAX_ENTRIES = 256 # Filtered lists add one entry per filter combination; the oldest is dropped
+
+# Returns the result of a COUNT query (SQL text or a statement), only running it again once
+# `data_version_names` changed (see data_versions.py)
+def cached_count(name, count_query, params=None, data_version_names=('workouts',)):
+    stamp = data_versions.stamp(*data_version_names)
+    cache_key = (name, tuple(sorted((params or {}).items())))
+    cached = _count_cache.get(cache_key)
+    if stamp is not None and cached is not None and cached[0] == stamp:
+        return cached[1]
+    count = db.session.execute(text(count_query) if isinstance(count_query, str) else count_query, params or {}).scalar()
+    if stamp is not None:
+        _count_cache.pop(cache_key, None)
+        while len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.pop(next(iter(_count_cache)))
+        _count_cache[cache_key] = (stamp, count)
+    return count
+
 # --------------------------------------------------------
 # - Custom Pagination Class
 #---------------------------------------------------------
 # Provides pagination logic for views not using Flask-SQLAlchemy's paginate().
+# With `keys` (the keys of `items`, in display order) the page links use keyset cursors;
+# `url_args` (e.g. the list's sort and filters) are kept on every page link.
 class CustomPagination:
     # -- Initialization Method -------------------
-    def __init__(self, page, per_page, total_count, items):
+    def __init__(self, page, per_page, total_count, items, keys=None, url_args=None):
         self.page = page # Current page number
         self.per_page = per_page # Items per page
         self.total = total_count # Total number of items
@@ -176,6 +314,24 @@ class CustomPagination:
         self.prev_num = self.page - 1 if self.has_prev else None # Previous page number
         self.next_num = self.page + 1 if self.has_next else None # Next page number
         self.items = items # The actual items for the current page
+        self.first_cursor = encode_cursor(keys[0]) if keys else None # Cursor of the first row shown
+        self.last_cursor = encode_cursor(keys[-1]) if keys else None # Cursor of the last row shown
+        self.url_args = dict(url_args or {})
+
+    # -- Page Link Arguments -------------------
+    # URL arguments (besides the page number) that read page `num` by cursor from this page.
+    # The first and last pages need none (see keyset_window()).
+    def page_args(self, num):
+        page_args = dict(self.url_args)
+        if num <= 1 or num >= self.pages or num == self.page or self.first_cursor is None:
+            return page_args
+        if num > self.page:
+            page_args['after'] = self.last_cursor
+        else:
+            page_args['before'] = self.first_cursor
+        if abs(num - self.page) > 1:
+            page_args['skip'] = (abs(num - self.page) - 1) * self.per_page
+        return page_args
 
     # -- Page Iterator Method -------------------
     # Generates page numbers for pagination links, including ellipses.
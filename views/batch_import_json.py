@@ -0,0 +1,199 @@
+# ========================================================
+# = batch_import_json.py - View for importing many MyWellness JSON files at once
+# ========================================================
+import json
+import zipfile
+from flask import request, redirect, url_for, flash, current_app, render_template, jsonify
+from models import db, Workout
+from mv_refresh import bulk_mode
+from ingest import IngestTimer, WorkoutImportError, import_mywellness_workout, backup_workout_json, get_json_import_equipment_type
+
+# --------------------------------------------------------
+# - Uploaded Document Collection
+#---------------------------------------------------------
+# Expands the uploaded files (plain JSON files and/or zip archives) into a flat
+# list of report entries, each carrying the raw JSON text to import.
+def _collect_uploaded_documents(uploaded_files, max_member_bytes):
+    documents = []
+    for file_storage in uploaded_files:
+        filename = file_storage.filename or 'upload'
+        if not filename.strip():
+            continue # Empty file input
+
+        if filename.lower().endswith('.zip'):
+            # -- Zip Archive: one document per .json member -------------------
+            try:
+                with zipfile.ZipFile(file_storage.stream) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir() or not member.filename.lower().endswith('.json') or member.filename.startswith('__MACOSX/'):
+                            continue
+                        source_name = f"{filename}/{member.filename}"
+                        if member.file_size > max_member_bytes: # Guard against oversized members
+                            documents.append(_new_report_entry(source_name, error='File is too large.'))
+                            continue
+                        documents.append(_new_report_entry(source_name, raw_json=archive.read(member)))
+            except zipfile.BadZipFile:
+                documents.append(_new_report_entry(filename, error='Invalid zip archive.'))
+        else:
+            # -- Single JSON File -------------------
+            documents.append(_new_report_entry(filename, raw_json=file_storage.read()))
+    return documents
+
+# Creates a per-file entry for the import report
+def _new_report_entry(source_name, raw_json=None, error=None):
+    entry = {
+        'source': source_name, # File name (archive/member for zip contents)
+        'status': 'error' if error else 'pending', # pending -> imported / duplicate / error
+        'cardio_log_id': None,
+        'workout_id': None,
+        'message': error,
+        'raw_json': None, # Decoded JSON text, dropped from the report once processed
+        'json_data': None # Parsed document
+    }
+    if raw_json is not None:
+        try:
+            entry['raw_json'] = raw_json.decode('utf-8-sig') # Tolerate a UTF-8 BOM
+        except UnicodeDecodeError:
+            entry['status'] = 'error'
+            entry['message'] = 'File is not valid UTF-8 text.'
+    return entry
+
+# --------------------------------------------------------
+# - Chunked Import
+#---------------------------------------------------------
+# Imports the deduplicated entries, committing every `chunk_size` workouts.
+# Updates each entry's status, workout_id and message in place.
+def _import_pending_entries(pending_entries, ingest_timer, chunk_size):
+    try:
+        equipment_type = get_json_import_equipment_type() # Resolved once for the whole batch
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Batch import could not resolve equipment type: {e}", exc_info=True)
+        for entry in pending_entries:
+            entry['status'] = 'error'
+            entry['message'] = 'Could not prepare the import.'
+        pending_entries = []
+
+    for chunk_start in range(0, len(pending_entries), chunk_size):
+        chunk = pending_entries[chunk_start:chunk_start + chunk_size]
+        imported_in_chunk = []
+        for entry in chunk:
+            try:
+                # A savepoint per file keeps one bad document from discarding the rest of the chunk
+                with db.session.begin_nested():
+                    new_workout = import_mywellness_workout(entry['json_data'], ingest_timer=ingest_timer, equipment_type=equipment_type, check_existing=False)
+                imported_in_chunk.append((entry, new_workout))
+            except WorkoutImportError as e:
+                entry['status'] = 'error'
+                entry['message'] = str(e)
+            except Exception as e:
+                current_app.logger.error(f"Error importing {entry['source']}: {e}", exc_info=True)
+                entry['status'] = 'error'
+                entry['message'] = f'Error importing workout: {str(e)}'
+
+        try:
+            with ingest_timer.phase('commit'):
+                db.session.commit() # One transaction per chunk
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Batch import chunk commit failed: {e}", exc_info=True)
+            for entry, _workout in imported_in_chunk:
+                entry['status'] = 'error'
+                entry['message'] = f'Chunk could not be saved: {str(e)}'
+            continue
+
+        # -- Record Results and Back Up Committed Documents -------------------
+        for entry, new_workout in imported_in_chunk:
+            entry['status'] = 'imported'
+            entry['workout_id'] = new_workout.workout_id
+            backup_error = backup_workout_json(new_workout, entry['raw_json'])
+            entry['message'] = f'Saved, but {backup_error}' if backup_error else None
+
+# --------------------------------------------------------
+# - Batch JSON Import View Function
+#---------------------------------------------------------
+# Imports every uploaded MyWellness JSON document, deduplicating by cardioLogId
+# with a single lookup for the whole batch and committing in chunks.
+def batch_import_json():
+    uploaded_files = request.files.getlist('jsonFiles')
+    wants_json = request.args.get('format') == 'json' # Machine-readable report for scripted backfills
+    if not uploaded_files or all(not (f.filename or '').strip() for f in uploaded_files):
+        if wants_json:
+            return jsonify({'error': 'No files uploaded.'}), 400
+        flash('No files uploaded.', 'danger')
+        return redirect(url_for('home'))
+
+    ingest_timer = IngestTimer()
+    chunk_size = max(1, current_app.config.get('JSON_IMPORT_CHUNK_SIZE', 50))
+
+    # == Parse Documents ============================================
+    with ingest_timer.phase('parse'):
+        report = _collect_uploaded_documents(uploaded_files, current_app.config.get('MAX_CONTENT_LENGTH') or float('inf'))
+        for entry in report:
+            if entry['status'] != 'pending':
+                continue
+            try:
+                entry['json_data'] = json.loads(entry['raw_json'])
+            except json.JSONDecodeError:
+                entry['status'] = 'error'
+                entry['message'] = 'Invalid JSON format.'
+                continue
+            main_container = entry['json_data'].get('data') if isinstance(entry['json_data'], dict) else None
+            entry['cardio_log_id'] = main_container.get('cardioLogId') if isinstance(main_container, dict) else None
+
+    # == Deduplicate by cardioLogId (one indexed lookup per batch) ============================================
+    batch_cardio_log_ids = {entry['cardio_log_id'] for entry in report if entry['status'] == 'pending' and entry['cardio_log_id']}
+    existing_workout_ids = {}
+    if batch_cardio_log_ids:
+        existing_workout_ids = dict(
+            db.session.query(Workout.cardio_log_id, Workout.workout_id)
+            .filter(Workout.cardio_log_id.in_(batch_cardio_log_ids))
+            .all()
+        )
+
+    seen_in_batch = {} # cardio_log_id -> source of the first file in this batch carrying it
+    pending_entries = []
+    for entry in report:
+        if entry['status'] != 'pending':
+            continue
+        cardio_log_id = entry['cardio_log_id']
+        if cardio_log_id in existing_workout_ids:
+            entry['status'] = 'duplicate'
+            entry['workout_id'] = existing_workout_ids[cardio_log_id]
+            entry['message'] = f'Workout with Cardio Log ID {cardio_log_id} already exists.'
+        elif cardio_log_id and cardio_log_id in seen_in_batch:
+            entry['status'] = 'duplicate'
+            entry['message'] = f'Same Cardio Log ID as {seen_in_batch[cardio_log_id]}.'
+        else:
+            if cardio_log_id:
+                seen_in_batch[cardio_log_id] = entry['source']
+            pending_entries.append(entry)
+
+    # == Import in Chunked Transactions ============================================
+    # Bulk mode skips the per-statement materialized view refresh and refreshes once at the end.
+    if pending_entries:
+        with bulk_mode():
+            _import_pending_entries(pending_entries, ingest_timer, chunk_size)
+
+    ingest_timer.log(f"batch import of {len(report)} files")
+
+    # == Build Report ============================================
+    for entry in report:
+        entry.pop('raw_json', None)
+        entry.pop('json_data', None)
+    summary = {status: sum(1 for entry in report if entry['status'] == status) for status in ('imported', 'duplicate', 'error')}
+
+    if wants_json:
+        return jsonify({'summary': summary, 'results': report})
+
+    flash(f"Batch import finished: {summary['imported']} imported, {summary['duplicate']} duplicates, {summary['error']} errors.",
+          'success' if not summary['error'] else 'warning')
+    return render_template('batch_import_report.html', page_title="Batch Import Report", report=report, summary=summary)
+
+# --------------------------------------------------------
+# - Route Registration
+#---------------------------------------------------------
+# Registers the batch JSON import route with the Flask application
+def register_routes(app):
+    app.add_url_rule('/batch_import_json', endpoint='batch_import_json', view_func=batch_import_json, methods=['POST'])
@@ -0,0 +1,19 @@
+# ========================================================
+# = cache_stats.py - View exposing the response cache counters
+# ========================================================
+from flask import jsonify
+from response_cache import response_cache
+
+# --------------------------------------------------------
+# - Cache Stats View Function
+#---------------------------------------------------------
+# Returns the hit / miss / bypass counters per entry kind and the backend's size and
+# evictions of this process, for sizing RESPONSE_CACHE_MAX_MB
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+# --------------------------------------------------------
+# - Route Registration
+#---------------------------------------------------------
+def register_routes(app):
+    app.add_url_rule('/cache/stats', endpoint='cache_stats', view_func=cache_stats, methods=['GET'])
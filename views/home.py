@@ -2,7 +2,7 @@
 # = home.py - View for the home page
 # ========================================================
 from flask import render_template, current_app
-from models import db, Workout, MetricDescriptor, WorkoutSample, EquipmentType # Ensure all are imported
+from models import db, Workout, MetricDescriptor, WorkoutSeries, EquipmentType # Ensure all are imported
 from sqlalchemy import desc
 import json
 
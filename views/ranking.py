@@ -1,10 +1,13 @@
 # ========================================================
 # = ranking.py - View for displaying rankings
 # ========================================================
-from flask import Blueprint, render_template, current_app
+from flask import Blueprint, render_template, request, current_app
 from models import db, Workout, RankingSetting
 from sqlalchemy import text, func
 from utils import format_split_short, format_duration_ms, format_seconds_to_hms
+from best_efforts import get_best_effort_rankings, get_best_effort_years
+from power_curve import ALL_TIME_PERIOD, get_power_curve_envelope, format_curve_duration
+from response_cache import cached_page, cached_fragment, skip_response_cache
 
 ranking_bp = Blueprint('ranking', __name__, url_prefix='/ranking')
 
@@ -60,6 +63,7 @@ def get_rankings_from_mv(ranking_id, year=None, limit=10, rank_type='overall'):
     
     except Exception as e:
         current_app.logger.error(f"Error fetching rankings for ID {ranking_id}: {e}", exc_info=True)
+        skip_response_cache()
         return []
 
 def get_available_years():
@@ -76,15 +80,20 @@ def get_available_years():
         return [row[0] for row in result]
     except Exception as e:
         current_app.logger.error(f"Error fetching available years: {e}", exc_info=True)
+        skip_response_cache()
         return []
 
 @ranking_bp.route('/', defaults={'year_param': None})
 @ranking_bp.route('/<int:year_param>')
+@cached_page
 def index(year_param):
     selected_year = year_param
-    page_title = "Athlete Rankings"
+    # 'workouts' ranks whole workouts of exactly the ranking distance / time (mv_workout_rankings),
+    # 'efforts' the best effort inside any longer workout (workout_best_efforts)
+    source = 'efforts' if request.args.get('source') == 'efforts' else 'workouts'
+    page_title = "Athlete Rankings" if source == 'workouts' else "Best Effort Rankings"
     if selected_year:
-        page_title = f"Athlete Rankings {selected_year}"
+        page_title = f"{page_title} {selected_year}"
     
     # Get all ranking settings from database without sorting (use natural database order)
     try:
@@ -92,22 +101,39 @@ def index(year_param):
         ranking_settings = db.session.query(RankingSetting).all()
     except Exception as e:
         current_app.logger.error(f"Error fetching ranking settings: {e}", exc_info=True)
+        skip_response_cache()
         ranking_settings = []
     
     # Get available years
-    available_years = get_available_years()
+    if source == 'efforts':
+        try:
+            available_years = cached_fragment('best_effort_years', get_best_effort_years)
+        except Exception as e:
+            current_app.logger.error(f"Error fetching best effort years: {e}", exc_info=True)
+            skip_response_cache()
+            available_years = []
+    else:
+        available_years = cached_fragment('ranking_years', get_available_years)
     
     # Fetch rankings for each setting
     all_rankings_data = []
     rank_type = 'year' if selected_year else 'overall'
 
     for setting in ranking_settings:
-        rankings = get_rankings_from_mv(
-            setting.ranking_id, 
-            year=selected_year, 
-            limit=10,
-            rank_type=rank_type
-        )
+        if source == 'efforts':
+            try:
+                rankings = cached_fragment('best_effort_table', lambda: list(get_best_effort_rankings(setting, year=selected_year, limit=10)), setting.ranking_id, selected_year)
+            except Exception as e:
+                current_app.logger.error(f"Error fetching best effort rankings for ID {setting.ranking_id}: {e}", exc_info=True)
+                skip_response_cache()
+                rankings = []
+        else:
+            rankings = cached_fragment('ranking_table', lambda: list(get_rankings_from_mv(
+                setting.ranking_id, 
+                year=selected_year, 
+                limit=10,
+                rank_type=rank_type
+            )), setting.ranking_id, selected_year, rank_type)
         
         all_rankings_data.append({
             'type': setting.type,
@@ -115,12 +141,25 @@ def index(year_param):
             'rankings': rankings
         })
 
+    # Power curve envelope of the selected year (all-time without one)
+    try:
+        power_curve_records = cached_fragment('power_curve_envelope', lambda: [
+            {'label': format_curve_duration(row.duration_seconds), 'watts': row.watts, 'workout_id': row.workout_id, 'workout_date': row.workout_date}
+            for row in get_power_curve_envelope(selected_year or ALL_TIME_PERIOD)
+        ], selected_year)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching power curve envelope: {e}", exc_info=True)
+        skip_response_cache()
+        power_curve_records = []
+
     return render_template(
         'ranking.html',
         page_title=page_title,
         all_rankings_data=all_rankings_data,
         available_years=available_years,
-        selected_year=selected_year
+        selected_year=selected_year,
+        source=source,
+        power_curve_records=power_curve_records
     )
 
 def register_routes(app):
@@ -2,7 +2,12 @@
 # = settings.py - View for managing application settings
 # ========================================================
 from flask import render_template, request, flash, redirect, url_for, current_app
-from models import db, UserSetting, EquipmentType # Added EquipmentType
+from models import db, EquipmentType # Added EquipmentType
+from user_settings import get_settings, save_settings
+from workout_splits import SPLIT_SCHEMES, load_split_schemes, save_split_schemes
+from workout_stats import HR_ZONE_DEFINITIONS, apply_hr_zone_settings
+from workout_hr_zones import RECOMPUTE_HR_ZONES_JOB
+from background_jobs import enqueue_job, get_running_jobs
 
 # --------------------------------------------------------
 # - Default Settings Values
@@ -44,6 +49,9 @@ def show_settings():
                 'HR_Very_light': request.form.get('HR_Very_light')
             }
 
+            hr_zone_keys = {zone_def['key'] for zone_def in HR_ZONE_DEFINITIONS}
+            current_settings = get_settings()
+            validated_settings = {}
             for key, value_str in settings_to_update.items():
                 if not value_str or not value_str.isdigit():
                     flash(f'{key.replace("_", " ").title()} must be a valid positive integer.', 'danger')
@@ -54,13 +62,21 @@ def show_settings():
                     flash(f'{key.replace("_", " ").title()} must be a positive integer.', 'danger')
                     return redirect(url_for('settings'))
 
-                setting_obj = UserSetting.query.filter_by(key=key).first()
-                if not setting_obj:
-                    setting_obj = UserSetting(key=key)
-                    db.session.add(setting_obj)
-                setting_obj.value = str(value_int)
+                validated_settings[key] = str(value_int)
                 current_app.logger.debug(f"Attempting to save {key}: {value_int}")
 
+            hr_zones_changed = any(current_settings.values.get(key) != validated_settings[key] for key in hr_zone_keys)
+            save_settings(validated_settings) # Bumps the settings version; all processes reload on commit
+
+            # -- Apply Changed HR Zones to All Workouts -------------------
+            # Zone times are re-summed from the stored HR histograms, no samples are read;
+            # the stored zone rows (workout_hr_zones) are recomputed in the background
+            if hr_zones_changed:
+                saved_hr_zones = {key: int(validated_settings[key]) for key in hr_zone_keys} # Not yet in the committed snapshot
+                updated_workouts = apply_hr_zone_settings(saved_hr_zones)
+                current_app.logger.info(f"HR zone times updated for {updated_workouts} workouts.")
+                enqueue_job(RECOMPUTE_HR_ZONES_JOB)
+
             # -- Handle EquipmentType 'settings_include_in_totals' -------------------
             all_equipment_types = EquipmentType.query.all()
             for equip_type in all_equipment_types:
@@ -71,6 +87,12 @@ def show_settings():
                 if equip_type.settings_include_in_totals != is_included:
                     equip_type.settings_include_in_totals = is_included
                     current_app.logger.debug(f"Updating {equip_type.name} 'settings_include_in_totals' to {is_included}")
+
+            # -- Handle Split Schemes -------------------
+            # A changed selection queues a background recompute of the stored splits
+            selected_schemes = [scheme for scheme in SPLIT_SCHEMES if f"split_scheme_{scheme}" in request.form]
+            if save_split_schemes(selected_schemes):
+                current_app.logger.info(f"Split schemes changed to {selected_schemes}, split recompute queued.")
             
             # -- Commit Changes to Database -------------------
             db.session.commit()
@@ -92,19 +114,16 @@ def show_settings():
     # Fetch current settings from the database or use defaults.
     settings_data = {}
     equipment_types_data = []
+    selected_split_schemes = []
+    running_jobs = []
     try:
+        current_settings = get_settings() # Cached snapshot, no query per key
         for key, default_value in DEFAULT_SETTINGS.items():
-            setting_obj = UserSetting.query.filter_by(key=key).first()
-            if setting_obj and setting_obj.value and setting_obj.value.isdigit():
-                settings_data[key] = int(setting_obj.value)
-            else:
-                settings_data[key] = int(default_value) # Use default if not found or invalid
-                if setting_obj and (not setting_obj.value or not setting_obj.value.isdigit()):
-                    current_app.logger.warning(f"Invalid '{key}' value '{setting_obj.value}' in DB, using default.")
-                elif not setting_obj:
-                     current_app.logger.info(f"Setting '{key}' not found in DB, using default '{default_value}'.")
+            settings_data[key] = current_settings.get_int(key, default_value) # Default if not found or invalid
 
         equipment_types_data = EquipmentType.query.order_by(EquipmentType.name).all()
+        selected_split_schemes = load_split_schemes()
+        running_jobs = get_running_jobs() # Progress of background recomputes, e.g. after an HR zone change
 
     except Exception as e:
         current_app.logger.error(f"Error fetching settings for display: {e}", exc_info=True)
@@ -115,7 +134,14 @@ def show_settings():
         equipment_types_data = [] # Ensure it's an empty list on error
     
     # == Render Template ============================================
-    return render_template('settings.html', settings_data=settings_data, equipment_types=equipment_types_data)
+    return render_template(
+        'settings.html',
+        settings_data=settings_data,
+        equipment_types=equipment_types_data,
+        split_schemes=SPLIT_SCHEMES,
+        selected_split_schemes=selected_split_schemes,
+        running_jobs=running_jobs
+    )
 
 # --------------------------------------------------------
 # - Route Registration
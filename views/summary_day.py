@@ -1,11 +1,12 @@
 # ========================================================
 # = summary_day.py - View for displaying paginated daily workout summaries
 # ========================================================
-from flask import render_template, redirect, url_for, current_app
+from flask import render_template, redirect, url_for, request
 from sqlalchemy import text # Import text for raw SQL execution
-from models import db, UserSetting # Assuming db is initialized and available, Added UserSetting
-from utils import CustomPagination # Import CustomPagination from utils
-from datetime import datetime # Added for chart category formatting
+from models import db
+from user_settings import get_settings
+from utils import CustomPagination, cached_count, keyset_window, keyset_clauses # Import CustomPagination from utils
+from datetime import datetime, date # Added for chart category formatting
 import math # Added for chart data sanitization
 
 # --------------------------------------------------------
@@ -14,24 +15,13 @@ import math # Added for chart data sanitization
 # Displays paginated daily workout summaries from the mv_day_totals materialized view.
 def summary_day(page_num=1):
     # == Pagination Configuration ============================================
-    # Fetch 'per_page_summary_day' from UserSetting table
-    per_page_setting = UserSetting.query.filter_by(key='per_page_summary_day').first()
-    if per_page_setting and per_page_setting.value and per_page_setting.value.isdigit():
-        per_page_value = int(per_page_setting.value)
-        if per_page_value <= 0: # Ensure positive value
-            per_page_value = 14 # Fallback to a sensible default (e.g., from DEFAULT_SETTINGS in settings.py)
-            current_app.logger.warning("per_page_summary_day setting is not positive, using default 14.")
-    else:
-        per_page_value = 14 # Default if setting not found or invalid
-        if per_page_setting: # Log if found but invalid
-            current_app.logger.warning(f"per_page_summary_day setting '{per_page_setting.value}' is invalid, using default 14.")
-        else: # Log if not found
-            current_app.logger.info("per_page_summary_day setting not found, using default 14.")
+    # Items per page from the cached settings snapshot (default 14 when unset or invalid)
+    per_page_value = get_settings().per_page('per_page_summary_day')
 
     # == Query Total Count for Pagination ============================================
-    # Get the total number of daily summary records for pagination logic.
-    count_result = db.session.execute(text("SELECT COUNT(*) FROM mv_day_totals")).scalar() # Total records in mv_day_totals
-    total_pages = (count_result + per_page_value - 1) // per_page_value if count_result > 0 else 1 # Calculate total pages
+    # Cached until the workout data changes (see utils.cached_count)
+    count_result = cached_count('mv_day_totals', "SELECT COUNT(*) FROM mv_day_totals")
+    total_pages = (count_result + per_page_value - 1) // per_page_value if count_result > 0 else 1
 
     # == Page Number Validation and Redirection ============================================
     # Ensure page_num is within valid bounds.
@@ -42,11 +32,13 @@ def summary_day(page_num=1):
     elif page_num > total_pages and total_pages == 0: # If no data, redirect to page 1
         return redirect(url_for('summary_day_paginated', page_num=1))
 
-    # == Calculate Offset for SQL Query ============================================
-    offset = (page_num - 1) * per_page_value # Calculate the starting point for records on the current page
+    # == Keyset Window for SQL Query ============================================
+    # Rows after / before the cursor of the linking page, by day_date (primary key range scan)
+    direction, cursor, offset, limit = keyset_window(page_num, per_page_value, count_result, (date,), request.args)
+    where_clause, order_by, cursor_params = keyset_clauses(['day_date'], direction, cursor)
 
     # == Query Data for Current Page ============================================
-    # Fetch daily summary data for the current page using LIMIT and OFFSET.
+    # Fetch daily summary data for the current page by key range (see keyset_window).
     # Data is fetched DESC for table display. A reversed copy will be used for the chart.
     summary_day_raw_results_desc = db.session.execute(text(f"""
         SELECT
@@ -57,10 +49,14 @@ def summary_day(page_num=1):
             total_isoreps_sum
         FROM
             mv_day_totals
+        WHERE
+            {where_clause}
         ORDER BY
-            day_date DESC
+            {order_by}
         LIMIT :limit OFFSET :offset
-    """), {'limit': per_page_value, 'offset': offset}).fetchall() # Execute query with parameters
+    """), {'limit': limit, 'offset': offset, **cursor_params}).fetchall() # Execute query with parameters
+    if direction == 'asc':
+        summary_day_raw_results_desc.reverse() # Displayed newest first
 
     # == Prepare Data for Template ============================================
     # Convert raw SQL results into a list of dictionaries for easier template access.
@@ -79,7 +75,7 @@ def summary_day(page_num=1):
     # We now use the CustomPagination class imported from utils.py.
 
     # -- Instantiate Custom Pagination Object -------------------
-    summary_day_pagination = CustomPagination(page_num, per_page_value, count_result, summary_day_display_data)
+    summary_day_pagination = CustomPagination(page_num, per_page_value, count_result, summary_day_display_data, [(row.day_date,) for row in summary_day_raw_results_desc])
 
     # == Prepare Data for Chart (from paginated results) ============================================
     # Use the paginated data (reversed for chronological order) for the chart.
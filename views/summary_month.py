@@ -1,10 +1,11 @@
 # ========================================================
 # = summary_month.py - View for displaying paginated monthly workout summaries
 # ========================================================
-from flask import render_template, redirect, url_for, current_app
+from flask import render_template, redirect, url_for, request
 from sqlalchemy import text
-from models import db, UserSetting # Added UserSetting
-from utils import CustomPagination 
+from models import db
+from user_settings import get_settings
+from utils import CustomPagination, cached_count, keyset_window, keyset_clauses
 from datetime import datetime
 import math # Import math for isnan and isfinite
 
@@ -14,22 +15,12 @@ import math # Import math for isnan and isfinite
 # Displays paginated monthly workout summaries from the mv_month_totals materialized view.
 def summary_month(page_num=1): # Renamed function
     # == Pagination Configuration ============================================
-    # Fetch 'per_page_summary_month' from UserSetting table
-    per_page_setting = UserSetting.query.filter_by(key='per_page_summary_month').first()
-    if per_page_setting and per_page_setting.value and per_page_setting.value.isdigit():
-        per_page_value = int(per_page_setting.value)
-        if per_page_value <= 0: # Ensure positive value
-            per_page_value = 12 # Fallback to a sensible default (e.g., from DEFAULT_SETTINGS in settings.py)
-            current_app.logger.warning("per_page_summary_month setting is not positive, using default 12.")
-    else:
-        per_page_value = 12 # Default if setting not found or invalid
-        if per_page_setting: # Log if found but invalid
-            current_app.logger.warning(f"per_page_summary_month setting '{per_page_setting.value}' is invalid, using default 12.")
-        else: # Log if not found
-            current_app.logger.info("per_page_summary_month setting not found, using default 12.")
+    # Items per page from the cached settings snapshot (default 12 when unset or invalid)
+    per_page_value = get_settings().per_page('per_page_summary_month')
 
     # == Query Total Count for Pagination ============================================
-    count_result = db.session.execute(text("SELECT COUNT(*) FROM mv_month_totals")).scalar()
+    # Cached until the workout data changes (see utils.cached_count)
+    count_result = cached_count('mv_month_totals', "SELECT COUNT(*) FROM mv_month_totals")
     total_pages = (count_result + per_page_value - 1) // per_page_value if count_result > 0 else 1
 
     # == Page Number Validation and Redirection ============================================
@@ -40,8 +31,10 @@ def summary_month(page_num=1): # Renamed function
     elif page_num > total_pages and total_pages == 0: 
         return redirect(url_for('summary_month_paginated', page_num=1)) # Updated url_for
 
-    # == Calculate Offset for SQL Query ============================================
-    offset = (page_num - 1) * per_page_value
+    # == Keyset Window for SQL Query ============================================
+    # Rows after / before the cursor of the linking page, by year, month (primary key range scan)
+    direction, cursor, offset, limit = keyset_window(page_num, per_page_value, count_result, (int, int), request.args)
+    where_clause, order_by, cursor_params = keyset_clauses(['year', 'month'], direction, cursor)
 
     # == Query Data for Current Page ============================================
     # Data is fetched DESC for table display. A reversed copy will be used for the chart.
@@ -55,10 +48,14 @@ def summary_month(page_num=1): # Renamed function
             total_isoreps_sum
         FROM
             mv_month_totals
+        WHERE
+            {where_clause}
         ORDER BY
-            year DESC, month DESC
+            {order_by}
         LIMIT :limit OFFSET :offset
-    """), {'limit': per_page_value, 'offset': offset}).fetchall()
+    """), {'limit': limit, 'offset': offset, **cursor_params}).fetchall()
+    if direction == 'asc':
+        summary_month_raw_results_desc.reverse() # Displayed newest first
 
     # == Prepare Data for Template ============================================
     summary_month_display_data = [] # Renamed variable
@@ -74,7 +71,7 @@ def summary_month(page_num=1): # Renamed function
         })
 
     # == Custom Pagination Object ============================================
-    summary_month_pagination = CustomPagination(page_num, per_page_value, count_result, summary_month_display_data) # Renamed variable
+    summary_month_pagination = CustomPagination(page_num, per_page_value, count_result, summary_month_display_data, [(row.year, row.month) for row in summary_month_raw_results_desc]) # Renamed variable
 
     # == Prepare Data for Chart ============================================
     # Use the paginated data (reversed for chronological order) for the chart.
@@ -1,11 +1,12 @@
 # ========================================================
 # = summary_week.py - View for displaying paginated weekly workout summaries
 # ========================================================
-from flask import render_template, redirect, url_for, current_app
+from flask import render_template, redirect, url_for, request
 from sqlalchemy import text
-from models import db, UserSetting # Assuming db is initialized and available, Added UserSetting
-from utils import CustomPagination # Import CustomPagination
-from datetime import datetime # Added for chart category formatting
+from models import db
+from user_settings import get_settings
+from utils import CustomPagination, cached_count, keyset_window, keyset_clauses # Import CustomPagination
+from datetime import datetime, date # Added for chart category formatting
 import math # Added for chart data sanitization
 
 # --------------------------------------------------------
@@ -14,22 +15,12 @@ import math # Added for chart data sanitization
 # Displays paginated weekly workout summaries from the mv_week_totals materialized view.
 def summary_week(page_num=1): # Renamed function
     # == Pagination Configuration ============================================
-    # Fetch 'per_page_summary_week' from UserSetting table
-    per_page_setting = UserSetting.query.filter_by(key='per_page_summary_week').first()
-    if per_page_setting and per_page_setting.value and per_page_setting.value.isdigit():
-        per_page_value = int(per_page_setting.value)
-        if per_page_value <= 0: # Ensure positive value
-            per_page_value = 12 # Fallback to a sensible default (e.g., from DEFAULT_SETTINGS in settings.py)
-            current_app.logger.warning("per_page_summary_week setting is not positive, using default 12.")
-    else:
-        per_page_value = 12 # Default if setting not found or invalid
-        if per_page_setting: # Log if found but invalid
-            current_app.logger.warning(f"per_page_summary_week setting '{per_page_setting.value}' is invalid, using default 12.")
-        else: # Log if not found
-            current_app.logger.info("per_page_summary_week setting not found, using default 12.")
+    # Items per page from the cached settings snapshot (default 12 when unset or invalid)
+    per_page_value = get_settings().per_page('per_page_summary_week')
 
     # == Query Total Count for Pagination ============================================
-    count_result = db.session.execute(text("SELECT COUNT(*) FROM mv_week_totals")).scalar()
+    # Cached until the workout data changes (see utils.cached_count)
+    count_result = cached_count('mv_week_totals', "SELECT COUNT(*) FROM mv_week_totals")
     total_pages = (count_result + per_page_value - 1) // per_page_value if count_result > 0 else 1
 
     # == Page Number Validation and Redirection ============================================
@@ -40,8 +31,10 @@ def summary_week(page_num=1): # Renamed function
     elif page_num > total_pages and total_pages == 0: # If no data, redirect to page 1
         return redirect(url_for('summary_week_paginated', page_num=1)) # Updated url_for
 
-    # == Calculate Offset for SQL Query ============================================
-    offset = (page_num - 1) * per_page_value
+    # == Keyset Window for SQL Query ============================================
+    # Rows after / before the cursor of the linking page, by week_start_date (primary key range scan)
+    direction, cursor, offset, limit = keyset_window(page_num, per_page_value, count_result, (date,), request.args)
+    where_clause, order_by, cursor_params = keyset_clauses(['week_start_date'], direction, cursor)
 
     # == Query Data for Current Page ============================================
     # Data is fetched DESC for table display. A reversed copy will be used for the chart.
@@ -54,10 +47,14 @@ def summary_week(page_num=1): # Renamed function
             total_isoreps_sum
         FROM
             mv_week_totals
+        WHERE
+            {where_clause}
         ORDER BY
-            week_start_date DESC
+            {order_by}
         LIMIT :limit OFFSET :offset
-    """), {'limit': per_page_value, 'offset': offset}).fetchall()
+    """), {'limit': limit, 'offset': offset, **cursor_params}).fetchall()
+    if direction == 'asc':
+        summary_week_raw_results_desc.reverse() # Displayed newest first
 
     # == Prepare Data for Template ============================================
     summary_week_display_data = [] # Renamed variable
@@ -73,7 +70,7 @@ def summary_week(page_num=1): # Renamed function
         })
 
     # == Custom Pagination Object ============================================
-    summary_week_pagination = CustomPagination(page_num, per_page_value, count_result, summary_week_display_data) # Renamed variable
+    summary_week_pagination = CustomPagination(page_num, per_page_value, count_result, summary_week_display_data, [(row.week_start_date,) for row in summary_week_raw_results_desc]) # Renamed variable
 
     # == Prepare Data for Chart ============================================
     # Use the paginated data (reversed for chronological order) for the chart.
@@ -4,6 +4,7 @@
 from flask import render_template, redirect, url_for, current_app
 from sqlalchemy import text
 from models import db 
+from response_cache import cached_page # Rendered pages cached per data version
 from utils import CustomPagination 
 import math # Import math for isnan and isfinite
 
@@ -87,4 +88,4 @@ def summary_year(): # Renamed function
 #---------------------------------------------------------
 # Registers the yearly summary view routes with the Flask application.
 def register_routes(app):
-    app.add_url_rule('/summary_year/', endpoint='summary_year', view_func=summary_year, methods=['GET']) # Updated endpoint and view_func
\ No newline at end of file
+    app.add_url_rule('/summary_year/', endpoint='summary_year', view_func=cached_page(summary_year), methods=['GET']) # Updated endpoint and view_func
\ No newline at end of file
@@ -1,38 +1,215 @@
 # ========================================================
 # = workouts.py - View for displaying paginated workouts
 # ========================================================
-from flask import render_template, redirect, url_for, current_app
-from models import Workout, UserSetting # Added UserSetting
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+from flask import render_template, redirect, url_for, request, flash
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import joinedload
+from models import Workout, EquipmentType
+from user_settings import get_settings
+from utils import CustomPagination, cached_count, keyset_window
 import datetime # Added for chart category formatting
 import math # Added for chart data sanitization
 
+# --------------------------------------------------------
+# - List Sorts and Filters
+#---------------------------------------------------------
+# Only whitelisted combinations are accepted, each read along a composite index in key
+# order (see database_setup.LIST_INDEXES_SQL), so no combination sorts or scans the table:
+# - every sort is keyset-paginated on (sort column, workout_id)
+# - the equipment filter is an equality prefix of the index: (equipment_type_id, column, workout_id)
+# - a range filter is only accepted on the sort column, where it bounds the index range
+# Every sort lists the same workouts: those without a value in a nullable sort column
+# (manual entries, equipment without distance) follow the others in either direction.
+WORKOUT_SORTS = {
+    'date':     {'column': Workout.workout_date,               'key_type': datetime.date, 'default_dir': 'desc', 'nullable': False},
+    'distance': {'column': Workout.total_distance_meters,      'key_type': Decimal,       'default_dir': 'desc', 'nullable': True},
+    'duration': {'column': Workout.duration_seconds,           'key_type': Decimal,       'default_dir': 'desc', 'nullable': True},
+    'split':    {'column': Workout.average_split_seconds_500m, 'key_type': Decimal,       'default_dir': 'asc',  'nullable': True}
+}
+DEFAULT_WORKOUT_SORT = 'date'
+
+# Range filters: key -> (sort key whose column they bound, lower / upper bound URL arguments)
+WORKOUT_RANGE_FILTERS = {
+    'date':     {'sort': 'date',     'args': ('date_from', 'date_to')},
+    'distance': {'sort': 'distance', 'args': ('distance_min', 'distance_max')}
+}
+
+# Index read for each (equipment filter, sort) combination; range filters use the same index
+WORKOUT_LIST_INDEXES = {
+    (False, 'date'): 'ix_workouts_date_id',
+    (False, 'distance'): 'ix_workouts_distance_id',
+    (False, 'duration'): 'ix_workouts_duration_id',
+    (False, 'split'): 'ix_workouts_split_id',
+    (True, 'date'): 'ix_workouts_equipment_date_id',
+    (True, 'distance'): 'ix_workouts_equipment_distance_id',
+    (True, 'duration'): 'ix_workouts_equipment_duration_id',
+    (True, 'split'): 'ix_workouts_equipment_split_id'
+}
+
+# Parses one range bound; None when empty, raises ValueError when invalid
+def _parse_range_bound(sort_key, value):
+    if not value:
+        return None
+    if WORKOUT_SORTS[sort_key]['key_type'] is datetime.date:
+        return datetime.date.fromisoformat(value)
+    try:
+        bound = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not bound.is_finite():
+        raise ValueError(value)
+    return bound
+
+# Returns the list options of the request arguments ({'sort', 'dir', 'equipment_type_id',
+# 'ranges': {range filter key: (low, high)}}) and warnings about the arguments that were
+# dropped because they are invalid or not a whitelisted combination
+def parse_workout_list_args(args):
+    warnings = []
+    sort_key = args.get('sort', DEFAULT_WORKOUT_SORT)
+    if sort_key not in WORKOUT_SORTS:
+        warnings.append(f"Unknown sort '{sort_key}', sorted by date.")
+        sort_key = DEFAULT_WORKOUT_SORT
+    sort_dir = args.get('dir', WORKOUT_SORTS[sort_key]['default_dir'])
+    if sort_dir not in ('asc', 'desc'):
+        sort_dir = WORKOUT_SORTS[sort_key]['default_dir']
+    equipment_type_id = args.get('equipment', type=int)
+
+    ranges = {}
+    for filter_key, range_filter in WORKOUT_RANGE_FILTERS.items():
+        try:
+            low, high = (_parse_range_bound(range_filter['sort'], args.get(arg_name)) for arg_name in range_filter['args'])
+        except ValueError:
+            warnings.append(f"Invalid {filter_key} range ignored.")
+            continue
+        if low is None and high is None:
+            continue
+        if range_filter['sort'] != sort_key:
+            warnings.append(f"The {filter_key} range only applies when sorting by {filter_key}; it was ignored.")
+            continue
+        ranges[filter_key] = (low, high)
+    return {'sort': sort_key, 'dir': sort_dir, 'equipment_type_id': equipment_type_id, 'ranges': ranges}, warnings
+
+# URL arguments reproducing the list options (defaults left out), kept on page links
+def workout_list_url_args(options):
+    url_args = {}
+    if options['sort'] != DEFAULT_WORKOUT_SORT:
+        url_args['sort'] = options['sort']
+    if options['dir'] != WORKOUT_SORTS[options['sort']]['default_dir']:
+        url_args['dir'] = options['dir']
+    if options['equipment_type_id'] is not None:
+        url_args['equipment'] = options['equipment_type_id']
+    for filter_key, (low, high) in options['ranges'].items():
+        low_arg, high_arg = WORKOUT_RANGE_FILTERS[filter_key]['args']
+        if low is not None:
+            url_args[low_arg] = low.isoformat() if isinstance(low, datetime.date) else str(low)
+        if high is not None:
+            url_args[high_arg] = high.isoformat() if isinstance(high, datetime.date) else str(high)
+    return url_args
+
+# Header links: {sort key: (URL, direction arrow or '')}. The current sort's header reverses
+# it; another header sorts by its column in its default direction, keeping the equipment filter.
+def workout_sort_links(options):
+    sort_links = {}
+    for sort_key, sort_def in WORKOUT_SORTS.items():
+        if sort_key == options['sort']:
+            link_options = dict(options, dir='asc' if options['dir'] == 'desc' else 'desc')
+            arrow = '▼' if options['dir'] == 'desc' else '▲'
+        else:
+            link_options = dict(options, sort=sort_key, dir=sort_def['default_dir'], ranges={})
+            arrow = ''
+        sort_links[sort_key] = (url_for('workouts', **workout_list_url_args(link_options)), arrow)
+    return sort_links
+
+# WHERE conditions of the list options (without the keyset cursor)
+def workout_list_filters(options):
+    sort_column = WORKOUT_SORTS[options['sort']]['column']
+    conditions = []
+    if options['equipment_type_id'] is not None:
+        conditions.append(Workout.equipment_type_id == options['equipment_type_id'])
+    for filter_key, (low, high) in options['ranges'].items():
+        if low is not None:
+            conditions.append(sort_column >= low)
+        if high is not None:
+            conditions.append(sort_column <= high)
+    return conditions
+
+# Builds the queries of one list page, in read order. `direction` and `cursor` come from
+# keyset_window(): 'desc' reads forward in display order from the cursor, 'asc' backward.
+# A nullable sort is read in two segments, the workouts with a value and then those without
+# (by workout_id), each one range of the combination's index, where NULLs sort last. A
+# cursor with a NULL sort value is a position in the second segment.
+def build_workout_list_queries(options, direction, cursor):
+    sort_def = WORKOUT_SORTS[options['sort']]
+    sort_column = sort_def['column']
+    forward = direction == 'desc'
+    descending = (options['dir'] == 'desc') == forward # Read order of the queries
+    workout_key = tuple_(sort_column, Workout.workout_id)
+    list_query = Workout.query.options(joinedload(Workout.stats)).filter(*workout_list_filters(options))
+    if descending:
+        list_query = list_query.order_by(sort_column.desc(), Workout.workout_id.desc())
+    else:
+        list_query = list_query.order_by(sort_column.asc(), Workout.workout_id.asc())
+
+    def beyond_cursor(key, cursor_key): # Rows after the cursor in read order
+        return key < cursor_key if descending else key > cursor_key
+
+    if not sort_def['nullable']:
+        return [list_query if cursor is None else list_query.filter(beyond_cursor(workout_key, tuple_(*cursor)))]
+
+    segments = [list_query.filter(sort_column.isnot(None)), list_query.filter(sort_column.is_(None))] # Display order
+    if cursor is not None:
+        position = 0 if cursor[0] is not None else 1
+        if position == 0:
+            segments[0] = segments[0].filter(beyond_cursor(workout_key, tuple_(*cursor)))
+        else:
+            segments[1] = segments[1].filter(beyond_cursor(Workout.workout_id, cursor[1]))
+        segments = segments[position:] if forward else segments[:position + 1]
+    return segments if forward else segments[::-1]
+
+# Reads one list page (see build_workout_list_queries()) in read order. The offset of a
+# page without a cursor counts across the segments.
+def read_workout_list_page(options, direction, cursor, offset, limit):
+    page_workouts = []
+    for segment_query in build_workout_list_queries(options, direction, cursor):
+        segment_workouts = segment_query.offset(offset).limit(limit - len(page_workouts)).all()
+        page_workouts += segment_workouts
+        if len(page_workouts) >= limit:
+            break
+        if segment_workouts:
+            offset = 0
+        elif offset:
+            offset -= segment_query.order_by(None).count() # The offset skipped the whole segment
+    return page_workouts
+
 # --------------------------------------------------------
 # - Workouts View Function
 #---------------------------------------------------------
-# Displays a paginated list of workouts
+# Displays a paginated list of workouts, sorted and filtered by the request arguments
 def workouts(page_num=1):
     # == Pagination Configuration ============================================
-    # Fetch 'per_page_workouts' from UserSetting table
-    per_page_setting = UserSetting.query.filter_by(key='per_page_workouts').first()
-    if per_page_setting and per_page_setting.value and per_page_setting.value.isdigit():
-        per_page_value = int(per_page_setting.value)
-        if per_page_value <= 0: # Ensure positive value
-            per_page_value = 20 # Fallback to a sensible default
-            current_app.logger.warning("per_page_workouts setting is not positive, using default 20.")
-    else:
-        per_page_value = 20 # Default if setting not found or invalid
-        if per_page_setting: # Log if found but invalid
-            current_app.logger.warning(f"per_page_workouts setting '{per_page_setting.value}' is invalid, using default 20.")
-        else: # Log if not found
-            current_app.logger.info("per_page_workouts setting not found, using default 20.")
+    # Items per page from the cached settings snapshot (default 20 when unset or invalid)
+    per_page_value = get_settings().per_page('per_page_workouts')
 
+    # == List Options ============================================
+    list_options, list_warnings = parse_workout_list_args(request.args)
+    for warning in list_warnings:
+        flash(warning, 'warning')
+    list_url_args = workout_list_url_args(list_options)
 
     # == Query Workouts ============================================
-    # Fetch workouts, ordered by date and ID, paginated
-    workouts_pagination = Workout.query.order_by(
-        Workout.workout_date.desc(), # Order by workout date descending
-        Workout.workout_id.desc() # Then by workout ID descending for consistent ordering
-    ).paginate(page=page_num, per_page=per_page_value, error_out=False) # Paginate results
+    # Fetch one page of workouts by (sort column, workout_id) key with their precomputed
+    # statistics; the combination's index serves every page as one range scan
+    sort_def = WORKOUT_SORTS[list_options['sort']]
+    count_name = 'workouts?' + urlencode(sorted((key, value) for key, value in list_url_args.items() if key != 'dir')) # One count per filter combination
+    total_count = cached_count(count_name, select(func.count()).select_from(Workout).where(*workout_list_filters(list_options)))
+    direction, cursor, offset, limit = keyset_window(page_num, per_page_value, total_count, (sort_def['key_type'], int), request.args, nullable_sort_key=sort_def['nullable'])
+    page_workouts = read_workout_list_page(list_options, direction, cursor, offset, limit)
+    if direction == 'asc':
+        page_workouts.reverse() # Read backward, displayed in list order
+    page_keys = [(sort_def['column'].__get__(w, Workout), w.workout_id) for w in page_workouts]
+    workouts_pagination = CustomPagination(page_num, per_page_value, total_count, page_workouts, page_keys, list_url_args)
 
     # == Prepare Data for Template ============================================
     # The template will directly use workout objects and Jinja filters for formatting
@@ -45,8 +222,11 @@ def workouts(page_num=1):
         })
 
     # == Prepare Data for Chart (from paginated results) ============================================
-    # Use the paginated data (reversed for chronological order) for the chart.
-    chart_data_source = list(reversed(workouts_for_display)) # Reverse for chronological chart
+    # Use the paginated data for the chart: in chronological order when sorted by date, else in list order
+    if list_options['sort'] == 'date' and list_options['dir'] == 'desc':
+        chart_data_source = list(reversed(workouts_for_display)) # Reverse for chronological chart
+    else:
+        chart_data_source = list(workouts_for_display)
 
     chart_categories_dates = []
     chart_series_data_meters = []
@@ -73,16 +253,19 @@ def workouts(page_num=1):
 
     # == Handle Empty Page Redirects ============================================
     # If the current page is empty and not the first page, redirect to the last valid page or first page
-    if not workouts_pagination.items and page_num > 1 and workouts_pagination.pages > 0 :
-        return redirect(url_for('workouts_paginated', page_num=workouts_pagination.pages)) # Redirect to last page with items
-    elif not workouts_pagination.items and page_num > 1 and workouts_pagination.pages == 0: # Should ideally not happen if page_num > 1
-        return redirect(url_for('workouts_paginated', page_num=1)) # Redirect to first page if no pages exist (edge case)
+    if not workouts_pagination.items and page_num > 1:
+        return redirect(url_for('workouts_paginated', page_num=workouts_pagination.pages, **list_url_args)) # Redirect to last page with items (page 1 if none)
 
     # == Render Template ============================================
     return render_template(
         'workouts.html',
         workouts_pagination=workouts_pagination, # Pass pagination object
         workouts_display_data=workouts_display_data, # Pass prepared workout data
+        # Sorting and filters
+        list_options=list_options,
+        sort_links=workout_sort_links(list_options),
+        range_filters=WORKOUT_RANGE_FILTERS,
+        equipment_types=EquipmentType.query.order_by(EquipmentType.name).all(),
         # Chart data
         chart_categories_dates=chart_categories_dates,
         series_data_meters=chart_series_data_meters,
@@ -4,6 +4,7 @@
 from flask import render_template, abort, flash, redirect, url_for, current_app
 from models import db, Workout 
 from sqlalchemy import text
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import math # Added for chart data sanitization
 # import json # Removed json import as it's no longer needed for chart data
@@ -57,7 +58,7 @@ def show_workouts_for_date(date_str):
 
 
     # == Fetch Individual Workouts for the Selected Date ============================================
-    workouts_on_date = Workout.query.filter(
+    workouts_on_date = Workout.query.options(joinedload(Workout.stats)).filter(
         Workout.workout_date == selected_date # Filter workouts by the selected date
     ).order_by(Workout.workout_id.asc()).all() # Order by ID for consistency
 
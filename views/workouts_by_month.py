@@ -3,6 +3,7 @@
 # ========================================================
 from flask import render_template, flash, redirect, url_for, current_app
 from models import db
+from response_cache import cached_page # Rendered pages cached per data version
 from sqlalchemy import text
 from datetime import datetime, timedelta
 import calendar
@@ -343,5 +344,5 @@ def show_workouts_for_month(year_month_str):
 def register_routes(app):
     app.add_url_rule('/workouts/month/<string:year_month_str>', 
                      endpoint='workouts_by_month_detail', 
-                     view_func=show_workouts_for_month, 
+                     view_func=cached_page(show_workouts_for_month), 
                      methods=['GET'])
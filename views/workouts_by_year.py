@@ -3,6 +3,7 @@
 # ========================================================
 from flask import render_template, flash, redirect, url_for, current_app
 from models import db
+from response_cache import cached_page # Rendered pages cached per data version
 from sqlalchemy import text
 from datetime import datetime, timedelta
 import calendar
@@ -254,5 +255,5 @@ def show_workouts_for_year(year_param):
 def register_routes(app):
     app.add_url_rule('/workouts/year/<string:year_param>', 
                      endpoint='workouts_by_year_detail', 
-                     view_func=show_workouts_for_year, 
+                     view_func=cached_page(show_workouts_for_year), 
                      methods=['GET'])
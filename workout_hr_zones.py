@@ -0,0 +1,154 @@
+# ========================================================
+# = workout_hr_zones.py - Stored HR zone rows recomputed for the configured zones
+# ========================================================
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from background_jobs import background_job, report_job_progress
+from series import hr_zone_seconds_batch
+from sample_loader import HEART_RATE_METRIC
+from workout_stats import HR_ZONE_DEFINITIONS, load_hr_zone_settings, hr_zone_ranges, hr_zone_bounds
+
+RECOMPUTE_HR_ZONES_JOB = 'recompute_hr_zones' # Background job name
+
+# --------------------------------------------------------
+# - HR Zone Rows
+#---------------------------------------------------------
+INSERT_WORKOUT_HR_ZONE_SQL = """
+    INSERT INTO workout_hr_zones (workout_id, zone_name, color_hex, lower_bound_bpm, upper_bound_bpm, seconds_in_zone)
+    VALUES (:workout_id, :zone_name, :color_hex, :lower_bound_bpm, :upper_bound_bpm, :seconds_in_zone)
+"""
+
+# Loads the heart rate samples of several workouts in one query:
+# [(workout_id, times, bpm values)] in workout order, only workouts with samples
+def load_heart_rate_arrays(workout_ids):
+    rows = db.session.execute(text("""
+        SELECT
+            workout_id,
+            array_agg(time_offset_seconds ORDER BY time_offset_seconds) AS hr_times,
+            array_agg(heart_rate_bpm ORDER BY time_offset_seconds) AS hr_values
+        FROM heart_rate_samples
+        WHERE workout_id = ANY(:workout_ids)
+        GROUP BY workout_id
+        ORDER BY workout_id
+    """), {'workout_ids': list(workout_ids)}).fetchall()
+    return [(row.workout_id, list(row.hr_times), list(row.hr_values)) for row in rows]
+
+# workout_hr_zones rows for the zone seconds of the configured zones (zone_ranges order).
+# Bounds are stored inclusive, as in the imported rows: the last zone has no upper bound.
+def hr_zone_rows(workout_id, zone_ranges, zone_seconds):
+    zone_defs = {zone_def['key']: zone_def for zone_def in HR_ZONE_DEFINITIONS}
+    return [{
+        'workout_id': workout_id,
+        'zone_name': zone['name'],
+        'color_hex': zone_defs[zone['key']]['color_hex'],
+        'lower_bound_bpm': zone['start'],
+        'upper_bound_bpm': zone['end'] - 1 if zone['end'] != float('inf') else None,
+        'seconds_in_zone': seconds
+    } for zone, seconds in zip(zone_ranges, zone_seconds)]
+
+# Replaces the workout_hr_zones rows of the given workouts in the current session transaction
+# and records the zone bounds on their workout_stats rows.
+# zone_results: [(workout_id, seconds per zone range)] as returned by hr_zone_seconds_batch()
+def store_workout_hr_zones(zone_results, hr_zones):
+    if not zone_results:
+        return 0
+    zone_ranges = hr_zone_ranges(hr_zones)
+    workout_ids = [workout_id for workout_id, _zone_seconds in zone_results]
+    zone_rows = [row for workout_id, zone_seconds in zone_results for row in hr_zone_rows(workout_id, zone_ranges, zone_seconds)]
+
+    db.session.execute(text("DELETE FROM workout_hr_zones WHERE workout_id = ANY(:workout_ids)"), {'workout_ids': workout_ids})
+    if zone_rows:
+        db.session.execute(text(INSERT_WORKOUT_HR_ZONE_SQL), zone_rows) # executemany
+    db.session.execute(
+        text("UPDATE workout_stats SET hr_zone_rows_bounds = CAST(:hr_zone_bounds AS integer[]) WHERE workout_id = ANY(:workout_ids)"),
+        {'workout_ids': workout_ids, 'hr_zone_bounds': hr_zone_bounds(hr_zones)}
+    )
+    return len(workout_ids)
+
+# Recomputes the HR zone rows of one workout from its heart rate samples in the current
+# session transaction (workouts without samples keep their imported rows). The samples are
+# taken from `workout_samples` (a WorkoutSampleSet) when given, else queried. Its workout_stats
+# row must exist (refresh_workout_stats() first). Returns True when rows were written.
+def refresh_workout_hr_zones(workout_id, hr_zones=None, workout_samples=None):
+    if hr_zones is None:
+        hr_zones = load_hr_zone_settings()
+    zone_bounds = [(zone['start'], zone['end']) for zone in hr_zone_ranges(hr_zones)]
+    if workout_samples is None:
+        heart_rate_arrays = load_heart_rate_arrays([workout_id])
+    else:
+        hr_times, hr_values = workout_samples.samples(HEART_RATE_METRIC)
+        heart_rate_arrays = [(workout_id, hr_times, hr_values)] if hr_times else []
+    return store_workout_hr_zones(hr_zone_seconds_batch(heart_rate_arrays, zone_bounds), hr_zones) > 0
+
+# --------------------------------------------------------
+# - HR Zone Recompute
+#---------------------------------------------------------
+# Recomputes the HR zone rows of every workout with heart rate samples whose rows were not
+# computed with the configured zones, `chunk_size` workouts per transaction. The zone seconds
+# of a chunk are computed across a process pool (HR_ZONE_RECOMPUTE_PROCESSES, inline when
+# 1); progress is reported in background_job_status after every chunk.
+# Returns the number of workouts processed.
+@background_job(RECOMPUTE_HR_ZONES_JOB)
+def recompute_workout_hr_zones(chunk_size=None, processes=None):
+    chunk_size = chunk_size or current_app.config.get('HR_ZONE_RECOMPUTE_CHUNK_SIZE', 200)
+    processes = processes or current_app.config.get('HR_ZONE_RECOMPUTE_PROCESSES', 1)
+    hr_zones = load_hr_zone_settings()
+    zone_bounds = [(zone['start'], zone['end']) for zone in hr_zone_ranges(hr_zones)]
+
+    workout_ids = db.session.execute(text("""
+        SELECT s.workout_id
+        FROM workout_stats s
+        WHERE s.hr_zone_rows_bounds IS DISTINCT FROM CAST(:hr_zone_bounds AS integer[])
+            AND EXISTS (SELECT 1 FROM heart_rate_samples h WHERE h.workout_id = s.workout_id)
+        ORDER BY s.workout_id
+    """), {'hr_zone_bounds': hr_zone_bounds(hr_zones)}).scalars().all()
+    if not workout_ids:
+        return 0
+    report_job_progress(RECOMPUTE_HR_ZONES_JOB, 0, len(workout_ids))
+    db.session.commit()
+
+    # Spawned (not forked) workers: the pool is created from a thread of a process that
+    # holds database connections and other threads' locks
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) if processes > 1 else None
+    try:
+        for chunk_start in range(0, len(workout_ids), chunk_size):
+            heart_rate_arrays = load_heart_rate_arrays(workout_ids[chunk_start:chunk_start + chunk_size])
+            if executor is None:
+                zone_results = hr_zone_seconds_batch(heart_rate_arrays, zone_bounds)
+            else:
+                batch_size = -(-len(heart_rate_arrays) // processes) # One batch per worker process
+                batches = [heart_rate_arrays[i:i + batch_size] for i in range(0, len(heart_rate_arrays), batch_size)]
+                zone_results = [result for batch_results in executor.map(hr_zone_seconds_batch, batches, [zone_bounds] * len(batches)) for result in batch_results]
+
+            store_workout_hr_zones(zone_results, hr_zones)
+            processed = min(chunk_start + chunk_size, len(workout_ids))
+            report_job_progress(RECOMPUTE_HR_ZONES_JOB, processed, len(workout_ids))
+            db.session.commit()
+            current_app.logger.info(f"HR zones recomputed for {processed}/{len(workout_ids)} workouts.")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    report_job_progress(RECOMPUTE_HR_ZONES_JOB, len(workout_ids), len(workout_ids), state='finished')
+    db.session.commit()
+    return len(workout_ids)
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the HR zone recompute command with `flask`
+def register_commands(app):
+    @app.cli.command('recompute-hr-zones')
+    @click.option('--all', 'recompute_all', is_flag=True, help='Recompute every workout, not only those with outdated zone rows.')
+    @click.option('--processes', type=int, default=None, help='Worker processes (default: HR_ZONE_RECOMPUTE_PROCESSES).')
+    def recompute_hr_zones_command(recompute_all, processes):
+        """Recompute the stored HR zone rows for the configured zones."""
+        if recompute_all:
+            db.session.execute(text("UPDATE workout_stats SET hr_zone_rows_bounds = NULL"))
+            db.session.commit()
+        processed = recompute_workout_hr_zones(processes=processes)
+        click.echo(f"HR zones recomputed for {processed} workout(s).")
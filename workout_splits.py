@@ -0,0 +1,197 @@
+# ========================================================
+# = workout_splits.py - Precomputed split tables per split scheme
+# ========================================================
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from user_settings import get_settings, save_settings
+from background_jobs import background_job, enqueue_job
+from sample_loader import HEART_RATE_METRIC, load_workout_samples
+from series import SampleSeries, calculate_splits, calculate_time_splits
+from workout_stats import refresh_workout_stats
+
+# Available split schemes in display order: distance splits every `step` meters,
+# time splits every `step` seconds
+SPLIT_SCHEMES = {
+    'distance_250':  {'label': '250m',  'kind': 'distance', 'step': 250},
+    'distance_500':  {'label': '500m',  'kind': 'distance', 'step': 500},
+    'distance_1000': {'label': '1000m', 'kind': 'distance', 'step': 1000},
+    'time_60':       {'label': '1 min', 'kind': 'time',     'step': 60},
+    'time_120':      {'label': '2 min', 'kind': 'time',     'step': 120},
+    'time_300':      {'label': '5 min', 'kind': 'time',     'step': 300}
+}
+
+SPLIT_SCHEMES_SETTING = 'split_schemes' # UserSetting key, comma separated scheme keys
+DEFAULT_SPLIT_SCHEMES = ['distance_500'] # The split table the details page always had
+RECOMPUTE_SPLITS_JOB = 'recompute_splits' # Background job name
+
+# --------------------------------------------------------
+# - Split Scheme Settings
+#---------------------------------------------------------
+# Returns the known scheme keys of a comma separated list, in SPLIT_SCHEMES order
+# (the canonical order is what workout_stats.split_schemes is compared against)
+def parse_split_schemes(value):
+    selected = {key.strip() for key in (value or '').split(',')}
+    return [key for key in SPLIT_SCHEMES if key in selected]
+
+# Returns the configured split schemes (the default when never saved)
+def load_split_schemes():
+    value = get_settings().get(SPLIT_SCHEMES_SETTING)
+    if value is None:
+        return list(DEFAULT_SPLIT_SCHEMES)
+    return parse_split_schemes(value)
+
+# Saves the split schemes in the current session transaction. Returns True when the
+# selection changed, in which case the stored splits are recomputed in the background
+# once the transaction commits.
+def save_split_schemes(schemes):
+    schemes = parse_split_schemes(','.join(schemes))
+    if schemes == load_split_schemes():
+        return False
+    save_settings({SPLIT_SCHEMES_SETTING: ','.join(schemes)})
+    enqueue_job(RECOMPUTE_SPLITS_JOB)
+    return True
+
+# --------------------------------------------------------
+# - Split Calculation
+#---------------------------------------------------------
+# Returns the split rows of one scheme for a loaded WorkoutSampleSet, as dicts with the
+# details page keys ('distance', 'time', 'pace', 'avg_power', 'avg_spm', 'avg_hr') plus
+# 'split_seconds'. 'pace' is per 500m (None for a split without distance).
+def compute_splits(workout_samples, scheme):
+    scheme_def = SPLIT_SCHEMES[scheme]
+    distance, power, spm, hr = (
+        SampleSeries(*workout_samples.samples(metric_name))
+        for metric_name in ('RowingDistance', 'Power', 'Spm', HEART_RATE_METRIC)
+    )
+
+    if scheme_def['kind'] == 'distance':
+        split_rows = calculate_splits(distance, power, spm, hr, scheme_def['step'])
+        pace_factor = 500 / scheme_def['step'] # 1.0 for 500m splits, so their pace is the split time unchanged
+        for split in split_rows:
+            split['split_seconds'] = split['pace']
+            split['pace'] = split['pace'] * pace_factor
+        return split_rows
+
+    split_rows = calculate_time_splits(distance, power, spm, hr, scheme_def['step'])
+    previous_distance = 0.0
+    for split in split_rows:
+        split_meters = split['distance'] - previous_distance
+        split['split_seconds'] = split['pace']
+        split['pace'] = split['pace'] * 500 / split_meters if split_meters > 0 else None
+        previous_distance = split['distance']
+    return split_rows
+
+# --------------------------------------------------------
+# - Split Storage
+#---------------------------------------------------------
+INSERT_WORKOUT_SPLIT_SQL = """
+    INSERT INTO workout_splits (
+        workout_id, scheme, split_number, end_distance_meters, end_time_seconds,
+        split_seconds, pace_seconds_500m, avg_power, avg_spm, avg_hr
+    )
+    VALUES (
+        :workout_id, :scheme, :split_number, :distance, :time,
+        :split_seconds, :pace, :avg_power, :avg_spm, :avg_hr
+    )
+"""
+
+# Replaces the stored splits of one workout with those of the given schemes (the configured
+# ones when None) in the current session transaction, and records the schemes on its
+# workout_stats row, which must exist (refresh_workout_stats() first).
+def refresh_workout_splits(workout_id, workout_samples=None, schemes=None):
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+    if schemes is None:
+        schemes = load_split_schemes()
+
+    split_rows = []
+    for scheme in schemes:
+        for split_number, split in enumerate(compute_splits(workout_samples, scheme), start=1):
+            split_rows.append({'workout_id': workout_id, 'scheme': scheme, 'split_number': split_number, **split})
+
+    db.session.execute(text("DELETE FROM workout_splits WHERE workout_id = :workout_id"), {'workout_id': workout_id})
+    if split_rows:
+        db.session.execute(text(INSERT_WORKOUT_SPLIT_SQL), split_rows) # executemany
+    db.session.execute(
+        text("UPDATE workout_stats SET split_schemes = CAST(:schemes AS text[]) WHERE workout_id = :workout_id"),
+        {'workout_id': workout_id, 'schemes': list(schemes)}
+    )
+    return len(split_rows)
+
+# Returns the split tables for the details page, one {'scheme', 'label', 'rows'} dict per
+# configured scheme. Stored rows are used for the schemes recorded in workout_stats;
+# any other scheme (settings changed, recompute still pending) is computed on the fly.
+def get_workout_splits(workout_id, workout_samples, workout_stats, schemes):
+    stored_schemes = set(workout_stats.get('split_schemes') or [])
+    stored_rows = {}
+    if stored_schemes.intersection(schemes):
+        rows = db.session.execute(text("""
+            SELECT scheme, end_distance_meters, end_time_seconds, split_seconds, pace_seconds_500m, avg_power, avg_spm, avg_hr
+            FROM workout_splits
+            WHERE workout_id = :workout_id
+            ORDER BY scheme, split_number
+        """), {'workout_id': workout_id}).fetchall()
+        for row in rows:
+            stored_rows.setdefault(row.scheme, []).append({
+                'distance': row.end_distance_meters,
+                'time': row.end_time_seconds,
+                'split_seconds': row.split_seconds,
+                'pace': row.pace_seconds_500m,
+                'avg_power': row.avg_power,
+                'avg_spm': row.avg_spm,
+                'avg_hr': row.avg_hr
+            })
+
+    split_tables = []
+    for scheme in schemes:
+        if scheme in stored_schemes:
+            split_rows = stored_rows.get(scheme, [])
+        else:
+            split_rows = compute_splits(workout_samples, scheme)
+        split_tables.append({'scheme': scheme, 'label': SPLIT_SCHEMES[scheme]['label'], 'rows': split_rows})
+    return split_tables
+
+# --------------------------------------------------------
+# - Split Recompute
+#---------------------------------------------------------
+# Recomputes the stored splits of every workout whose recorded schemes differ from the
+# configured ones (or that has no statistics row yet), committing every `batch_size`
+# workouts. Returns the number of workouts processed.
+@background_job(RECOMPUTE_SPLITS_JOB)
+def recompute_stale_splits(batch_size=50):
+    schemes = load_split_schemes()
+    workout_rows = db.session.execute(text("""
+        SELECT w.workout_id, s.workout_id IS NULL AS missing_stats
+        FROM workouts w
+        LEFT JOIN workout_stats s ON s.workout_id = w.workout_id
+        WHERE s.workout_id IS NULL OR s.split_schemes IS DISTINCT FROM CAST(:schemes AS text[])
+        ORDER BY w.workout_id
+    """), {'schemes': schemes}).fetchall()
+
+    for position, row in enumerate(workout_rows, start=1):
+        workout_samples = load_workout_samples(row.workout_id)
+        if row.missing_stats:
+            refresh_workout_stats(row.workout_id, workout_samples=workout_samples)
+        refresh_workout_splits(row.workout_id, workout_samples, schemes)
+        if position % batch_size == 0:
+            db.session.commit()
+            current_app.logger.info(f"Splits recomputed for {position}/{len(workout_rows)} workouts.")
+    db.session.commit()
+    return len(workout_rows)
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the split recompute command with `flask`
+def register_commands(app):
+    @app.cli.command('recompute-splits')
+    @click.option('--all', 'recompute_all', is_flag=True, help='Recompute every workout, not only those with outdated split schemes.')
+    def recompute_splits_command(recompute_all):
+        """Store the split tables of the configured split schemes."""
+        if recompute_all:
+            db.session.execute(text("UPDATE workout_stats SET split_schemes = NULL"))
+            db.session.commit()
+        processed = recompute_stale_splits()
+        click.echo(f"Splits recomputed for {processed} workout(s) ({', '.join(load_split_schemes()) or 'no schemes'}).")
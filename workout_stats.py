@@ -0,0 +1,271 @@
+# ========================================================
+# = workout_stats.py - Precomputed per-workout statistics
+# ========================================================
+import click
+from flask import current_app
+from sqlalchemy import text
+from models import db, Workout, WorkoutStats, WorkoutHistogram
+from user_settings import get_settings
+from sample_loader import HEART_RATE_METRIC, load_workout_samples
+from series import zone_durations, time_histogram, histogram_zone_seconds, heart_rate_points
+
+# HR zones in canonical order; each zone starts at its UserSetting value and ends
+# where the next configured zone starts
+HR_ZONE_DEFINITIONS = [
+    {'key': 'HR_Very_light', 'name': 'Very Light', 'color_hex': '#ADD8E6'},
+    {'key': 'HR_Light',      'name': 'Light',      'color_hex': '#90EE90'},
+    {'key': 'HR_Moderate',   'name': 'Moderate',   'color_hex': '#FFFF00'},
+    {'key': 'HR_Hard',       'name': 'Hard',       'color_hex': '#FFA500'},
+    {'key': 'HR_Very_hard',  'name': 'Very Hard',  'color_hex': '#FF6347'}
+]
+
+# Bin width per histogram metric: heart rate in 1 bpm bins (so any integer zone bounds
+# fall on bin edges), power in 10 W, stroke rate in 1 spm and pace in 1 s/500m bins
+HISTOGRAM_BIN_WIDTHS = {
+    HEART_RATE_METRIC: 1,
+    'Power': 10,
+    'Spm': 1,
+    'RowingSplit': 1
+}
+
+# --------------------------------------------------------
+# - HR Zone Settings
+#---------------------------------------------------------
+# Returns {zone key: lower bound bpm} for the configured zones
+def load_hr_zone_settings():
+    return get_settings().hr_zones()
+
+# Returns the configured zones as {'key', 'name', 'start', 'end'} dicts (end is exclusive)
+def hr_zone_ranges(hr_zones):
+    zone_ranges = []
+    for i, zone_def in enumerate(HR_ZONE_DEFINITIONS):
+        if zone_def['key'] not in hr_zones:
+            continue
+        zone_end = float('inf')
+        if i + 1 < len(HR_ZONE_DEFINITIONS) and HR_ZONE_DEFINITIONS[i+1]['key'] in hr_zones:
+            zone_end = hr_zones[HR_ZONE_DEFINITIONS[i+1]['key']]
+        zone_ranges.append({'key': zone_def['key'], 'name': zone_def['name'], 'start': hr_zones[zone_def['key']], 'end': zone_end})
+    return zone_ranges
+
+# The zone lower bounds a zone time breakdown was computed with (None for unset zones)
+def hr_zone_bounds(hr_zones):
+    return [hr_zones.get(zone_def['key']) for zone_def in HR_ZONE_DEFINITIONS]
+
+# --------------------------------------------------------
+# - Statistics Calculation
+#---------------------------------------------------------
+# Heart rate chart points: valid (> 0) readings, preceded by an empty point at 0
+# when the recording starts later. Returns (times, bpm values).
+def hr_points(workout_samples):
+    return heart_rate_points(*workout_samples.samples(HEART_RATE_METRIC))
+
+# A metric's positive values on the shared time axis, as charted on the details page
+def positive_metric_values(workout_samples, metric_name):
+    return [float(value) for value in workout_samples.aligned(metric_name) if value is not None and float(value) > 0]
+
+# Seconds per HR zone, aligned with HR_ZONE_DEFINITIONS (None for unset zones)
+def hr_zone_seconds(workout_samples, hr_zones):
+    point_times, point_rates = hr_points(workout_samples)
+    zone_ranges = hr_zone_ranges(hr_zones)
+    zone_times = zone_durations(point_times, point_rates, [(zone['start'], zone['end']) for zone in zone_ranges])
+    seconds_by_key = {zone['key']: zone_time for zone, zone_time in zip(zone_ranges, zone_times)}
+    return [seconds_by_key.get(zone_def['key']) for zone_def in HR_ZONE_DEFINITIONS]
+
+# Seconds per HR zone from a stored 1 bpm heart rate histogram, same shape as hr_zone_seconds()
+def hr_zone_seconds_from_histogram(first_bin, bin_seconds, hr_zones):
+    zone_ranges = hr_zone_ranges(hr_zones)
+    zone_times = histogram_zone_seconds(first_bin, HISTOGRAM_BIN_WIDTHS[HEART_RATE_METRIC], bin_seconds, [(zone['start'], zone['end']) for zone in zone_ranges])
+    seconds_by_key = {zone['key']: int(round(zone_time)) for zone, zone_time in zip(zone_ranges, zone_times)}
+    return [seconds_by_key.get(zone_def['key']) for zone_def in HR_ZONE_DEFINITIONS]
+
+# Time-weighted histograms of a loaded WorkoutSampleSet as {metric_name: (first_bin, bin_seconds)}.
+# Heart rate uses the chart points (valid readings only, see hr_points()), the other metrics
+# their positive samples; metrics without any counted time are left out.
+def compute_histograms(workout_samples):
+    histograms = {}
+    for metric_name, bin_width in HISTOGRAM_BIN_WIDTHS.items():
+        if metric_name == HEART_RATE_METRIC:
+            point_times, point_values = hr_points(workout_samples)
+        else:
+            metric_times, metric_values = workout_samples.samples(metric_name)
+            positive_points = [(t, float(value)) for t, value in zip(metric_times, metric_values) if value is not None and float(value) > 0]
+            point_times, point_values = [t for t, _v in positive_points], [v for _t, v in positive_points]
+        first_bin, bin_seconds = time_histogram(point_times, point_values, bin_width)
+        if first_bin is not None:
+            histograms[metric_name] = (first_bin, bin_seconds)
+    return histograms
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+# Returns the workout_stats column values for a loaded WorkoutSampleSet
+def compute_workout_stats(workout_samples, hr_zones):
+    power_values = positive_metric_values(workout_samples, 'Power')
+    spm_values = positive_metric_values(workout_samples, 'Spm')
+    _point_times, point_rates = hr_points(workout_samples)
+    hr_values = [rate for rate in point_rates if rate is not None]
+
+    all_times = list(workout_samples.times) + [t for t in workout_samples.samples(HEART_RATE_METRIC)[0] if t is not None]
+    return {
+        'avg_power': _mean(power_values),
+        'max_power': max(power_values, default=None),
+        'power_sample_count': len(power_values),
+        'avg_spm': _mean(spm_values),
+        'max_spm': max(spm_values, default=None),
+        'spm_sample_count': len(spm_values),
+        'avg_hr': _mean(hr_values),
+        'max_hr': max(hr_values, default=None),
+        'hr_sample_count': len(hr_values),
+        'first_offset_seconds': min(all_times, default=None),
+        'last_offset_seconds': max(all_times, default=None),
+        'hr_zone_bounds': hr_zone_bounds(hr_zones),
+        'hr_zone_seconds': hr_zone_seconds(workout_samples, hr_zones)
+    }
+
+# Returns the statistics for the details page: the stored row when there is one, otherwise
+# computed from the samples. Zone times stored for other HR zone settings are recomputed
+# from the stored heart rate histogram (from the samples for workouts without one).
+def get_workout_stats(workout_id, workout_samples, hr_zones):
+    stats_row = db.session.get(WorkoutStats, workout_id)
+    if stats_row is None:
+        return compute_workout_stats(workout_samples, hr_zones)
+    stats = {column.name: getattr(stats_row, column.name) for column in WorkoutStats.__table__.columns}
+    if stats['hr_zone_bounds'] != hr_zone_bounds(hr_zones):
+        stats['hr_zone_bounds'] = hr_zone_bounds(hr_zones)
+        hr_histogram = db.session.get(WorkoutHistogram, (workout_id, HEART_RATE_METRIC))
+        if hr_histogram is not None:
+            stats['hr_zone_seconds'] = hr_zone_seconds_from_histogram(hr_histogram.first_bin, hr_histogram.bin_seconds, hr_zones)
+        else:
+            stats['hr_zone_seconds'] = hr_zone_seconds(workout_samples, hr_zones)
+    return stats
+
+# --------------------------------------------------------
+# - Statistics Storage
+#---------------------------------------------------------
+UPSERT_WORKOUT_STATS_SQL = """
+    INSERT INTO workout_stats (
+        workout_id, avg_power, max_power, power_sample_count, avg_spm, max_spm, spm_sample_count,
+        avg_hr, max_hr, hr_sample_count, first_offset_seconds, last_offset_seconds,
+        hr_zone_bounds, hr_zone_seconds, computed_at
+    )
+    VALUES (
+        :workout_id, :avg_power, :max_power, :power_sample_count, :avg_spm, :max_spm, :spm_sample_count,
+        :avg_hr, :max_hr, :hr_sample_count, :first_offset_seconds, :last_offset_seconds,
+        CAST(:hr_zone_bounds AS integer[]), CAST(:hr_zone_seconds AS integer[]), now()
+    )
+    ON CONFLICT (workout_id) DO UPDATE SET
+        avg_power = EXCLUDED.avg_power,
+        max_power = EXCLUDED.max_power,
+        power_sample_count = EXCLUDED.power_sample_count,
+        avg_spm = EXCLUDED.avg_spm,
+        max_spm = EXCLUDED.max_spm,
+        spm_sample_count = EXCLUDED.spm_sample_count,
+        avg_hr = EXCLUDED.avg_hr,
+        max_hr = EXCLUDED.max_hr,
+        hr_sample_count = EXCLUDED.hr_sample_count,
+        first_offset_seconds = EXCLUDED.first_offset_seconds,
+        last_offset_seconds = EXCLUDED.last_offset_seconds,
+        hr_zone_bounds = EXCLUDED.hr_zone_bounds,
+        hr_zone_seconds = EXCLUDED.hr_zone_seconds,
+        computed_at = EXCLUDED.computed_at
+"""
+
+INSERT_HISTOGRAM_SQL = """
+    INSERT INTO workout_histograms (workout_id, metric_name, bin_width, first_bin, bin_seconds)
+    VALUES (:workout_id, :metric_name, :bin_width, :first_bin, CAST(:bin_seconds AS double precision[]))
+"""
+
+# Computes and stores the statistics and histograms of one workout in the current session
+# transaction. Reads the samples back with the details page query (unless already loaded
+# with it), so both always agree.
+def refresh_workout_stats(workout_id, hr_zones=None, workout_samples=None):
+    if hr_zones is None:
+        hr_zones = load_hr_zone_settings()
+    if workout_samples is None:
+        workout_samples = load_workout_samples(workout_id)
+    stats = compute_workout_stats(workout_samples, hr_zones)
+    db.session.execute(text(UPSERT_WORKOUT_STATS_SQL), {'workout_id': workout_id, **stats})
+
+    histograms = compute_histograms(workout_samples)
+    db.session.execute(text("DELETE FROM workout_histograms WHERE workout_id = :workout_id"), {'workout_id': workout_id})
+    if histograms:
+        db.session.execute(text(INSERT_HISTOGRAM_SQL), [
+            {'workout_id': workout_id, 'metric_name': metric_name, 'bin_width': HISTOGRAM_BIN_WIDTHS[metric_name], 'first_bin': first_bin, 'bin_seconds': bin_seconds}
+            for metric_name, (first_bin, bin_seconds) in histograms.items()
+        ])
+    return stats
+
+# Rewrites the HR zone times of every workout for new zone settings in the current session
+# transaction, from the stored 1 bpm heart rate histograms alone: one set-based UPDATE whose
+# cost depends on the number of histogram bins, not samples. Each bin counts for the first
+# zone containing it, as in zone_durations(); workouts without HR get 0 per configured zone.
+# Returns the number of workout_stats rows updated.
+def apply_hr_zone_settings(hr_zones):
+    zone_ranges = hr_zone_ranges(hr_zones)
+    params = {'heart_rate_metric': HEART_RATE_METRIC, 'hr_zone_bounds': hr_zone_bounds(hr_zones)}
+    zone_cases = []
+    for index, zone in enumerate(zone_ranges):
+        params[f'zone_start_{index}'] = zone['start']
+        condition = f"bin_value.bpm >= :zone_start_{index}"
+        if zone['end'] != float('inf'):
+            params[f'zone_end_{index}'] = zone['end']
+            condition += f" AND bin_value.bpm < :zone_end_{index}"
+        zone_cases.append(f"WHEN {condition} THEN {index}")
+    zone_index_sql = f"CASE {' '.join(zone_cases)} END" if zone_cases else "NULL::integer"
+
+    zone_index_by_key = {zone['key']: index for index, zone in enumerate(zone_ranges)}
+    zone_second_columns = []
+    for zone_def in HR_ZONE_DEFINITIONS: # Aligned with HR_ZONE_DEFINITIONS, NULL for unset zones
+        if zone_def['key'] in zone_index_by_key:
+            zone_second_columns.append(f"round(COALESCE(sum(hb.seconds) FILTER (WHERE hb.zone_index = {zone_index_by_key[zone_def['key']]}), 0))::integer")
+        else:
+            zone_second_columns.append("NULL::integer")
+
+    result = db.session.execute(text(f"""
+        UPDATE workout_stats s
+        SET hr_zone_bounds = CAST(:hr_zone_bounds AS integer[]),
+            hr_zone_seconds = z.zone_seconds
+        FROM (
+            SELECT st.workout_id, ARRAY[{', '.join(zone_second_columns)}] AS zone_seconds
+            FROM workout_stats st
+            LEFT JOIN LATERAL (
+                SELECT b.seconds, {zone_index_sql} AS zone_index
+                FROM workout_histograms h
+                CROSS JOIN LATERAL unnest(h.bin_seconds) WITH ORDINALITY AS b(seconds, bin_number)
+                CROSS JOIN LATERAL (SELECT h.first_bin + (b.bin_number - 1) * h.bin_width AS bpm) bin_value
+                WHERE h.workout_id = st.workout_id AND h.metric_name = :heart_rate_metric
+            ) hb ON TRUE
+            GROUP BY st.workout_id
+        ) z
+        WHERE z.workout_id = s.workout_id
+    """), params)
+    return result.rowcount
+
+# Fills workout_stats for the workouts without a row (all workouts when only_missing is False),
+# committing every `batch_size` workouts. Returns the number of workouts processed.
+def backfill_workout_stats(only_missing=True, batch_size=100):
+    workout_query = db.session.query(Workout.workout_id).order_by(Workout.workout_id)
+    if only_missing:
+        workout_query = workout_query.outerjoin(WorkoutStats, WorkoutStats.workout_id == Workout.workout_id).filter(WorkoutStats.workout_id.is_(None))
+    workout_ids = [row.workout_id for row in workout_query.all()]
+
+    hr_zones = load_hr_zone_settings()
+    for position, workout_id in enumerate(workout_ids, start=1):
+        refresh_workout_stats(workout_id, hr_zones)
+        if position % batch_size == 0:
+            db.session.commit()
+            current_app.logger.info(f"Workout statistics computed for {position}/{len(workout_ids)} workouts.")
+    db.session.commit()
+    return len(workout_ids)
+
+# --------------------------------------------------------
+# - CLI Commands
+#---------------------------------------------------------
+# Registers the backfill command with `flask`
+def register_commands(app):
+    @app.cli.command('backfill-workout-stats')
+    @click.option('--all', 'recompute_all', is_flag=True, help='Recompute every workout, not only those without statistics.')
+    def backfill_workout_stats_command(recompute_all):
+        """Compute the precomputed statistics and histograms of existing workouts."""
+        processed = backfill_workout_stats(only_missing=not recompute_all)
+        click.echo(f"Workout statistics computed for {processed} workout(s).")